@@ -1,7 +1,15 @@
 """Example main"""
 import argparse
+import json
+import sys
 
-from wtf_interpreter import interpret
+from wtf_brainfuck import LANGUAGES
+from wtf_cache import clear_cache
+from wtf_interpreter import ENGINES, disassemble_file, interpret, transpile_file
+from wtf_io import BUFFER_SIZE, InputSource, OutputSink
+from wtf_objects import CELL_WIDTHS, DEBUG_MODES, DEBUG_RADIUS, ERROR_LIMIT, TRACE_SIZE, DebugSink
+from wtf_optimizer import OPTIMIZATION_LEVELS
+from wtf_profiler import format_profile, profile_json
 
 if __name__ == "__main__":
     # Parsing command line arguments
@@ -10,20 +18,129 @@ if __name__ == "__main__":
 
     ARG_PARSER.add_argument("-f", "--file", required=True,
                             type=str, help="filepath to a .wtf file")
-    ARG_PARSER.add_argument("-m", "--memory", required=True,
-                            type=int, help="amount of cells of memory the program has")
+    ARG_PARSER.add_argument("-l", "--language", choices=LANGUAGES,
+                            help="language the file is written in, by default brainfuck "
+                                 "for .b and .bf files and wtf for all others")
+    ARG_PARSER.add_argument("-m", "--memory", type=int,
+                            help="amount of cells of memory the program has, "
+                                 "without it the memory grows as far as the program goes")
+    ARG_PARSER.add_argument("--paged", action="store_true",
+                            help="only allocate the pages of memory that are used, "
+                                 "the memory size is the limit")
+    ARG_PARSER.add_argument("-w", "--cell-width", choices=CELL_WIDTHS, default=0, type=int,
+                            help="bits per memory cell, numbers wrap around; 0 allows any number")
     ARG_PARSER.add_argument("-e", "--ignore_errors", action="store_true",
                             help="use this to ignore errors")
+    ARG_PARSER.add_argument("--error-limit", type=int, default=ERROR_LIMIT,
+                            help="amount of different runtime errors that are kept, "
+                                 "an error that happens again is counted instead")
+    ARG_PARSER.add_argument("-o", "--output", type=str,
+                            help="file to write the output of the program to, instead of the terminal")
+    ARG_PARSER.add_argument("--buffer-size", type=int, default=BUFFER_SIZE,
+                            help="amount of characters of output that are collected before "
+                                 "they are written, 0 writes every character right away")
+    ARG_PARSER.add_argument("-i", "--input", type=str,
+                            help="file to read the input of the program from in chunks, "
+                                 "- reads stdin; without it every ^ and / asks for a line")
+    ARG_PARSER.add_argument("--debug-mode", choices=DEBUG_MODES, default=DEBUG_MODES[0],
+                            help="what w dumps after the pointer: the whole memory, the cells "
+                                 "around the pointer, the cells that changed since the previous "
+                                 "dump, or the cells that are not 0")
+    ARG_PARSER.add_argument("--debug-radius", type=int, default=DEBUG_RADIUS,
+                            help="amount of cells on both sides of the pointer in a window dump")
+    ARG_PARSER.add_argument("--debug-every", type=int, default=1,
+                            help="only write the first of every this amount of dumps")
+    ARG_PARSER.add_argument("--debug-limit", type=int,
+                            help="write at most this amount of dumps, and skip the others")
+    ARG_PARSER.add_argument("--debug-file", type=str,
+                            help="file to write the dumps of w to, instead of the output")
+    ARG_PARSER.add_argument("--engine", choices=ENGINES, default=ENGINES[0],
+                            help="the engine that executes the program")
+    ARG_PARSER.add_argument("-O", "--optimize", choices=OPTIMIZATION_LEVELS, default=1, type=int,
+                            help="optimization level, 0 runs the program as it is written")
+    ARG_PARSER.add_argument("--budget", type=int,
+                            help="stop the program after about this amount of dispatches")
+    ARG_PARSER.add_argument("--timeout", type=float,
+                            help="stop the program after this amount of seconds")
+    ARG_PARSER.add_argument("--checkpoint", type=str,
+                            help="file to save the run to when it is stopped by --budget or --timeout")
+    ARG_PARSER.add_argument("--restore", type=str,
+                            help="checkpoint file of a stopped run to continue instead of starting")
+    ARG_PARSER.add_argument("--trace", type=str,
+                            help="file to write the last steps of the run to, "
+                                 "replay it with python wtf_trace.py")
+    ARG_PARSER.add_argument("--trace-size", type=int, default=TRACE_SIZE,
+                            help="amount of last steps the trace keeps")
+    ARG_PARSER.add_argument("--profile", action="store_true",
+                            help="count and time every function and loop, and print the slowest")
+    ARG_PARSER.add_argument("--profile-json", type=str,
+                            help="file to write the full profile to as JSON")
+    ARG_PARSER.add_argument("--no-cache", action="store_true",
+                            help="always lex and parse the file, without reading or writing the cache")
+    ARG_PARSER.add_argument("--clear-cache", action="store_true",
+                            help="remove the cached programs next to the file before running it")
+    ARG_PARSER.add_argument("--disassemble", action="store_true",
+                            help="print the bytecode of the program instead of running it")
+    ARG_PARSER.add_argument("--transpile", action="store_true",
+                            help="print the program as a Python module instead of running it")
 
     ARGS = ARG_PARSER.parse_args()
+    PROFILED = ARGS.profile or bool(ARGS.profile_json)
+    if PROFILED and (ARGS.budget is not None or ARGS.timeout is not None or ARGS.restore):
+        ARG_PARSER.error("--profile and --profile-json can not be used with "
+                         "--budget, --timeout or --restore")
+    if ARGS.trace and (ARGS.budget is not None or ARGS.timeout is not None or ARGS.restore):
+        ARG_PARSER.error("--trace can not be used with --budget, --timeout or --restore")
+    if ARGS.trace and PROFILED:
+        ARG_PARSER.error("--trace can not be used with --profile or --profile-json")
+    USE_CACHE = not ARGS.no_cache
+
+    if ARGS.clear_cache:
+        clear_cache(ARGS.file)
+    if ARGS.disassemble:
+        print(disassemble_file(ARGS.file, ARGS.optimize, USE_CACHE, ARGS.language), end="")
+        ARG_PARSER.exit()
+    if ARGS.transpile:
+        print(transpile_file(ARGS.file, ARGS.optimize, USE_CACHE, ARGS.language), end="")
+        ARG_PARSER.exit()
 
     # Creatign variables needed to interpret
     FILE = ARGS.file
     MEM_SIZE = ARGS.memory
     IGNORE_ERRORS = ARGS.ignore_errors
+    ENGINE = ARGS.engine
+    OPTIMIZATION = ARGS.optimize
+    CELL_WIDTH = ARGS.cell_width
+    PAGED = ARGS.paged
+    PROFILE = PROFILED
+    OUTPUT_FILE = open(ARGS.output, "w") if ARGS.output else None
+    SINK = OutputSink(OUTPUT_FILE, ARGS.buffer_size)
+    if ARGS.input == "-":
+        INPUT_FILE = sys.stdin
+    else:
+        INPUT_FILE = open(ARGS.input, "r") if ARGS.input else None
+    SOURCE = InputSource(INPUT_FILE)
+    DEBUG_FILE = open(ARGS.debug_file, "w") if ARGS.debug_file else None
+    DEBUG = DebugSink(DEBUG_FILE, ARGS.debug_mode, ARGS.debug_radius, ARGS.debug_every,
+                      ARGS.debug_limit)
 
     # Interpret
-    OUTPUT = interpret(FILE, MEM_SIZE, IGNORE_ERRORS)
+    OUTPUT = interpret(FILE, MEM_SIZE, IGNORE_ERRORS, ENGINE, OPTIMIZATION, USE_CACHE,
+                       CELL_WIDTH, PAGED, SINK, SOURCE, PROFILE, ARGS.language,
+                       ARGS.budget, ARGS.timeout, ARGS.checkpoint, ARGS.restore,
+                       ARGS.error_limit, DEBUG, ARGS.trace, ARGS.trace_size)
+    if OUTPUT_FILE:
+        OUTPUT_FILE.close()
+    if DEBUG_FILE:
+        DEBUG_FILE.close()
+    if INPUT_FILE and INPUT_FILE is not sys.stdin:
+        INPUT_FILE.close()
+
+    if ARGS.profile:
+        print(format_profile(OUTPUT.profile))
+    if ARGS.profile_json:
+        with open(ARGS.profile_json, "w") as PROFILE_FILE:
+            json.dump(profile_json(OUTPUT.profile), PROFILE_FILE, indent=2)
 
     # print errors
     print(OUTPUT.lexer_errors)
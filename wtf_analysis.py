@@ -0,0 +1,240 @@
+"""A static analysis that finds the cells the pointer can be at in WTFZOMFG bytecode"""
+import math
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from wtf_bytecode import Opcode
+from wtf_objects import Bytecode
+
+# The lowest and highest cell the pointer can be at, the highest can be infinite.
+# The pointer is never below 0, because a move that would leave the memory is not made.
+Range = Tuple[int, float]
+
+# After this many widenings of the range of an instruction, a bound that still
+# moves is set to 0 or infinity, so the analysis of a loop always ends
+WIDEN_AFTER = 3
+
+END = Opcode.END.value
+JUMP = Opcode.JUMP.value
+LABEL_GOTO = Opcode.LABEL_GOTO.value
+LOOP_START = Opcode.LOOP_START.value
+LOOP_END = Opcode.LOOP_END.value
+IF_START = Opcode.IF_START.value
+IF_END = Opcode.IF_END.value
+CALL_FUNCTION = Opcode.CALL_FUNCTION.value
+POINTER_MOVE_LEFT = Opcode.POINTER_MOVE_LEFT.value
+POINTER_MOVE_RIGHT = Opcode.POINTER_MOVE_RIGHT.value
+POINTER_MOVE_TO = Opcode.POINTER_MOVE_TO.value
+POINTER_MOVE_RELATIVE = Opcode.POINTER_MOVE_RELATIVE.value
+POINTER_MOVE_FOLDED = Opcode.POINTER_MOVE_FOLDED.value
+POINTER_SCAN = Opcode.POINTER_SCAN.value
+COPY_VALUE_TO = Opcode.COPY_VALUE_TO.value
+
+GOTO_OPCODES = {Opcode.LABEL_GOTO, Opcode.LABEL_GOTO_NONZERO, Opcode.LABEL_GOTO_ZERO}
+
+# Instructions that jump when a condition does not hold
+BRANCH_OPCODES = {Opcode.LOOP_START, Opcode.IF_START} | GOTO_OPCODES
+
+FOLDED_OPCODES = {Opcode.CELL_INCREASE_FOLDED, Opcode.POINTER_MOVE_FOLDED, Opcode.CELL_CLEAR,
+                  Opcode.CELL_MULTIPLY_ADD, Opcode.POINTER_SCAN}
+
+# Instructions that use the cell to the right of the pointer, and their unchecked variant
+RIGHT_CELL_OPCODES = {
+    Opcode.COPY_VALUE_RIGHT: Opcode.COPY_VALUE_RIGHT_UNCHECKED,
+    Opcode.CELL_ADD_RIGHT: Opcode.CELL_ADD_RIGHT_UNCHECKED,
+    Opcode.CELL_SUBTRACT_RIGHT: Opcode.CELL_SUBTRACT_RIGHT_UNCHECKED,
+    Opcode.CELL_MULTIPLY_RIGHT: Opcode.CELL_MULTIPLY_RIGHT_UNCHECKED,
+    Opcode.CELL_DEVIDE_RIGHT: Opcode.CELL_DEVIDE_RIGHT_UNCHECKED}
+
+# Instructions that check whether the cells they use are within bounds
+CHECKED_OPCODES = {Opcode.POINTER_MOVE_LEFT, Opcode.POINTER_MOVE_RIGHT, Opcode.POINTER_MOVE_TO,
+                   Opcode.POINTER_MOVE_RELATIVE, Opcode.POINTER_MOVE_FOLDED,
+                   Opcode.COPY_VALUE_TO} | set(RIGHT_CELL_OPCODES)
+
+# Functions that are called as they are and can move the pointer anywhere
+POINTER_COMMANDS = ["POINTER_MOVE_TO", "POINTER_MOVE_RELATIVE"]
+
+
+def is_structured(bytecode: Bytecode) -> bool:
+    """
+    Checks if every loop and if of the bytecode is properly nested and no goto jumps,
+    so the end of a loop always returns to the start of that same loop
+    """
+    opcodes, operands = bytecode.opcodes, bytecode.operands
+    starts = []
+    for index, (opcode, operand) in enumerate(zip(opcodes, operands)):
+        if opcode in GOTO_OPCODES and operand >= 0:
+            return False
+        if opcode == LOOP_START or opcode == IF_START:
+            starts.append(index)
+        elif opcode == LOOP_END or opcode == IF_END:
+            if not starts:
+                return False
+            start = starts.pop()
+            expected = LOOP_START if opcode == LOOP_END else IF_START
+            if opcodes[start] != expected or operands[start] != index + 1 or \
+                    (opcode == LOOP_END and operand != start):
+                return False
+        elif (opcode == END or opcode == JUMP) and starts:
+            return False
+    return True
+
+
+def move(pointer: Range, low: int, high: int, delta: int) -> Tuple[Range, bool]:
+    """
+    Returns the range after a move by delta, which passes the cells from low to
+    high around the pointer, and whether the move can never leave the memory
+    as long as the memory is larger than every finite range.
+    A move that leaves the memory is not made, so then the pointer can also stay.
+    """
+    lowest, highest = pointer
+    if lowest + low >= 0 and highest != math.inf:
+        return (lowest + delta, highest + delta), True
+    return (min(lowest, max(lowest + delta, 0)), max(highest, highest + delta)), False
+
+
+def successors(bytecode: Bytecode, index: int, pointer: Range,
+               loop_starts: Optional[List[int]]) -> List[Tuple[int, Range]]:
+    """
+    Returns the instructions that can run after an instruction and the range
+    the pointer has then. Without loop starts the bytecode is structured, otherwise
+    the end of a loop can return to any of the loop starts.
+    """
+    opcode = bytecode.opcodes[index]
+    operand = bytecode.operands[index]
+
+    if opcode == LOOP_END or opcode == END:
+        if loop_starts is None:
+            return [(operand, pointer)] if opcode == LOOP_END else []
+        return [(start, pointer) for start in loop_starts]
+    if opcode == JUMP:
+        return [(operand, pointer)]
+    if opcode == LABEL_GOTO and operand >= 0:
+        return [(operand, pointer)]
+    if opcode in BRANCH_OPCODES:
+        return [(index + 1, pointer)] + ([(operand, pointer)] if operand >= 0 else [])
+    if opcode in FOLDED_OPCODES:
+        constant = bytecode.constants[operand]
+        after = pointer
+        if opcode == POINTER_MOVE_FOLDED:
+            delta, low, high, _ = constant
+            after = (max(pointer[0] + delta, 0), pointer[1] + delta)
+        elif opcode == POINTER_SCAN:
+            # A scan can stop at any cell in its direction
+            after = (pointer[0], math.inf) if constant[0] > 0 else (0, pointer[1])
+        return [(index + 1, after), (constant[-1], pointer)]
+
+    if opcode == POINTER_MOVE_RIGHT:
+        pointer, _ = move(pointer, 0, 1, 1)
+    elif opcode == POINTER_MOVE_LEFT:
+        pointer, _ = move(pointer, -1, 0, -1)
+    elif opcode == POINTER_MOVE_RELATIVE:
+        pointer, _ = move(pointer, min(0, operand), max(0, operand), operand)
+    elif opcode == POINTER_MOVE_TO:
+        pointer = (operand, operand) if operand >= 0 else pointer
+    elif opcode == CALL_FUNCTION and bytecode.constants[operand][0] in POINTER_COMMANDS:
+        pointer = (0, math.inf)
+    return [(index + 1, pointer)]
+
+
+def join(old: Optional[Range], new: Range, widenings: int) -> Range:
+    """
+    Returns the range that holds both ranges. A range that has been widened
+    too often gets the bounds that still move set to 0 or infinity.
+    """
+    if old is None:
+        return new
+    joined = (min(old[0], new[0]), max(old[1], new[1]))
+    if widenings > WIDEN_AFTER:
+        joined = (0 if joined[0] < old[0] else joined[0],
+                  math.inf if joined[1] > old[1] else joined[1])
+    return joined
+
+
+def pointer_ranges(bytecode: Bytecode) -> List[Optional[Range]]:
+    """
+    Returns the range of cells the pointer can be at before every instruction,
+    for a run that starts at the first instruction with the pointer at cell 0,
+    or None for an instruction that is never run
+    """
+    loop_starts = None
+    if not is_structured(bytecode):
+        loop_starts = [index for index, opcode in enumerate(bytecode.opcodes)
+                       if opcode == LOOP_START]
+
+    ranges: List[Optional[Range]] = [None] * len(bytecode)
+    widenings: Dict[int, int] = {}
+    ranges[0] = (0, 0)
+    waiting = [0]
+    while waiting:
+        index = waiting.pop()
+        for successor, pointer in successors(bytecode, index, ranges[index], loop_starts):
+            widenings[successor] = widenings.get(successor, 0) + 1
+            joined = join(ranges[successor], pointer, widenings[successor])
+            if joined != ranges[successor]:
+                ranges[successor] = joined
+                waiting.append(successor)
+    return ranges
+
+
+def unchecked_instruction(bytecode: Bytecode, index: int,
+                          pointer: Range) -> Optional[Tuple[Opcode, int, int]]:
+    """
+    Returns the unchecked opcode and operand of an instruction, and the highest cell
+    it uses, or None when its bounds check can fail or it does not have one
+    """
+    opcode = bytecode.opcodes[index]
+    operand = bytecode.operands[index]
+    lowest, highest = pointer
+
+    if opcode == POINTER_MOVE_RIGHT:
+        low, high, delta, unchecked = 0, 1, 1, Opcode.POINTER_MOVE_RIGHT_UNCHECKED
+    elif opcode == POINTER_MOVE_LEFT:
+        low, high, delta, unchecked = -1, 0, -1, Opcode.POINTER_MOVE_LEFT_UNCHECKED
+    elif opcode == POINTER_MOVE_RELATIVE:
+        low, high, delta, unchecked = \
+            min(0, operand), max(0, operand), operand, Opcode.POINTER_MOVE_RELATIVE_UNCHECKED
+    elif opcode == POINTER_MOVE_FOLDED:
+        # A folded move that can not fail never needs the moves it replaces
+        delta, low, high, _ = bytecode.constants[operand]
+        unchecked = Opcode.POINTER_MOVE_RELATIVE_UNCHECKED
+    elif opcode in RIGHT_CELL_OPCODES:
+        low, high, delta, unchecked = 0, 1, 0, RIGHT_CELL_OPCODES[Opcode(opcode)]
+    elif opcode == POINTER_MOVE_TO and operand >= 0:
+        return Opcode.POINTER_MOVE_TO_UNCHECKED, operand, operand
+    elif opcode == COPY_VALUE_TO and operand >= 0:
+        return Opcode.COPY_VALUE_TO_UNCHECKED, operand, operand
+    else:
+        return None
+
+    _, safe = move(pointer, low, high, delta)
+    if not safe:
+        return None
+    operand = delta if unchecked == Opcode.POINTER_MOVE_RELATIVE_UNCHECKED else operand
+    return unchecked, operand, int(highest) + high
+
+
+def remove_bounds_checks(bytecode: Bytecode) -> Bytecode:
+    """
+    Returns the bytecode with an unchecked variant of every pointer move and use
+    of another cell of which the analysis proves it stays within the memory.
+    Its extent is the highest cell the unchecked instructions use, so it may only run
+    on a memory with more cells than that, otherwise a check could have failed.
+    Every instruction keeps its index, so a paused run can continue in either bytecode.
+    A program without loops and gotos runs every instruction at most once,
+    so it is not analysed and returned as it is.
+    """
+    if not any(opcode == LOOP_END or opcode in GOTO_OPCODES for opcode in bytecode.opcodes):
+        return Bytecode(bytecode.opcodes, bytecode.operands, bytecode.constants,
+                        positions=bytecode.positions)
+    opcodes = array('B', bytecode.opcodes)
+    operands = array('q', bytecode.operands)
+    extent = -1
+    for index, pointer in enumerate(pointer_ranges(bytecode)):
+        if pointer is None or opcodes[index] not in CHECKED_OPCODES:
+            continue
+        instruction = unchecked_instruction(bytecode, index, pointer)
+        if instruction is not None:
+            opcodes[index], operands[index], highest = instruction
+            extent = max(extent, highest)
+    return Bytecode(opcodes, operands, bytecode.constants, extent, bytecode.positions)
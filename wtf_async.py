@@ -0,0 +1,100 @@
+"""A runner that executes compiled WTFZOMFG programs in an asyncio event loop"""
+import asyncio
+from typing import List, Optional, Tuple, Union
+
+import wtf_functions as wtf
+from wtf_engine import STOP, step
+from wtf_interpreter import Program
+from wtf_io import AsyncInputSource, AsyncOutputSink
+from wtf_objects import ERROR_LIMIT, DebugSink, ErrorStore, Function, Interpreter, PagedTape, \
+    ProgramState, Tape, create_memory
+
+# The amount of dispatches after which a program lets other tasks run
+YIELD_EVERY = 1000
+
+
+async def execute(program_state: ProgramState, functions: List[Function],
+                  yield_every: int = YIELD_EVERY) -> Tuple[ProgramState, int]:
+    """
+    Executes resolved functions with the step of the flat engine, changing the program
+    state in place. ^ and / await the input source of the program state, after flushing
+    the output. Every yield_every dispatches the output is flushed when it is full
+    and the program lets the other tasks of the event loop run.
+    Returns the program state and the amount of dispatches.
+    """
+    p_s = program_state
+    input_source = p_s.input
+    output = p_s.output
+    loops = []
+    index = 0
+    count = 0
+    pause = yield_every
+    end = len(functions)
+
+    while True:
+        if count >= pause:
+            pause = count + yield_every
+            if output.is_full():
+                await output.flush()
+            await asyncio.sleep(0)
+
+        # Input is awaited, so other programs run while this one waits
+        function = functions[index].func if index < end else None
+        if function is wtf.scan_ascii:
+            await output.flush()
+            p_s.memory[p_s.pointer] = await input_source.read_character()
+            index += 1
+            count += 1
+        elif function is wtf.scan_decimal:
+            await output.flush()
+            p_s.memory[p_s.pointer] = await input_source.read_number()
+            index += 1
+            count += 1
+        else:
+            following, dispatches = step(p_s, functions, index, loops)
+            count += dispatches
+            if following == STOP:
+                break
+            index = following
+
+    p_s.next_index = index
+    return p_s, count
+
+
+async def run_async(program: Program,
+                    input_source: Optional[AsyncInputSource] = None,
+                    output: Optional[AsyncOutputSink] = None,
+                    memory: Union[List[Union[str, int]], Tape, PagedTape, None] = None,
+                    memory_length: Optional[int] = None, cell_width: int = 0,
+                    paged: bool = False, yield_every: int = YIELD_EVERY,
+                    detail: Optional[str] = None,
+                    window: Optional[Tuple[int, int]] = None,
+                    error_limit: int = ERROR_LIMIT,
+                    debug: Optional[DebugSink] = None) -> Interpreter:
+    """
+    Runs a compiled program as a task of the event loop and returns the result, like
+    Program.run does, at the detail level and with the window and debug sink it takes.
+    The engine of the program is not used, the program is run by the async runner.
+    Without an input source the program reads an empty input, without an output sink
+    it prints to sys.stdout. The run keeps at most error_limit different errors.
+    yield_every has to be at least 1.
+    """
+    if yield_every < 1:
+        raise ValueError("A program has to yield after at least 1 dispatch, not " +
+                         str(yield_every))
+    if memory is None:
+        memory = create_memory(memory_length, cell_width, paged)
+    if input_source is None:
+        input_source = AsyncInputSource()
+    if output is None:
+        output = AsyncOutputSink()
+    program_state = ProgramState(memory, 0, ErrorStore(program.resolution_errors, error_limit), 0,
+                                 output, input_source, debug)
+
+    try:
+        program_state, count = await execute(program_state, list(program.functions),
+                                             yield_every)
+    finally:
+        await output.flush()
+
+    return program.result(program_state, count, None, None, detail, window)
@@ -0,0 +1,203 @@
+"""A batch runner that runs many WTFZOMFG programs in a pool of processes"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from wtf_brainfuck import BRAINFUCK_EXTENSIONS, LANGUAGES, find_language
+from wtf_interpreter import ENGINES, Program, compile_file
+from wtf_io import InputSource, OutputSink
+from wtf_objects import CELL_WIDTHS, ErrorStore, PagedTape, Tape, create_memory
+from wtf_optimizer import OPTIMIZATION_LEVELS
+
+PROGRAM_EXTENSIONS = [".wtf"] + BRAINFUCK_EXTENSIONS
+
+# The programs every worker process has compiled, so a program that is used
+# by many jobs is only lexed, parsed, resolved and compiled once per worker
+COMPILED_PROGRAMS: Dict[Tuple[str, str, int, str], Program] = {}
+
+
+class BatchJob:
+    """
+    A data object that holds a program to run, the input that is fed to it
+    and its amount of memory cells, None for a memory that grows as it is used
+    """
+
+    def __init__(self, program: str, input_text: str = "",
+                 memory_length: Optional[int] = None) -> None:
+        self.program = program
+        self.input_text = input_text
+        self.memory_length = memory_length
+
+    def __str__(self) -> str:
+        return self.program
+
+    def __repr__(self) -> str:
+        return "BatchJob(" + self.program + ", " + str(self.memory_length) + ")"
+
+
+class BatchOptions:
+    """
+    A data object that holds how every job of a batch is run
+    """
+
+    def __init__(self, engine: str = "vm", optimization: int = 1, cell_width: int = 0,
+                 language: Optional[str] = None, use_cache: bool = True) -> None:
+        self.engine = engine
+        self.optimization = optimization
+        self.cell_width = cell_width
+        self.language = language
+        self.use_cache = use_cache
+
+
+def directory_jobs(directory: str, memory_length: Optional[int] = None) -> List[BatchJob]:
+    """
+    Returns a job without input for every program in a directory, in alphabetical order
+    """
+    names = sorted(name for name in os.listdir(directory)
+                   if any(map(name.lower().endswith, PROGRAM_EXTENSIONS)))
+    return [BatchJob(os.path.join(directory, name), "", memory_length) for name in names]
+
+
+def manifest_jobs(manifest: str, memory_length: Optional[int] = None) -> List[BatchJob]:
+    """
+    Returns the jobs of a manifest, a JSON Lines file with a job on every line, like
+    {"program": "beer.wtf", "input": "1 2", "memory": 10}. Instead of input, a job can
+    have an input_file to read the input from. Paths are relative to the manifest,
+    and jobs without memory get the given memory length.
+    """
+    directory = os.path.dirname(os.path.abspath(manifest))
+    jobs = []
+    with open(manifest, "r") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            job = json.loads(line)
+            input_text = job.get("input", "")
+            if "input_file" in job:
+                with open(os.path.join(directory, job["input_file"]), "r") as input_file:
+                    input_text = input_file.read()
+            jobs.append(BatchJob(os.path.join(directory, job["program"]), input_text,
+                                 job.get("memory", memory_length)))
+    return jobs
+
+
+def find_jobs(path: str, memory_length: Optional[int] = None) -> List[BatchJob]:
+    """
+    Returns the jobs of a directory of programs or of a manifest
+    """
+    if os.path.isdir(path):
+        return directory_jobs(path, memory_length)
+    return manifest_jobs(path, memory_length)
+
+
+def compile_program(program: str, options: BatchOptions) -> Program:
+    """
+    Returns a compiled program, compiling it only the first time a worker sees it.
+    Only the errors of the lexer and parser are stored in a result, so the program
+    does not keep its tokens and parsed functions. Its runs still return the memory.
+    """
+    key = (os.path.abspath(program), options.engine, options.optimization,
+           find_language(program, options.language))
+    if key not in COMPILED_PROGRAMS:
+        COMPILED_PROGRAMS[key] = compile_file(program, options.engine, options.optimization,
+                                              options.use_cache, options.language, "minimal")
+    return COMPILED_PROGRAMS[key]
+
+
+def run_job(job: BatchJob, options: BatchOptions) -> dict:
+    """
+    Runs a job in a worker and returns its result. The output of the program is
+    collected in memory and its input is read from the job, so jobs never print to
+    the terminal or ask for input. Errors and exceptions are stored in the result,
+    so a job that fails, however it fails, does not stop the other jobs.
+    """
+    result = {"program": job.program, "memory_length": job.memory_length}
+    start = time.perf_counter()
+    try:
+        program = compile_program(job.program, options)
+    except Exception as exception:  # pylint: disable=broad-except
+        result["exception"] = repr(exception)
+        return result
+    result["compile_seconds"] = time.perf_counter() - start
+    result["lexer_errors"] = list(map(str, program.lexer_errors))
+    result["parser_errors"] = list(map(str, program.parser_errors))
+
+    output = io.StringIO()
+    memory = None
+    start = time.perf_counter()
+    try:
+        memory = create_memory(job.memory_length, options.cell_width)
+        run = program.run(memory, input_source=InputSource(io.StringIO(job.input_text)),
+                          output=OutputSink(output), detail="full")
+        result["dispatches"] = run.dispatches
+        # The final memory is taken from the result, the engine may have run on a copy
+        memory, errors, pointer = run.program_memory, run.program_errors, run.program_pointer
+    except Exception as exception:  # pylint: disable=broad-except
+        result["exception"] = repr(exception)
+        errors, pointer = ErrorStore(), None
+    result["seconds"] = time.perf_counter() - start
+
+    result["output"] = output.getvalue()
+    result["errors"] = errors.lines()
+    result["memory"] = memory.tolist() if isinstance(memory, (Tape, PagedTape)) else memory
+    result["pointer"] = pointer
+    return result
+
+
+def run_batch(jobs: List[BatchJob], options: BatchOptions,
+              workers: Optional[int] = None) -> Iterator[dict]:
+    """
+    Runs the jobs in a pool of worker processes and yields their results
+    in the order of the jobs, as soon as they are done
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(run_job, jobs, [options] * len(jobs))
+
+
+if __name__ == "__main__":
+    ARG_PARSER = argparse.ArgumentParser(
+        description='Runs many wtfzomfg programs in a pool of processes')
+
+    ARG_PARSER.add_argument("path", type=str,
+                            help="a directory of programs, or a JSON Lines manifest of jobs")
+    ARG_PARSER.add_argument("-o", "--output", type=str, required=True,
+                            help="JSON Lines file to write the result of every job to")
+    ARG_PARSER.add_argument("-j", "--workers", type=int,
+                            help="amount of worker processes, by default one per processor")
+    ARG_PARSER.add_argument("-m", "--memory", type=int,
+                            help="amount of memory cells of jobs that do not set it, "
+                                 "without it the memory grows as far as the program goes")
+    ARG_PARSER.add_argument("-w", "--cell-width", choices=CELL_WIDTHS, default=0, type=int,
+                            help="bits per memory cell, numbers wrap around; 0 allows any number")
+    ARG_PARSER.add_argument("-l", "--language", choices=LANGUAGES,
+                            help="language of the programs, by default found by their extension")
+    ARG_PARSER.add_argument("--engine", choices=ENGINES, default=ENGINES[0],
+                            help="the engine that executes the programs")
+    ARG_PARSER.add_argument("-O", "--optimize", choices=OPTIMIZATION_LEVELS, default=1, type=int,
+                            help="optimization level, 0 runs the programs as they are written")
+    ARG_PARSER.add_argument("--no-cache", action="store_true",
+                            help="always lex and parse the programs, without the cache")
+
+    ARGS = ARG_PARSER.parse_args()
+    JOBS = find_jobs(ARGS.path, ARGS.memory)
+    OPTIONS = BatchOptions(ARGS.engine, ARGS.optimize, ARGS.cell_width,
+                           ARGS.language, not ARGS.no_cache)
+
+    FAILED = 0
+    with open(ARGS.output, "w") as RESULTS:
+        for INDEX, RESULT in enumerate(run_batch(JOBS, OPTIONS, ARGS.workers)):
+            RESULT["job"] = INDEX
+            RESULTS.write(json.dumps(RESULT) + "\n")
+            # Only the main process prints, one line per job, so nothing is interleaved
+            STATUS = "failed" if "exception" in RESULT else "ok"
+            FAILED += STATUS == "failed"
+            print(STATUS.ljust(7) + RESULT["program"] + " " +
+                  format(RESULT.get("seconds", 0.0), ".4f") + "s")
+
+    print(len(JOBS), "jobs,", FAILED, "failed")
+    sys.exit(1 if FAILED else 0)
@@ -0,0 +1,324 @@
+"""A benchmark suite that times lexing, parsing, resolving and executing WTFZOMFG programs"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+from wtf_interpreter import ENGINES, pre_run, run_resolved
+from wtf_io import InputSource, OutputSink
+from wtf_lexer import lexer
+from wtf_objects import ProgramState, create_memory
+from wtf_optimizer import OPTIMIZATION_LEVELS, optimize
+from wtf_parser import parse
+
+# Increase the version when the layout of a report changes
+VERSION = 1
+
+PHASES = ["lexer", "parse", "pre_run", "execute"]
+
+# The recursive engine copies the program state for every function,
+# so it can not run the larger programs of the suite
+BENCHMARK_ENGINES = [engine for engine in ENGINES if engine != "recursive"]
+
+MEMORY_SIZES = [100, 10000, 1000000]
+PROGRAM_SIZES = [100, 1000, 10000]
+
+# A phase is only a regression when it is slower than the baseline by both
+# the relative tolerance and this amount of seconds, so tiny timings do not fail on noise
+MIN_DIFFERENCE = 0.001
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class BenchmarkCase:
+    """
+    A data object that holds a program of the suite, the least amount
+    of memory it needs and the input that is fed to it
+    """
+
+    def __init__(self, name: str, source: str, memory_length: int,
+                 input_text: str = "", program_size: int = 0) -> None:
+        self.name = name
+        self.source = source
+        self.memory_length = memory_length
+        self.input_text = input_text
+        self.program_size = program_size
+
+    def __str__(self) -> str:
+        return self.name
+
+    def __repr__(self) -> str:
+        return "BenchmarkCase(" + self.name + ", " + str(self.memory_length) + ")"
+
+
+def read_source(file: str) -> str:
+    """
+    Returns the source of a file of the repository
+    """
+    with open(os.path.join(ROOT, file), "r") as source:
+        return source.read()
+
+
+def corpus_cases() -> List[BenchmarkCase]:
+    """
+    Returns the example programs with scripted input. The input is read in chunks,
+    so ^ and / read from one stream instead of one line each.
+    """
+    return [BenchmarkCase("example", read_source("example.wtf"), 10, "11\n0\n0\n"),
+            BenchmarkCase("beer", read_source("wtf/beer.wtf"), 5),
+            BenchmarkCase("brainfuck", read_source("wtf/brainfuck.wtf"), 12, "++>[-].,<")]
+
+
+def countdown_program(size: int) -> str:
+    """
+    A loop that counts a cell down from the size while counting the next cell up
+    """
+    return "=" + str(size) + " ( - > + < )\n"
+
+
+def goto_program(size: int) -> str:
+    """
+    The countdown loop written with a label and a conditional goto
+    """
+    return "=" + str(size) + " ;Loop - > + < ?Loop\n"
+
+
+def print_program(size: int) -> str:
+    """
+    A loop that prints text and the cell as many times as the size
+    """
+    return "=" + str(size) + " ( 'ab\" \\ .\\n - )\n"
+
+
+def straight_program(size: int) -> str:
+    """
+    A program without loops that is as many lines long as the size,
+    which mostly measures the lexer, parser and pre_run
+    """
+    return "+ + - ~3 > =7 < a .x # A comment\n" * size
+
+
+SYNTHETIC_PROGRAMS: Dict[str, Callable[[int], str]] = {
+    "countdown": countdown_program,
+    "goto": goto_program,
+    "print": print_program,
+    "straight": straight_program,
+}
+
+
+def synthetic_cases(program_sizes: List[int]) -> List[BenchmarkCase]:
+    """
+    Returns every synthetic program in every program size
+    """
+    return [BenchmarkCase(name + "-" + str(size), generate(size), 2, program_size=size)
+            for name, generate in SYNTHETIC_PROGRAMS.items() for size in program_sizes]
+
+
+def run_phases(case: BenchmarkCase, memory_length: int, engine: str,
+               optimization: int, measure: Callable[[], float]) -> Tuple[Dict[str, float], int]:
+    """
+    Lexes, parses, resolves and executes a case once. Returns what measure returns
+    after every phase, and the amount of dispatches of the execution.
+    The output of the program is collected in memory, so the terminal is not measured.
+    """
+    values = {}
+    measure()
+    tokens, _ = lexer(io.StringIO(case.source))
+    values["lexer"] = measure()
+    parsed, _ = parse(tokens)
+    values["parse"] = measure()
+
+    program_state = ProgramState(create_memory(memory_length), 0, [], 0,
+                                 OutputSink(io.StringIO()),
+                                 InputSource(io.StringIO(case.input_text)))
+    measure()
+    program_state, functions = pre_run(program_state, optimize(parsed, optimization), 0)
+    values["pre_run"] = measure()
+    _, count = run_resolved(program_state, functions, engine)
+    values["execute"] = measure()
+    return values, count
+
+
+def time_phases(case: BenchmarkCase, memory_length: int, engine: str,
+                optimization: int) -> Tuple[Dict[str, float], int]:
+    """
+    Returns the seconds every phase of a case takes, and the amount of dispatches
+    """
+    last = [time.perf_counter()]
+
+    def elapsed() -> float:
+        now = time.perf_counter()
+        seconds = now - last[0]
+        last[0] = now
+        return seconds
+
+    return run_phases(case, memory_length, engine, optimization, elapsed)
+
+
+def trace_phases(case: BenchmarkCase, memory_length: int, engine: str,
+                 optimization: int) -> Dict[str, int]:
+    """
+    Returns the peak amount of bytes that was allocated during every phase of a case.
+    Tracing slows the program down, so it is done in a separate run.
+    """
+    def peak() -> int:
+        _, peak_size = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        return peak_size
+
+    tracemalloc.start()
+    try:
+        peaks, _ = run_phases(case, memory_length, engine, optimization, peak)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def benchmark_case(case: BenchmarkCase, memory_length: int, engine: str,
+                   optimization: int, repeat: int) -> dict:
+    """
+    Runs a case repeatedly and returns the fastest time of every phase,
+    the instructions per second and the peak memory of every phase
+    """
+    seconds = dict.fromkeys(PHASES, float("inf"))
+    count = 0
+    for _ in range(repeat):
+        timings, count = time_phases(case, memory_length, engine, optimization)
+        seconds = {phase: min(seconds[phase], timings[phase]) for phase in PHASES}
+
+    return {"name": case.name,
+            "program_size": case.program_size,
+            "memory_length": memory_length,
+            "dispatches": count,
+            "instructions_per_second": count / seconds["execute"] if seconds["execute"] else 0.0,
+            "seconds": seconds,
+            "peak_memory": trace_phases(case, memory_length, engine, optimization)}
+
+
+def run_suite(cases: List[BenchmarkCase], memory_sizes: List[int], engine: str = "vm",
+              optimization: int = 1, repeat: int = 3) -> dict:
+    """
+    Benchmarks every case with every memory size that is large enough for it.
+    Returns a report that can be stored as JSON, with a result for every
+    combination of case and memory size.
+    """
+    results = {}
+    for case in cases:
+        for memory_length in sorted(set(max(size, case.memory_length) for size in memory_sizes)):
+            results[case.name + "@" + str(memory_length)] = \
+                benchmark_case(case, memory_length, engine, optimization, repeat)
+
+    return {"version": VERSION,
+            "python": platform.python_version(),
+            "engine": engine,
+            "optimization": optimization,
+            "repeat": repeat,
+            "results": results}
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.25) -> List[str]:
+    """
+    Compares a report to a stored baseline. Returns a message for every phase that
+    became slower or used more memory than the tolerance allows, and for every
+    result that is missing. Results that are not in the baseline are not compared.
+    """
+    if (report["engine"], report["optimization"]) != (baseline["engine"], baseline["optimization"]):
+        return ["The baseline was made with engine " + baseline["engine"] +
+                " at -O" + str(baseline["optimization"]) + ", not " + report["engine"] +
+                " at -O" + str(report["optimization"])]
+
+    regressions = []
+    for key, old in baseline["results"].items():
+        new = report["results"].get(key)
+        if new is None:
+            regressions.append(key + ": missing from the report")
+            continue
+        for phase in PHASES:
+            before, after = old["seconds"][phase], new["seconds"][phase]
+            if after > before * (1 + tolerance) and after - before > MIN_DIFFERENCE:
+                regressions.append(key + ": " + phase + " took " + format(after, ".4f") +
+                                   "s instead of " + format(before, ".4f") + "s")
+            before, after = old["peak_memory"][phase], new["peak_memory"][phase]
+            if after > before * (1 + tolerance):
+                regressions.append(key + ": " + phase + " used " + str(after) +
+                                   " bytes instead of " + str(before))
+    return regressions
+
+
+def format_report(report: dict) -> str:
+    """
+    Returns the report as a table for reading
+    """
+    header = ["case"] + PHASES + ["dispatches", "instr/s", "peak KiB"]
+    rows = [header]
+    for key, result in report["results"].items():
+        rows.append([key] +
+                    [format(result["seconds"][phase] * 1000, ".2f") + "ms" for phase in PHASES] +
+                    [str(result["dispatches"]),
+                     format(result["instructions_per_second"], ".0f"),
+                     str(max(result["peak_memory"].values()) // 1024)])
+    widths = [max(map(len, column)) for column in zip(*rows)]
+    return "\n".join(" ".join(cell.rjust(width) if index else cell.ljust(width)
+                              for index, (cell, width) in enumerate(zip(row, widths)))
+                     for row in rows)
+
+
+def load_report(file: str) -> Optional[dict]:
+    """
+    Reads a report that was written before, or returns None if there is none
+    """
+    try:
+        with open(file, "r") as report:
+            return json.load(report)
+    except FileNotFoundError:
+        return None
+
+
+if __name__ == "__main__":
+    ARG_PARSER = argparse.ArgumentParser(
+        description='Benchmarks lexing, parsing, resolving and executing wtfzomfg programs')
+
+    ARG_PARSER.add_argument("--engine", choices=BENCHMARK_ENGINES, default=BENCHMARK_ENGINES[0],
+                            help="the engine that executes the programs")
+    ARG_PARSER.add_argument("-O", "--optimize", choices=OPTIMIZATION_LEVELS, default=1, type=int,
+                            help="optimization level, 0 runs the programs as they are written")
+    ARG_PARSER.add_argument("-m", "--memory-sizes", nargs="+", type=int, default=MEMORY_SIZES,
+                            help="amounts of memory cells every program is run with")
+    ARG_PARSER.add_argument("-s", "--program-sizes", nargs="+", type=int, default=PROGRAM_SIZES,
+                            help="sizes of the synthetic programs")
+    ARG_PARSER.add_argument("-r", "--repeat", type=int, default=3,
+                            help="amount of runs of which the fastest time is kept")
+    ARG_PARSER.add_argument("-o", "--output", type=str,
+                            help="file to write the report to as JSON")
+    ARG_PARSER.add_argument("-b", "--baseline", type=str,
+                            help="report to compare with, regressions make the benchmark fail")
+    ARG_PARSER.add_argument("-t", "--tolerance", type=float, default=0.25,
+                            help="how much slower or larger than the baseline a phase may be, "
+                                 "0.25 allows 25 percent")
+
+    ARGS = ARG_PARSER.parse_args()
+
+    REPORT = run_suite(corpus_cases() + synthetic_cases(ARGS.program_sizes),
+                       ARGS.memory_sizes, ARGS.engine, ARGS.optimize, ARGS.repeat)
+    print(format_report(REPORT))
+
+    if ARGS.output:
+        with open(ARGS.output, "w") as OUTPUT_FILE:
+            json.dump(REPORT, OUTPUT_FILE, indent=2)
+
+    if ARGS.baseline:
+        BASELINE = load_report(ARGS.baseline)
+        if BASELINE is None:
+            ARG_PARSER.error("the baseline " + ARGS.baseline + " does not exist")
+        REGRESSIONS = compare(REPORT, BASELINE, ARGS.tolerance)
+        if REGRESSIONS:
+            print("\nREGRESSIONS compared to " + ARGS.baseline + ":", file=sys.stderr)
+            for REGRESSION in REGRESSIONS:
+                print("    " + REGRESSION, file=sys.stderr)
+            sys.exit(1)
+        print("\nNo regressions compared to " + ARGS.baseline)
@@ -0,0 +1,55 @@
+"""A lexer that reads Brainfuck and makes the same tokens as the WTFZOMFG lexer"""
+from typing import Iterable, Iterator, List, Tuple
+
+from wtf_errors import WtfError
+from wtf_objects import Token
+
+# Every Brainfuck command is a WTFZOMFG command without a value,
+# so the tokens are parsed, optimized and executed like any WTFZOMFG program
+BRAINFUCK_COMMANDS = {
+    '+': 'CELL_INCREASE',
+    '-': 'CELL_DECREASE',
+    '<': 'POINTER_MOVE_LEFT',
+    '>': 'POINTER_MOVE_RIGHT',
+    ',': 'SCAN_ASCII',
+    '.': 'PRINT_CELL_ASCII',
+    '[': 'LOOP_START',
+    ']': 'LOOP_END'}
+
+LANGUAGES = ["wtf", "brainfuck"]
+
+# Files with these extensions are read as Brainfuck, all others as WTFZOMFG
+BRAINFUCK_EXTENSIONS = [".b", ".bf"]
+
+
+def find_language(file: str, language: str = None) -> str:
+    """
+    Returns the language a file is written in: the given language,
+    or otherwise the language that belongs to the extension of the file
+    """
+    if language:
+        return language
+    if any(map(file.lower().endswith, BRAINFUCK_EXTENSIONS)):
+        return "brainfuck"
+    return "wtf"
+
+
+def generate_brainfuck_tokens(source: Iterable[str]) -> Iterator[Token]:
+    """
+    A generator that reads the source line by line and yields a token for every
+    Brainfuck command. The position of a token is its line and column.
+    All other characters are comments.
+    """
+    for line_nr, line in enumerate(source):
+        for column, character in enumerate(line):
+            if character in BRAINFUCK_COMMANDS:
+                yield Token(BRAINFUCK_COMMANDS[character], None, (line_nr + 1, column + 1))
+
+
+def brainfuck_lexer(source: Iterable[str]) -> Tuple[List[Token], List[WtfError]]:
+    """
+    A function that converts Brainfuck into tokens.
+    Returns a list of tokens and a list of errors, which is always empty
+    because every character that is not a command is a comment.
+    """
+    return list(generate_brainfuck_tokens(source)), []
@@ -0,0 +1,262 @@
+"""A compiler that lowers resolved WTFZOMFG functions to bytecode, and back to a listing"""
+from array import array
+from ast import literal_eval
+from enum import IntEnum
+from typing import List, Optional, Tuple
+
+from wtf_functions import TOKEN_FUNCTIONS, cell_increase_with, cell_multiply_add, cell_set, \
+    loop_increases, pointer_move_relative, pointer_scan
+from wtf_objects import Bytecode, Function
+from wtf_optimizer import cell_delta
+
+
+# Makes use of the command names of the tokens, so a listing reads like the source
+class Opcode(IntEnum):
+    """A class which represents all the instructions the virtual machine knows"""
+    END = 0
+    CALL_FUNCTION = 1
+    LABEL_GOTO = 2
+    LABEL_DECLARE = 3
+    LABEL_GOTO_NONZERO = 4
+    LABEL_GOTO_ZERO = 5
+    LOOP_START = 6
+    LOOP_END = 7
+    IF_START = 8
+    IF_END = 9
+    CELL_INCREASE = 10
+    CELL_DECREASE = 11
+    CELL_FLIP = 12
+    CELL_SET = 13
+    CELL_INCREASE_WITH = 14
+    COPY_VALUE_RIGHT = 15
+    COPY_VALUE_TO = 16
+    POINTER_MOVE_LEFT = 17
+    POINTER_MOVE_RIGHT = 18
+    POINTER_MOVE_TO = 19
+    POINTER_MOVE_RELATIVE = 20
+    CELL_SUBTRACT_ASCII = 21
+    CELL_ADD_RIGHT = 22
+    CELL_SUBTRACT_RIGHT = 23
+    CELL_MULTIPLY_RIGHT = 24
+    CELL_DEVIDE_RIGHT = 25
+    SCAN_ASCII = 26
+    SCAN_DECIMAL = 27
+    PRINT_CELL_ASCII = 28
+    PRINT_CELL_DECIMAL = 29
+    PRINT_CHARACTER = 30
+    PRINT_UNTIL = 31
+    PRINT_PROGRAM_STATE = 32
+    CELL_INCREASE_FOLDED = 33
+    POINTER_MOVE_FOLDED = 34
+    CELL_CLEAR = 35
+    JUMP = 36
+    POINTER_MOVE_LEFT_UNCHECKED = 37
+    POINTER_MOVE_RIGHT_UNCHECKED = 38
+    POINTER_MOVE_TO_UNCHECKED = 39
+    POINTER_MOVE_RELATIVE_UNCHECKED = 40
+    COPY_VALUE_RIGHT_UNCHECKED = 41
+    COPY_VALUE_TO_UNCHECKED = 42
+    CELL_ADD_RIGHT_UNCHECKED = 43
+    CELL_SUBTRACT_RIGHT_UNCHECKED = 44
+    CELL_MULTIPLY_RIGHT_UNCHECKED = 45
+    CELL_DEVIDE_RIGHT_UNCHECKED = 46
+    CELL_MULTIPLY_ADD = 47
+    POINTER_SCAN = 48
+
+
+# Operands are stored in a signed 64 bit array
+OPERAND_MIN = -2 ** 63
+OPERAND_MAX = 2 ** 63 - 1
+
+FUNCTION_COMMANDS = {function: command for command, function in TOKEN_FUNCTIONS.items()}
+
+# Instructions with a number as argument
+INTEGER_OPCODES = [
+    Opcode.CELL_SET,
+    Opcode.CELL_INCREASE_WITH,
+    Opcode.COPY_VALUE_TO,
+    Opcode.POINTER_MOVE_TO,
+    Opcode.POINTER_MOVE_RELATIVE,
+    Opcode.COPY_VALUE_TO_UNCHECKED,
+    Opcode.POINTER_MOVE_TO_UNCHECKED,
+    Opcode.POINTER_MOVE_RELATIVE_UNCHECKED]
+
+# Instructions with an index into the constants as argument
+CONSTANT_OPCODES = [
+    Opcode.CALL_FUNCTION,
+    Opcode.LABEL_DECLARE,
+    Opcode.PRINT_CHARACTER,
+    Opcode.PRINT_UNTIL,
+    Opcode.CELL_INCREASE_FOLDED,
+    Opcode.POINTER_MOVE_FOLDED,
+    Opcode.CELL_CLEAR,
+    Opcode.CELL_MULTIPLY_ADD,
+    Opcode.POINTER_SCAN]
+
+# Instructions with the index of another instruction as argument
+JUMP_OPCODES = [
+    Opcode.LABEL_GOTO,
+    Opcode.LABEL_GOTO_NONZERO,
+    Opcode.LABEL_GOTO_ZERO,
+    Opcode.LOOP_START,
+    Opcode.LOOP_END,
+    Opcode.IF_START,
+    Opcode.JUMP]
+
+# Functions made by the optimizer that fall back to the functions they replace
+FOLDED_OPCODES = {
+    cell_increase_with: Opcode.CELL_INCREASE_FOLDED,
+    pointer_move_relative: Opcode.POINTER_MOVE_FOLDED,
+    cell_set: Opcode.CELL_CLEAR,
+    cell_multiply_add: Opcode.CELL_MULTIPLY_ADD,
+    pointer_scan: Opcode.POINTER_SCAN}
+
+
+def encode_integer(args: str) -> Tuple[bool, int]:
+    """
+    Decodes an argument to an operand. Returns False when the argument
+    does not fit the operand array or would be shown differently in an error.
+    """
+    try:
+        value = int(args)
+    except (TypeError, ValueError):
+        return False, 0
+    if not OPERAND_MIN <= value <= OPERAND_MAX or str(value) != args:
+        return False, 0
+    return True, value
+
+
+def encode_function(function: Function, constants: List, offset: int = 0) -> Tuple[Opcode, int]:
+    """
+    Returns the opcode and operand of a resolved function. Functions of which
+    the argument can not be decoded ahead of time are called as they are.
+    Jump targets are moved by the offset of the block the function is in.
+    """
+    command = FUNCTION_COMMANDS[function.func]
+    opcode = Opcode[command]
+    args = function.args
+
+    if opcode in JUMP_OPCODES:
+        return opcode, -1 if function.target is None else function.target + offset
+    if opcode in INTEGER_OPCODES:
+        valid, value = encode_integer(args)
+        if valid:
+            return opcode, value
+    elif opcode is Opcode.CELL_SUBTRACT_ASCII:
+        if args:
+            return opcode, ord(args[0])
+    elif opcode is Opcode.LABEL_DECLARE:
+        constants.append(args)
+        return opcode, len(constants) - 1
+    elif opcode in (Opcode.PRINT_CHARACTER, Opcode.PRINT_UNTIL):
+        constants.append(args.replace("\\n", "\n"))
+        return opcode, len(constants) - 1
+    else:
+        return opcode, 0
+
+    constants.append((command, args))
+    return Opcode.CALL_FUNCTION, len(constants) - 1
+
+
+def folded_constant(function: Function, fallback: int) -> Tuple[int, ...]:
+    """
+    Returns the constant of a folded function: its decoded values
+    and the index of the block with the functions it replaces.
+    """
+    if function.func is pointer_move_relative:
+        low, high = function.span
+        return int(function.args), low, high, fallback
+    if function.func is cell_set:
+        return cell_delta(function.folded[1]), fallback
+    if function.func is cell_multiply_add:
+        low, high = function.span
+        control, increases = loop_increases(function.args)
+        return control, low, high, increases, fallback
+    if function.func is pointer_scan:
+        low, high = function.span
+        return int(function.args), low, high, fallback
+    return int(function.args), fallback
+
+
+def compile_block(functions: List[Function], offset: int, resume: int,
+                  encoded: List[Tuple[Opcode, int]], constants: List,
+                  positions: List[Optional[Tuple[int, int]]]) -> None:
+    """
+    Compiles a block of functions starting at the offset and ending with a jump to
+    resume, or an END instruction when resume is None. The functions replaced by
+    folded functions are compiled to blocks after it. The source position of every
+    instruction is added to the positions.
+    """
+    folded = []
+    for function in functions:
+        if function.folded and function.func in FOLDED_OPCODES:
+            constants.append(None)
+            folded.append((len(constants) - 1, function, len(encoded)))
+            encoded.append((FOLDED_OPCODES[function.func], len(constants) - 1))
+        else:
+            encoded.append(encode_function(function, constants, offset))
+        positions.append(function.position)
+    encoded.append((Opcode.END, 0) if resume is None else (Opcode.JUMP, resume))
+    positions.append(None)
+
+    for constant, function, index in folded:
+        constants[constant] = folded_constant(function, len(encoded))
+        compile_block(function.folded, len(encoded), index + 1, encoded, constants, positions)
+
+
+def compile_functions(functions: List[Function]) -> Bytecode:
+    """
+    Compiles functions that have been resolved by pre_run to bytecode.
+    An END instruction is added after the last function.
+    """
+    constants = []
+    encoded = []
+    positions = []
+    compile_block(functions, 0, None, encoded, constants, positions)
+
+    opcodes = array('B', map(lambda instruction: instruction[0], encoded))
+    operands = array('q', map(lambda instruction: instruction[1], encoded))
+    return Bytecode(opcodes, operands, constants, positions=positions)
+
+
+def disassemble(bytecode: Bytecode) -> str:
+    """
+    Creates a listing with one instruction per line, which can be assembled again
+    """
+    lines = []
+    for index, (opcode, operand) in enumerate(zip(bytecode.opcodes, bytecode.operands)):
+        opcode = Opcode(opcode)
+        line = str(index).rjust(6) + "  " + opcode.name
+        if opcode in CONSTANT_OPCODES:
+            line += " " + repr(bytecode.constants[operand])
+        elif opcode in JUMP_OPCODES:
+            line += " -> " + str(operand)
+        elif opcode in INTEGER_OPCODES or opcode is Opcode.CELL_SUBTRACT_ASCII:
+            line += " " + str(operand)
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def assemble(listing: str) -> Bytecode:
+    """
+    Creates bytecode from a listing made by disassemble
+    """
+    opcodes = array('B')
+    operands = array('q')
+    constants = []
+    for line in filter(lambda line: line.strip(), listing.splitlines()):
+        _, name, *rest = line.split(maxsplit=2)
+        opcode = Opcode[name]
+        argument = rest[0] if rest else ""
+        if opcode in CONSTANT_OPCODES:
+            constants.append(literal_eval(argument))
+            operand = len(constants) - 1
+        elif opcode in JUMP_OPCODES:
+            operand = int(argument.replace("->", ""))
+        elif argument:
+            operand = int(argument)
+        else:
+            operand = 0
+        opcodes.append(opcode)
+        operands.append(operand)
+    return Bytecode(opcodes, operands, constants)
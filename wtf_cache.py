@@ -0,0 +1,220 @@
+"""A cache that stores lexed and parsed WTFZOMFG programs on disk, next to the source"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+from wtf_brainfuck import brainfuck_lexer
+from wtf_errors import RestoredError, WtfError
+from wtf_functions import TOKEN_FUNCTIONS
+from wtf_lexer import lexer
+from wtf_objects import Function, Token
+from wtf_parser import parse
+
+# Increase the version when the tokens or functions made by
+# the lexer or parser change, so old entries are not used anymore
+VERSION = 4
+
+CACHE_DIRECTORY = "__wtfcache__"
+CACHE_SUFFIX = ".wtfc"
+
+# The least recently used entries are removed when the cache grows beyond this size
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+# The lexer of every language a program can be written in
+LEXERS = {"wtf": lexer, "brainfuck": brainfuck_lexer}
+
+# The command of every function, functions are stored by their command
+FUNCTION_COMMANDS = {function: command for command, function in TOKEN_FUNCTIONS.items()}
+
+ParsedProgram = Tuple[List[Token], List[WtfError], List[Function], List[WtfError]]
+
+
+def source_hash(file: str, language: str = "wtf") -> str:
+    """
+    Returns the hash of the interpreter version, the language and the content
+    of a file, reading the file in chunks
+    """
+    digest = hashlib.sha256(str(VERSION).encode() + b"\0" + language.encode() + b"\0")
+    with open(file, "rb") as source:
+        for chunk in iter(lambda: source.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_directory(file: str) -> str:
+    """
+    Returns the cache directory for a file, which is placed next to it like __pycache__
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(file)), CACHE_DIRECTORY)
+
+
+def encode_program(program: ParsedProgram) -> bytes:
+    """
+    Returns a program as JSON. Tokens and functions are stored as their command, value
+    and position, errors only as their message.
+    """
+    tokens, lexer_errors, parsed, parser_errors = program
+    return json.dumps({
+        "tokens": [[token.command, token.value, token.position] for token in tokens],
+        "lexer_errors": list(map(str, lexer_errors)),
+        "functions": [[FUNCTION_COMMANDS[function.func], function.args, function.position]
+                      for function in parsed],
+        "parser_errors": list(map(str, parser_errors))}, separators=(",", ":")).encode()
+
+
+def decode_position(position: Optional[list]) -> Optional[Tuple[int, int]]:
+    """
+    Returns a stored position as a tuple of a line and word
+    """
+    if position is None:
+        return None
+    line, word = position
+    if type(line) is not int or type(word) is not int:
+        raise ValueError("A position holds two numbers")
+    return line, word
+
+
+def decode_text(text: Optional[str]) -> Optional[str]:
+    """
+    Returns a stored command, value or message, which is a string or nothing
+    """
+    if text is not None and type(text) is not str:
+        raise ValueError("Expected a string")
+    return text
+
+
+def decode_program(data: bytes) -> ParsedProgram:
+    """
+    Returns the program that encode_program stored. The functions are looked up
+    by their command, so an entry only holds data and can never run code.
+    Raises a ValueError, KeyError, TypeError or RecursionError when the entry
+    is not a valid program.
+    """
+    stored = json.loads(data)
+    tokens = [Token(decode_text(command), decode_text(value), decode_position(position))
+              for command, value, position in stored["tokens"]]
+    parsed = [Function(TOKEN_FUNCTIONS[command], decode_text(args),
+                       position=decode_position(position))
+              for command, args, position in stored["functions"]]
+    lexer_errors = [RestoredError(decode_text(message)) for message in stored["lexer_errors"]]
+    parser_errors = [RestoredError(decode_text(message)) for message in stored["parser_errors"]]
+    return tokens, lexer_errors, parsed, parser_errors
+
+
+def read_entry(path: str) -> Optional[ParsedProgram]:
+    """
+    Reads a cached program, or returns None if it is missing or is not a valid entry,
+    which is then removed so it is written again. A cache hit marks the entry
+    as recently used.
+    """
+    try:
+        with open(path, "rb") as entry:
+            data = entry.read()
+    except OSError:
+        return None
+    try:
+        program = decode_program(data)
+    except (ValueError, KeyError, TypeError, RecursionError):
+        remove_entry(path)
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return program
+
+
+def write_entry(path: str, program: ParsedProgram) -> None:
+    """
+    Writes a program to the cache. The entry is written to a temporary file first
+    and then renamed, so other processes never read a half written entry.
+    """
+    directory = os.path.dirname(path)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    except OSError:
+        return
+    try:
+        with os.fdopen(handle, "wb") as entry:
+            entry.write(encode_program(program))
+        os.replace(temporary, path)
+    except OSError:
+        remove_entry(temporary)
+
+
+def remove_entry(path: str) -> None:
+    """
+    Removes a file from the cache, if it still exists
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict(directory: str, max_size: int = MAX_CACHE_SIZE) -> None:
+    """
+    Removes the least recently used entries until the cache is not larger than max_size
+    """
+    try:
+        entries = [entry for entry in os.scandir(directory)
+                   if entry.is_file() and entry.name.endswith(CACHE_SUFFIX)]
+        stats = list(map(lambda entry: (entry.stat().st_mtime, entry.stat().st_size, entry.path),
+                         entries))
+    except OSError:
+        return
+
+    size = sum(map(lambda stat: stat[1], stats))
+    for _, entry_size, path in sorted(stats):
+        if size <= max_size:
+            break
+        remove_entry(path)
+        size -= entry_size
+
+
+def clear_cache(file: str) -> int:
+    """
+    Removes all cached programs of the directory a file is in.
+    Returns the amount of removed entries.
+    """
+    directory = cache_directory(file)
+    try:
+        paths = [entry.path for entry in os.scandir(directory) if entry.is_file()]
+    except OSError:
+        return 0
+    list(map(remove_entry, paths))
+    return len(paths)
+
+
+def lex_and_parse(file: str, language: str = "wtf") -> ParsedProgram:
+    """
+    Lexes and parses a file written in the language without using the cache
+    """
+    with open(file, "r") as source:
+        tokens, lexer_errors = LEXERS[language](source)
+    parsed, parser_errors = parse(tokens)
+    return tokens, lexer_errors, parsed, parser_errors
+
+
+def load_program(file: str, use_cache: bool = True,
+                 max_size: int = MAX_CACHE_SIZE, language: str = "wtf") -> ParsedProgram:
+    """
+    Returns the tokens, lexer errors, parsed functions and parser errors of a file
+    written in the language. When the cache is used, a program with the same content
+    that was lexed and parsed before is read from the cache, otherwise it is lexed,
+    parsed and stored.
+    """
+    if not use_cache:
+        return lex_and_parse(file, language)
+
+    directory = cache_directory(file)
+    path = os.path.join(directory, source_hash(file, language) + CACHE_SUFFIX)
+    program = read_entry(path)
+    if program is None:
+        program = lex_and_parse(file, language)
+        write_entry(path, program)
+        evict(directory, max_size)
+    return program
@@ -0,0 +1,269 @@
+"""Checkpoints that store a paused WTFZOMFG run in a compact binary file"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from typing import List, Optional, Tuple, Union
+
+from wtf_errors import RestoredError, WtfError
+from wtf_io import InputSource, OutputSink
+from wtf_objects import CELL_TYPECODES, Bytecode, Continuation, DebugSink, ErrorEntry, ErrorStore, \
+    PagedTape, ProgramState, Tape
+
+# Increase the version when the layout of a checkpoint changes,
+# older checkpoints can then not be restored anymore
+VERSION = 4
+
+MAGIC = b"WTFCHECK"
+
+# The magic, the version and the length of the metadata
+HEADER = struct.Struct("<8sII")
+
+# Every buffer starts at a multiple of this amount of bytes, so its cells are aligned
+ALIGNMENT = 8
+
+# Cells of a memory without a cell width are stored as 64 bit numbers,
+# the few that do not fit are stored in the metadata
+LIST_WIDTH = 64
+
+# The types of the errors a checkpoint can hold, by name
+ERROR_TYPES = {error_type.__name__: error_type for error_type in WtfError.__subclasses__()}
+
+Memory = Union[List[Union[str, int]], Tape, PagedTape]
+
+
+def fingerprint(bytecode: Bytecode) -> str:
+    """
+    Returns the hash of a compiled program and the source positions of its instructions,
+    so a checkpoint is only restored with the program that made it
+    """
+    digest = hashlib.sha256(bytecode.opcodes.tobytes())
+    digest.update(bytecode.operands.tobytes())
+    digest.update(repr(bytecode.constants).encode())
+    # Kept errors are stored by their position
+    digest.update(repr(bytecode.positions).encode())
+    return digest.hexdigest()
+
+
+def aligned(offset: int) -> int:
+    """
+    Returns the first offset from the given offset on that is a multiple of the alignment
+    """
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class BufferWriter:
+    """
+    Collects the buffers of a checkpoint and the offset every buffer is stored at,
+    counted from the start of the data
+    """
+
+    def __init__(self) -> None:
+        self.buffers: List[Tuple[int, memoryview]] = []
+        self.size = 0
+
+    def add(self, buffer: Union[array, bytearray, memoryview]) -> List[int]:
+        """
+        Adds a buffer and returns its offset and amount of bytes
+        """
+        view = memoryview(buffer).cast("B")
+        offset = aligned(self.size)
+        self.buffers.append((offset, view))
+        self.size = offset + len(view)
+        return [offset, len(view)]
+
+
+def describe_tape(tape: Tape, writer: BufferWriter) -> dict:
+    """
+    Adds the cells and character tags of a tape to the writer and returns its description
+    """
+    return {"kind": "tape", "width": tape.width, "length": len(tape),
+            "itemsize": array(CELL_TYPECODES[tape.width]).itemsize,
+            "char_count": tape.char_count,
+            "values": writer.add(tape.values), "chars": writer.add(tape.chars)}
+
+
+def describe_list(memory: List[Union[str, int]], writer: BufferWriter) -> dict:
+    """
+    Adds a memory without a cell width to the writer as 64 bit cells and returns
+    its description, which holds the numbers that do not fit such a cell
+    """
+    tape = Tape(len(memory), LIST_WIDTH)
+    big = {}
+    for index, value in enumerate(memory):
+        if isinstance(value, int) and not tape.low <= value < -tape.low:
+            big[str(index)] = str(value)
+        else:
+            tape[index] = value
+    description = describe_tape(tape, writer)
+    description.update(kind="list", big=big)
+    return description
+
+
+def describe_memory(memory: Memory, writer: BufferWriter) -> dict:
+    """
+    Adds the buffers of a memory to the writer and returns its description
+    """
+    if isinstance(memory, Tape):
+        return describe_tape(memory, writer)
+    if isinstance(memory, PagedTape):
+        return {"kind": "paged", "limit": memory.limit, "width": memory.width,
+                "page_size": memory.page_size, "extent": memory.extent,
+                "peak_pages": memory.peak_pages,
+                "pages": {str(number): describe_memory(page, writer)
+                          for number, page in sorted(memory.pages.items())}}
+    return describe_list(memory, writer)
+
+
+def describe_errors(errors: ErrorStore) -> dict:
+    """
+    Returns the description of an error store, of which only the type, position
+    and message of the kept errors are kept
+    """
+    # A restored error is kept under the type it had before it was stored
+    return {"limit": errors.limit, "total": errors.total, "dropped": errors.dropped,
+            "entries": [[(key[0] if isinstance(key, tuple) else type(entry.error)).__name__,
+                         entry.position, str(entry.error), entry.count, entry.first, entry.last]
+                        for key, entry in errors.entries.items()]}
+
+
+def save_checkpoint(file: str, continuation: Continuation, program_fingerprint: str) -> None:
+    """
+    Writes a paused run to a file: the memory as raw buffers, and the pointer,
+    the index of the next instruction, the loop stack, the analysed pointer, the goto
+    labels, the amount of dispatches and the type, position, message and count of every
+    kept error as metadata. The input and output are not stored. The file is written to a temporary
+    file first and then renamed, so a checkpoint that is read is never half written.
+    """
+    p_s = continuation.program_state
+    writer = BufferWriter()
+    metadata = {"program": program_fingerprint,
+                "byteorder": sys.byteorder,
+                "pointer": p_s.pointer,
+                "next_index": p_s.next_index,
+                "loops": list(continuation.loops),
+                "dispatches": continuation.dispatches,
+                "analysed_pointer": continuation.analysed_pointer,
+                "goto_labels": p_s.goto_labels,
+                "errors": describe_errors(p_s.errors),
+                "memory": describe_memory(p_s.memory, writer)}
+    encoded = json.dumps(metadata, separators=(",", ":")).encode()
+    start = aligned(HEADER.size + len(encoded))
+
+    directory = os.path.dirname(os.path.abspath(file))
+    handle, temporary = tempfile.mkstemp(suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as checkpoint:
+            checkpoint.write(HEADER.pack(MAGIC, VERSION, len(encoded)))
+            checkpoint.write(encoded)
+            for offset, view in writer.buffers:
+                checkpoint.seek(start + offset)
+                checkpoint.write(view)
+            checkpoint.truncate(start + writer.size)
+        os.replace(temporary, file)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def read_values(data: memoryview, description: dict, swap: bool) -> Union[memoryview, array]:
+    """
+    Returns the cells of a stored tape. The cells are a view of the mapped file,
+    unless they were stored with another byte order and have to be swapped.
+    """
+    typecode = CELL_TYPECODES[description["width"]]
+    if array(typecode).itemsize != description["itemsize"]:
+        raise ValueError("The checkpoint was made on a machine with other cell sizes")
+    offset, size = description["values"]
+    values = data[offset:offset + size].cast(typecode)
+    if swap:
+        values = array(typecode, values)
+        values.byteswap()
+    return values
+
+
+def restore_memory(data: memoryview, description: dict, swap: bool) -> Memory:
+    """
+    Returns the memory a description stands for. The cells and tags of a tape
+    are used from the mapped file without copying them, a memory without
+    a cell width is read into a list.
+    """
+    if description["kind"] == "paged":
+        memory = PagedTape(description["limit"], description["width"], description["page_size"])
+        memory.extent = description["extent"]
+        memory.peak_pages = description["peak_pages"]
+        memory.pages = {int(number): restore_memory(data, page, swap)
+                        for number, page in description["pages"].items()}
+        return memory
+
+    offset, size = description["chars"]
+    tape = Tape(description["length"], description["width"],
+                read_values(data, description, swap), data[offset:offset + size],
+                description["char_count"])
+    if description["kind"] == "tape":
+        return tape
+    memory = tape.tolist()
+    for index, value in description["big"].items():
+        memory[int(index)] = int(value)
+    return memory
+
+
+def restore_errors(description: dict) -> ErrorStore:
+    """
+    Returns the error store a description stands for, with the kept errors as restored errors.
+    They are kept under their original type and position, so the same errors after
+    the run continues are counted with them.
+    """
+    errors = ErrorStore(limit=description["limit"])
+    errors.total = description["total"]
+    errors.dropped = description["dropped"]
+    for name, position, message, count, first, last in description["entries"]:
+        error = RestoredError(message)
+        if position is None:
+            errors.entries[first] = ErrorEntry(error, None, first, count, last)
+        else:
+            position = tuple(position)
+            key = (ERROR_TYPES.get(name, RestoredError), position)
+            errors.entries[key] = ErrorEntry(error, position, first, count, last)
+    return errors
+
+
+def load_checkpoint(file: str, program_fingerprint: Optional[str] = None,
+                    input_source: Optional[InputSource] = None,
+                    output: Optional[OutputSink] = None,
+                    debug: Optional[DebugSink] = None) -> Continuation:
+    """
+    Reads a paused run from a checkpoint. The file is mapped into memory copy on
+    write, so a large tape is not read or copied until its cells are used,
+    and changing them never changes the file. With a fingerprint, a checkpoint
+    made by another program is refused. The run reads from the input source
+    and prints to the output sink, and its dumps go to the debug sink, like a run that is started.
+    """
+    with open(file, "rb") as checkpoint:
+        mapped = mmap.mmap(checkpoint.fileno(), 0, access=mmap.ACCESS_COPY)
+    data = memoryview(mapped)
+
+    if len(data) < HEADER.size:
+        raise ValueError(file + " is not a checkpoint")
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(file + " is not a checkpoint")
+    if version != VERSION:
+        raise ValueError(file + " is a checkpoint of version " + str(version) +
+                         ", only version " + str(VERSION) + " can be restored")
+    metadata = json.loads(bytes(data[HEADER.size:HEADER.size + length]))
+    if program_fingerprint is not None and metadata["program"] != program_fingerprint:
+        raise ValueError(file + " is a checkpoint of another program")
+
+    memory = restore_memory(data[aligned(HEADER.size + length):], metadata["memory"],
+                            metadata["byteorder"] != sys.byteorder)
+    program_state = ProgramState(memory, metadata["pointer"],
+                                 restore_errors(metadata["errors"]),
+                                 metadata["next_index"], output, input_source, debug)
+    program_state.goto_labels = metadata["goto_labels"]
+    return Continuation(program_state, metadata["loops"], metadata["dispatches"],
+                        metadata["analysed_pointer"])
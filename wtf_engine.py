@@ -0,0 +1,512 @@
+"""An iterative WTFZOMFG execution engine that works on one mutable program state"""
+from typing import Callable, Dict, List, Tuple, Union
+
+from wtf_errors import UnknownTypeError, OutOfBoundsError, WrongDivisionError
+import wtf_functions as wtf
+from wtf_objects import Function, PagedTape, ProgramState, Tape, find_zero, memory_limit
+from wtf_optimizer import cell_delta
+
+# Cell/Pointer Manipulation
+
+
+def cell_increase(p_s: ProgramState, args: str) -> None:
+    """
+    Increases the cell at the pointer
+    """
+    value = p_s.memory[p_s.pointer]
+    if not isinstance(value, int):  # Check if current cell is an integer
+        p_s.errors.append(UnknownTypeError(int(), value))
+    else:
+        p_s.memory[p_s.pointer] = value + 1
+
+
+def cell_decrease(p_s: ProgramState, args: str) -> None:
+    """
+    Decreases the cell at the pointer
+    """
+    value = p_s.memory[p_s.pointer]
+    if not isinstance(value, int):  # Check if current cell is an integer
+        p_s.errors.append(UnknownTypeError(int(), value))
+    else:
+        p_s.memory[p_s.pointer] = value - 1
+
+
+def cell_flip(p_s: ProgramState, args: str) -> None:
+    """
+    If the cell at the pointer is 0, set it to 1, otherwise set it to 0
+    """
+    if p_s.memory[p_s.pointer]:
+        p_s.memory[p_s.pointer] = 0
+    else:
+        p_s.memory[p_s.pointer] = 1
+
+
+def cell_set(p_s: ProgramState, args: str) -> None:
+    """
+    This sets the cell at the pointer to a number
+    """
+    p_s.memory[p_s.pointer] = int(args)
+
+
+def cell_increase_with(p_s: ProgramState, args: str) -> None:
+    """
+    Increases the cell at the pointer by n (use negative to decrease)
+    """
+    value = p_s.memory[p_s.pointer]
+    if not isinstance(value, int):  # Check if current cell is an integer
+        p_s.errors.append(UnknownTypeError(int(), value))
+    else:
+        p_s.memory[p_s.pointer] = value + int(args)
+
+
+def copy_value_right(p_s: ProgramState, args: str) -> None:
+    """
+    Copies the cell at the pointer to the next cell to the right
+    """
+    if not p_s.pointer + 1 < len(p_s.memory):  # Check if within bounds
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer + 1))
+    else:
+        p_s.memory[p_s.pointer + 1] = p_s.memory[p_s.pointer]
+
+
+def copy_value_to(p_s: ProgramState, args: str) -> None:
+    """
+    Copies the cell at the pointer to cell number n
+    """
+    position = int(args)
+    if not (position < len(p_s.memory) and position >= 0):  # Check if within bounds
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), args))
+    else:
+        p_s.memory[position] = p_s.memory[p_s.pointer]
+
+
+def pointer_move_left(p_s: ProgramState, args: str) -> None:
+    """
+    Moves the pointer once to the left
+    """
+    if not (p_s.pointer - 1 < len(p_s.memory) and p_s.pointer - 1 >= 0):  # Check if within bounds
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer - 1))
+    else:
+        p_s.pointer -= 1
+
+
+def pointer_move_right(p_s: ProgramState, args: str) -> None:
+    """
+    Moves the pointer once to the right
+    """
+    if not (p_s.pointer + 1 < len(p_s.memory) and p_s.pointer + 1 >= 0):  # Check if within bounds
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer + 1))
+    else:
+        p_s.pointer += 1
+
+
+def pointer_move_to(p_s: ProgramState, args: str) -> None:
+    """
+    Sets the the pointer to cell number n
+    """
+    position = int(args)
+    if not (position < len(p_s.memory) and position >= 0):  # Check if within bounds
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), position))
+    else:
+        p_s.pointer = position
+
+
+def pointer_move_relative(p_s: ProgramState, args: str) -> None:
+    """
+    Moves the pointer n cells right (negative to go left)
+    """
+    position = p_s.pointer + int(args)
+    if not (position < len(p_s.memory) and position >= 0):  # Check if within bounds
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), position))
+    else:
+        p_s.pointer = position
+
+
+def cell_subtract_ascii(p_s: ProgramState, args: str) -> None:
+    """
+    Subtract the ASCII value of c from the cell at the pointer.
+    """
+    value = p_s.memory[p_s.pointer]
+    if isinstance(value, int):  # Check if current cell is an integer
+        p_s.memory[p_s.pointer] = value - ord(args[0])
+    else:
+        p_s.memory[p_s.pointer] = ord(value) - ord(args[0])
+
+# Arithmetic
+
+
+def cell_operator_right(p_s: ProgramState, operator: str) -> None:
+    """
+    Applies an operator on the cell to the right and stores the value in the current cell.
+    Unlike the recursive engine, an operation that records an error is not applied.
+    """
+    # Check if cell to the right is within bounds
+    if not (p_s.pointer + 1 < len(p_s.memory) and p_s.pointer + 1 >= 0):
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer + 1))
+        return
+    apply_operator_right(p_s, operator)
+
+
+def apply_operator_right(p_s: ProgramState, operator: str) -> None:
+    """
+    Applies an operator on the cell to the right like cell_operator_right,
+    without checking that the cell to the right is within bounds
+    """
+    left = p_s.memory[p_s.pointer]
+    right = p_s.memory[p_s.pointer + 1]
+    # Check if both cells are integers
+    if not isinstance(left, int):
+        p_s.errors.append(UnknownTypeError(int(), left))
+    elif not isinstance(right, int):
+        p_s.errors.append(UnknownTypeError(int(), right))
+
+    elif operator == "add":
+        p_s.memory[p_s.pointer] = int(left + right)
+    elif operator == "sub":
+        p_s.memory[p_s.pointer] = int(left - right)
+    elif operator == "mul":
+        p_s.memory[p_s.pointer] = int(left * right)
+    elif operator == "div":
+        # Check for division by 0
+        if right == 0:
+            p_s.errors.append(WrongDivisionError(right))
+        else:
+            p_s.memory[p_s.pointer] = int(left / right)
+
+
+def cell_add_right(p_s: ProgramState, args: str) -> None:
+    """
+    Add the cell at the pointer to the cell once to the
+    right, storing the result to the first cell
+    """
+    cell_operator_right(p_s, "add")
+
+
+def cell_subtract_right(p_s: ProgramState, args: str) -> None:
+    """
+    Subtract the cell at the pointer to the cell once to the
+    right, storing the result to the first cell
+    """
+    cell_operator_right(p_s, "sub")
+
+
+def cell_multiply_right(p_s: ProgramState, args: str) -> None:
+    """
+    Multiply the cell at the pointer to the cell once to the
+    right, storing the result to the first cell
+    """
+    cell_operator_right(p_s, "mul")
+
+
+def cell_devide_right(p_s: ProgramState, args: str) -> None:
+    """
+    Devide the cell at the pointer to the cell once to the
+    right, storing the result to the first cell
+    """
+    cell_operator_right(p_s, "div")
+
+# Input/Output
+
+
+def scan_ascii(p_s: ProgramState, args: str) -> None:
+    """
+    This scans one ASCII character to the cell at the pointer
+    """
+    if p_s.input.interactive:
+        p_s.output.flush()
+    p_s.memory[p_s.pointer] = p_s.input.read_character()
+
+
+def scan_decimal(p_s: ProgramState, args: str) -> None:
+    """
+    This scans one decimal number to the cell at the pointer
+    """
+    if p_s.input.interactive:
+        p_s.output.flush()
+    p_s.memory[p_s.pointer] = p_s.input.read_number()
+
+
+def print_cell_ascii(p_s: ProgramState, args: str) -> None:
+    """
+    This prints the cell at the pointer as an ASCII character
+    """
+    p_s.output.write(str(p_s.memory[p_s.pointer]))
+
+
+def print_cell_decimal(p_s: ProgramState, args: str) -> None:
+    """
+    This prints the cell at the pointer as a decimal number
+    """
+    p_s.output.write(str(int(p_s.memory[p_s.pointer])))
+
+
+def print_character(p_s: ProgramState, args: str) -> None:
+    """
+    This prints the character c after the period
+    """
+    p_s.output.write(args.replace("\\n", "\n"))
+
+
+def print_until(p_s: ProgramState, args: str) -> None:
+    """
+    This prints the text between the quotes
+    """
+    p_s.output.write(args.replace("\\n", "\n"))
+
+# Debug
+
+
+def print_program_state(p_s: ProgramState, args: str) -> None:
+    """
+    Dumps the current pointer and memory values to the debug sink
+    """
+    p_s.debug.dump(p_s.pointer, p_s.memory, p_s.output.write)
+
+
+IN_PLACE_FUNCTIONS: Dict[Callable, Callable[[ProgramState, str], None]] = {
+    wtf.cell_increase: cell_increase,
+    wtf.cell_decrease: cell_decrease,
+    wtf.cell_flip: cell_flip,
+    wtf.cell_set: cell_set,
+    wtf.cell_increase_with: cell_increase_with,
+    wtf.copy_value_right: copy_value_right,
+    wtf.copy_value_to: copy_value_to,
+    wtf.pointer_move_left: pointer_move_left,
+    wtf.pointer_move_right: pointer_move_right,
+    wtf.pointer_move_to: pointer_move_to,
+    wtf.pointer_move_relative: pointer_move_relative,
+    wtf.cell_subtract_ascii: cell_subtract_ascii,
+    wtf.cell_add_right: cell_add_right,
+    wtf.cell_subtract_right: cell_subtract_right,
+    wtf.cell_multiply_right: cell_multiply_right,
+    wtf.cell_devide_right: cell_devide_right,
+    wtf.scan_ascii: scan_ascii,
+    wtf.scan_decimal: scan_decimal,
+    wtf.print_cell_ascii: print_cell_ascii,
+    wtf.print_cell_decimal: print_cell_decimal,
+    wtf.print_character: print_character,
+    wtf.print_until: print_until,
+    wtf.print_program_state: print_program_state}
+
+GOTO_FUNCTIONS = [
+    wtf.label_goto,
+    wtf.label_goto_nonzero,
+    wtf.label_goto_zero]
+
+
+Memory = Union[List[Union[str, int]], Tape, PagedTape]
+
+
+def multiply_add(memory: Memory, pointer: int, control: int, low: int, high: int,
+                 increases: Tuple[Tuple[int, int], ...]) -> bool:
+    """
+    Runs a multiply loop at once and returns True, or returns False without changing
+    the memory when that could change the outcome: the loop would not count towards 0,
+    would leave the memory or would change a cell that holds a character
+    """
+    value = memory[pointer]
+    if value == 0:
+        # The loop is not entered, so the other cells are not even read
+        return True
+    if type(value) is not int or value * control > 0 \
+            or pointer + low < 0 or pointer + high >= len(memory):
+        return False
+    cells = [memory[pointer + offset] for offset, _ in increases]
+    if any(type(cell) is not int for cell in cells):
+        return False
+    iterations = -value * control
+    for (offset, increase), cell in zip(increases, cells):
+        memory[pointer + offset] = cell + iterations * increase
+    memory[pointer] = 0
+    return True
+
+
+def scan_position(memory: Memory, pointer: int, step: int, low: int, high: int) -> int:
+    """
+    Returns the cell a scan loop stops at, or -1 when running the loop at once could
+    change the outcome because one of its moves would leave the memory
+    """
+    position = find_zero(memory, pointer, step)
+    if position == pointer:
+        return position
+    # The last move starts one step before the cell the loop stops at
+    last = position - step
+    if position < 0 or min(pointer, last) + low < 0 or max(pointer, last) + high >= len(memory):
+        return -1
+    return position
+
+
+def execute_folded(p_s: ProgramState, instruction: Function) -> int:
+    """
+    Executes a function made by the optimizer. When the folded function could
+    change the outcome, like recording fewer errors, the functions it replaces
+    are executed instead. Returns the amount of dispatches of those functions,
+    or 0 when they were not executed.
+    """
+    function = instruction.func
+    value = p_s.memory[p_s.pointer]
+
+    if function is wtf.cell_increase_with:
+        if isinstance(value, int):
+            p_s.memory[p_s.pointer] = value + int(instruction.args)
+            return 0
+    elif function is wtf.pointer_move_relative:
+        low, high = instruction.span
+        if p_s.pointer + low >= 0 and p_s.pointer + high < len(p_s.memory):
+            p_s.pointer += int(instruction.args)
+            return 0
+    elif function is wtf.cell_set:
+        # A clear loop only ends if it counts towards 0
+        if isinstance(value, int) and value * cell_delta(instruction.folded[1]) <= 0:
+            p_s.memory[p_s.pointer] = 0
+            return 0
+    elif function is wtf.cell_multiply_add:
+        low, high = instruction.span
+        control, increases = wtf.loop_increases(instruction.args)
+        if multiply_add(p_s.memory, p_s.pointer, control, low, high, increases):
+            return 0
+    elif function is wtf.pointer_scan:
+        low, high = instruction.span
+        position = scan_position(p_s.memory, p_s.pointer, int(instruction.args), low, high)
+        if position >= 0:
+            p_s.pointer = position
+            return 0
+    else:
+        IN_PLACE_FUNCTIONS[function](p_s, instruction.args)
+        return 0
+
+    return execute(p_s, instruction.folded)[1]
+
+
+# The index step returns when the program ends
+STOP = -1
+
+
+def step(p_s: ProgramState, functions: List[Function], index: int,
+         loops: List[int]) -> Tuple[int, int]:
+    """
+    Runs one dispatch of the flat engine: the function at the index, or the end of
+    the program when the index is past the last function. Returns the index of
+    the next function, or STOP when the program ends, and the amount of dispatches,
+    which is more than 1 when a folded function ran the functions it replaces.
+    The profiler, the async runner and the trace recorder run a program with it,
+    so they dispatch exactly like the flat engine does.
+    """
+    if not index < len(functions):
+        return (loops.pop(), 1) if loops else (STOP, 1)
+
+    instruction = functions[index]
+    function = instruction.func
+
+    # ======================= #
+    # Check control functions #
+    # ======================= #
+    if function is wtf.loop_start:
+        if wtf.loop_start(p_s):
+            loops.append(index)
+            return index + 1, 1
+        return instruction.target, 1
+
+    if function is wtf.loop_end:
+        return (loops.pop(), 1) if loops else (STOP, 1)
+
+    if function is wtf.if_start:
+        return (index + 1 if wtf.if_start(p_s) else instruction.target), 1
+
+    if function in GOTO_FUNCTIONS:
+        if function(p_s) and instruction.target is not None:
+            return instruction.target, 1
+        return index + 1, 1
+
+    # Empty functions, they exists to help the interpreter
+    if function is wtf.label_declare or function is wtf.if_end:
+        return index + 1, 1
+
+    # =================== #
+    # All other functions #
+    # =================== #
+    p_s.errors.position = instruction.position
+    if instruction.folded:
+        return index + 1, 1 + execute_folded(p_s, instruction)
+    IN_PLACE_FUNCTIONS[function](p_s, instruction.args)
+    return index + 1, 1
+
+
+def execute(program_state: ProgramState, functions: List[Function]) -> Tuple[ProgramState, int]:
+    """
+    Executes the list of functions resolved by pre_run in a flat dispatch loop,
+    changing the given program state in place. Returns the program state and the amount of
+    dispatches, which is equal to the amount of calls the recursive execute makes.
+
+    Every loop that is entered is pushed on a loop stack. A loop end, or the end of
+    the program, returns to the most recently entered loop, like the return of a
+    recursive execute call would.
+
+    Errors of a function are recorded at its position in the source.
+    This is the loop of step written out, so a dispatch does not cost a call.
+    Changes to the one have to be made to the other as well.
+    """
+    p_s = program_state
+    errors = p_s.errors
+    loops = []
+    index = 0
+    count = 0
+    end = len(functions)
+
+    while True:
+        count += 1
+        if not index < end:
+            if not loops:
+                break
+            index = loops.pop()
+            continue
+
+        instruction = functions[index]
+        function = instruction.func
+        argument = instruction.args
+
+        # ======================= #
+        # Check control functions #
+        # ======================= #
+        if function is wtf.loop_start:
+            if wtf.loop_start(p_s):
+                loops.append(index)
+                index += 1
+            else:
+                index = instruction.target
+
+        elif function is wtf.loop_end:
+            if not loops:
+                break
+            index = loops.pop()
+
+        elif function is wtf.if_start:
+            if wtf.if_start(p_s):
+                index += 1
+            else:
+                index = instruction.target
+
+        elif function in GOTO_FUNCTIONS:
+            if function(p_s) and instruction.target is not None:
+                index = instruction.target
+            else:
+                index += 1
+
+        # Empty functions, they exists to help the interpreter
+        elif function is wtf.label_declare or function is wtf.if_end:
+            index += 1
+
+        # =================== #
+        # All other functions #
+        # =================== #
+        elif instruction.folded:
+            errors.position = instruction.position
+            count += execute_folded(p_s, instruction)
+            index += 1
+        else:
+            errors.position = instruction.position
+            IN_PLACE_FUNCTIONS[function](p_s, argument)
+            index += 1
+
+    p_s.next_index = index
+    return p_s, count
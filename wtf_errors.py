@@ -1,5 +1,5 @@
 """All errors used in the WTF interperter"""
-from typing import TypeVar
+from typing import Optional, TypeVar
 
 
 class WtfError():
@@ -79,13 +79,20 @@ class NotNumericError(WtfError):
 
 
 class OutOfBoundsError(WtfError):
-    """An error which declares that the position asked for is out of bounds"""
+    """
+    An error which declares that the position asked for is out of bounds.
+    The memory size is None for a memory without a limit.
+    """
 
-    def __init__(self, memory_size: int, position: int) -> None:
+    def __init__(self, memory_size: Optional[int], position: int) -> None:
         self.__memory_size = memory_size
         self.__position = position
 
     def __str__(self) -> str:
+        if self.__memory_size is None:
+            return str(type(self).__name__) + \
+                ": Cannot reach position '" + str(self.__position) + \
+                "', memory has no limit but starts at cell 0"
         return str(type(self).__name__) + \
             ": Cannot reach position '" + str(self.__position) + \
             "', memory is " + str(self.__memory_size) + " cells large"
@@ -106,3 +113,45 @@ class WrongDivisionError(WtfError):
     def __repr__(self) -> str:
         return self.__str__()
 
+
+class UnbalancedBracketError(WtfError):
+    """An error which declares that a bracket has no matching bracket"""
+
+    def __init__(self, bracket: str, index: int) -> None:
+        self.__bracket = bracket
+        self.__index = index
+
+    def __str__(self) -> str:
+        return str(type(self).__name__) + ": Bracket '" + str(self.__bracket) + \
+            "' at function " + str(self.__index) + " has no matching bracket"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class UndefinedLabelError(WtfError):
+    """An error which declares that a goto uses a label that is never declared"""
+
+    def __init__(self, label: str, index: int) -> None:
+        self.__label = label
+        self.__index = index
+
+    def __str__(self) -> str:
+        return str(type(self).__name__) + ": Label '" + str(self.__label) + \
+            "' used at function " + str(self.__index) + " is never declared"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class RestoredError(WtfError):
+    """An error restored from a checkpoint or the cache, of which only the message was stored"""
+
+    def __init__(self, message: str) -> None:
+        self.__message = message
+
+    def __str__(self) -> str:
+        return self.__message
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -1,8 +1,10 @@
 """Module that holds all functionalities that WTFZOMFG can do"""
 from copy import deepcopy
+from functools import lru_cache
+from typing import Tuple
 
-from wtf_objects import ProgramState
 from wtf_errors import UnknownTypeError, OutOfBoundsError, WrongDivisionError
+from wtf_objects import ProgramState, memory_limit
 # Control
 
 
@@ -146,7 +148,7 @@ def copy_value_right(program_state: ProgramState) -> ProgramState:
     """
     p_s = deepcopy(program_state)
     if not p_s.pointer + 1 < len(p_s.memory):  # Check if within bounds
-        p_s.errors.append(OutOfBoundsError(len(p_s.memory), p_s.pointer + 1))
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer + 1))
     else:
         p_s.memory[p_s.pointer + 1] = p_s.memory[p_s.pointer]
     return p_s
@@ -158,7 +160,7 @@ def copy_value_to(program_state: ProgramState, args: str) -> ProgramState:
     """
     p_s = deepcopy(program_state)
     if not (int(args) < len(p_s.memory) and int(args) >= 0):  # Check if within bounds
-        p_s.errors.append(OutOfBoundsError(len(p_s.memory), args))
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), args))
     else:
         p_s.memory[int(args)] = p_s.memory[p_s.pointer]
     return p_s
@@ -170,7 +172,7 @@ def pointer_move_left(program_state: ProgramState) -> ProgramState:
     """
     p_s = deepcopy(program_state)
     if not (p_s.pointer - 1 < len(p_s.memory) and p_s.pointer - 1 >= 0):  # Check if within bounds
-        p_s.errors.append(OutOfBoundsError(len(p_s.memory), p_s.pointer - 1))
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer - 1))
     else:
         p_s.pointer -= 1
     return p_s
@@ -182,7 +184,7 @@ def pointer_move_right(program_state: ProgramState) -> ProgramState:
     """
     p_s = deepcopy(program_state)
     if not (p_s.pointer + 1 < len(p_s.memory) and p_s.pointer + 1 >= 0):  # Check if within bounds
-        p_s.errors.append(OutOfBoundsError(len(p_s.memory), p_s.pointer + 1))
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer + 1))
     else:
         p_s.pointer += 1
 
@@ -196,7 +198,7 @@ def pointer_move_to(program_state: ProgramState, args: str) -> ProgramState:
     p_s = deepcopy(program_state)
 
     if not (int(args) < len(p_s.memory) and int(args) >= 0):  # Check if within bounds
-        p_s.errors.append(OutOfBoundsError(len(p_s.memory), int(args)))
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), int(args)))
     else:
         p_s.pointer = int(args)
     return p_s
@@ -210,7 +212,7 @@ def pointer_move_relative(program_state: ProgramState, args: str) -> ProgramStat
     if not (p_s.pointer + int(args) < len(p_s.memory)
             and p_s.pointer + int(args) >= 0):  # Check if within bounds
         p_s.errors.append(OutOfBoundsError(
-            len(p_s.memory), p_s.pointer + int(args)))
+            memory_limit(p_s.memory), p_s.pointer + int(args)))
     else:
         p_s.pointer += int(args)
     if p_s.pointer < 0:
@@ -241,10 +243,10 @@ def cell_operator_right(program_state: ProgramState, operator: str) -> ProgramSt
 
     # Check if curent pointer is within bounds
     if not (p_s.pointer < len(p_s.memory) and p_s.pointer >= 0):
-        p_s.errors.append(OutOfBoundsError(len(p_s.memory), p_s.pointer))
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer))
     # Check if cell to the right is within bounds
     elif not (p_s.pointer + 1 < len(p_s.memory) and p_s.pointer + 1 >= 0):
-        p_s.errors.append(OutOfBoundsError(len(p_s.memory), p_s.pointer + 1))
+        p_s.errors.append(OutOfBoundsError(memory_limit(p_s.memory), p_s.pointer + 1))
 
     # Check if current cell is an integer
     elif not isinstance(p_s.memory[p_s.pointer], type(int())):
@@ -315,11 +317,9 @@ def scan_ascii(program_state: ProgramState) -> ProgramState:
     This scans one ASCII character to the cell at the pointer
     """
     p_s = deepcopy(program_state)
-    inpt = input()
-    if inpt == '-1': # For EOF checking
-        p_s.memory[p_s.pointer] = -1
-    else:
-        p_s.memory[p_s.pointer] = inpt[0]
+    if p_s.input.interactive:
+        p_s.output.flush()
+    p_s.memory[p_s.pointer] = p_s.input.read_character()
     return p_s
 
 
@@ -328,7 +328,9 @@ def scan_decimal(program_state: ProgramState) -> ProgramState:
     This scans one decimal number to the cell at the pointer
     """
     p_s = deepcopy(program_state)
-    p_s.memory[p_s.pointer] = int(input())
+    if p_s.input.interactive:
+        p_s.output.flush()
+    p_s.memory[p_s.pointer] = p_s.input.read_number()
     return p_s
 
 
@@ -337,7 +339,7 @@ def print_cell_ascii(program_state: ProgramState) -> ProgramState:
     This prints the cell at the pointer as an ASCII character
     """
     p_s = deepcopy(program_state)
-    print(p_s.memory[p_s.pointer], end="")
+    p_s.output.write(str(p_s.memory[p_s.pointer]))
     return p_s
 
 
@@ -346,7 +348,7 @@ def print_cell_decimal(program_state: ProgramState) -> ProgramState:
     This prints the cell at the pointer as a decimal number
     """
     p_s = deepcopy(program_state)
-    print(int(p_s.memory[p_s.pointer]), end="")
+    p_s.output.write(str(int(p_s.memory[p_s.pointer])))
     return p_s
 
 
@@ -355,7 +357,7 @@ def print_character(program_state: ProgramState, args: str) -> ProgramState:
     This prints the character c after the period
     """
     p_s = deepcopy(program_state)
-    print(args.replace("\\n", "\n"), end="")
+    p_s.output.write(args.replace("\\n", "\n"))
     return p_s
 
 
@@ -364,7 +366,7 @@ def print_until(program_state: ProgramState, args: str) -> ProgramState:
     This prints the cell at the pointer as an ASCII character
     """
     p_s = deepcopy(program_state)
-    print(args.replace("\\n", "\n"), end="")
+    p_s.output.write(args.replace("\\n", "\n"))
     return p_s
 
 # Debug
@@ -372,13 +374,46 @@ def print_until(program_state: ProgramState, args: str) -> ProgramState:
 
 def print_program_state(program_state: ProgramState) -> ProgramState:
     """
-    Prints the current pointer and memory values
+    Dumps the current pointer and memory values to the debug sink
     """
     p_s = deepcopy(program_state)
-    print(p_s.pointer, p_s.memory)
+    p_s.debug.dump(p_s.pointer, p_s.memory, p_s.output.write)
     return p_s
 
 
+# Loop idioms, the optimizer replaces loops with these, they are not commands
+
+
+@lru_cache(maxsize=None)
+def loop_increases(args: str) -> Tuple[int, Tuple[Tuple[int, int], ...]]:
+    """
+    Decodes the argument of a multiply loop, like "0:-1 1:3 2:-1", to how much one
+    iteration increases the cell at the pointer, and the offset and increase
+    of every other cell it changes
+    """
+    increases = dict(map(lambda pair: tuple(map(int, pair.split(":"))), args.split()))
+    control = increases.pop(0)
+    return control, tuple(sorted(increases.items()))
+
+
+def cell_multiply_add(program_state: ProgramState, args: str) -> ProgramState:
+    """
+    Stands for a multiply loop like ( - > + + + < ) folded by the optimizer. The engines
+    run it at once with execute_folded, which checks that the loop stays in the memory
+    and falls back to the loop it replaces, so it cannot be run on its own
+    """
+    raise NotImplementedError("a multiply loop is run by the engine it was folded for")
+
+
+def pointer_scan(program_state: ProgramState, args: str) -> ProgramState:
+    """
+    Stands for a scan loop like ( > ) folded by the optimizer. The engines run it at once
+    with execute_folded, which checks that the loop stays in the memory and falls back
+    to the loop it replaces, so it cannot be run on its own
+    """
+    raise NotImplementedError("a scan loop is run by the engine it was folded for")
+
+
 TOKEN_FUNCTIONS = {
     'LABEL_GOTO': label_goto,
     'LABEL_DECLARE': label_declare,
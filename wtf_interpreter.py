@@ -1,15 +1,33 @@
 """A python WTFZOMFG interpreter"""
 
+import io
 import sys
+import time
 from copy import deepcopy
-from typing import List, Tuple, Callable
-
-from wtf_errors import UnknownTypeError
-from wtf_functions import CONTROL_FUNCTIONS
-from wtf_lexer import lexer
-from wtf_objects import Function, Interpreter, ProgramState
+from itertools import accumulate
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import wtf_checkpoint
+import wtf_engine
+import wtf_profiler
+import wtf_trace
+import wtf_transpiler
+import wtf_vm
+from wtf_brainfuck import find_language
+from wtf_bytecode import compile_functions, disassemble
+from wtf_cache import LEXERS, MAX_CACHE_SIZE, load_program
+from wtf_errors import UnbalancedBracketError, UndefinedLabelError, UnknownTypeError, WtfError
+from wtf_functions import CONTROL_FUNCTIONS, label_declare, loop_start, loop_end, if_start, if_end
+from wtf_engine import GOTO_FUNCTIONS
+from wtf_io import InputSource, OutputSink
+from wtf_objects import DETAIL_LEVELS, ERROR_LIMIT, TRACE_SIZE, Bytecode, Continuation, DebugSink, \
+    ErrorStore, Function, Interpreter, PagedTape, Profile, ProgramState, Tape, Token, Trace, \
+    create_memory
+from wtf_optimizer import folded_length, optimize
 from wtf_parser import parse
 
+ENGINES = ["vm", "flat", "python", "recursive"]
+
 
 def execute_counter(function: Callable[[ProgramState, List[Function], int], ProgramState]) -> Callable[[ProgramState, List[Function], int], ProgramState]:
     """
@@ -24,51 +42,77 @@ def execute_counter(function: Callable[[ProgramState, List[Function], int], Prog
     return inner
 
 
-def pre_run(program_state: ProgramState,
-            functions: List[Function],
-            index: int) -> Tuple[ProgramState, List[Function]]:
+def match_brackets(functions: List[Function], start: Callable, end: Callable,
+                   symbols: str, positions: List[int]) -> List[WtfError]:
     """
-    Does some function cleanup and finds all goto declarations
+    Matches every start function with its end function and stores the jump targets.
+    A start function jumps to the function after its end, an end function
+    points back to its start. Returns an error for every unmatched bracket,
+    at its position in the program before it was optimized.
     """
-    p_s = deepcopy(program_state)
-    fnc = deepcopy(functions)
-
-    i = index
-
-    if not i < len(fnc):
-        return p_s, fnc
-
-    # Check if it is a function and remove if it isn't
-    if not isinstance(fnc[i], type(Function())):
-        p_s.errors.append(UnknownTypeError(Function(), fnc[i]))
-        fnc.pop(i)
-    else:
-        if fnc[i].func.__name__ == "label_declare":
-            p_s.goto_labels[fnc[i].args] = i
-        i += 1
-
-    return pre_run(p_s, fnc, i)
+    errors = []
+    starts = []
+    for i, function in enumerate(functions):
+        if function.func is start:
+            starts.append(i)
+        elif function.func is end:
+            if not starts:
+                errors.append(UnbalancedBracketError(symbols[1], positions[i]))
+                continue
+            j = starts.pop()
+            functions[j].target = i + 1
+            function.target = j
+
+    # An unmatched start skips to the end of the program
+    for j in starts:
+        functions[j].target = len(functions)
+    errors.extend(map(lambda j: UnbalancedBracketError(symbols[0], positions[j]), starts))
+    return errors
+
+
+def resolve_gotos(functions: List[Function], goto_labels: Dict[str, int],
+                  positions: List[int]) -> List[WtfError]:
+    """
+    Stores the index of the function after the declared label as
+    the jump target of every goto. Returns an error for every undefined label,
+    at its position in the program before it was optimized.
+    """
+    errors = []
+    for i, function in enumerate(functions):
+        if function.func in GOTO_FUNCTIONS:
+            if function.args in goto_labels:
+                function.target = goto_labels[function.args] + 1
+            else:
+                errors.append(UndefinedLabelError(function.args, positions[i]))
+    return errors
 
 
-def skip_to_end(functions: List[Function], index: int, start: str, end: str, counter: int) -> int:
+def pre_run(program_state: ProgramState,
+            functions: List[Function],
+            index: int) -> Tuple[ProgramState, List[Function]]:
     """
-    Recursivly searches for the end function of an if statement or
-    while loop and returns the index of the function afther that
+    Does some function cleanup, finds all goto declarations and
+    resolves all jumps, so no searching is needed while executing.
+    Unbalanced brackets and undefined labels are added to the errors.
     """
-    i = deepcopy(index)
-    cntr = counter
-
-    if not cntr > 0 and i < len(functions):
-        return i
+    p_s = deepcopy(program_state)
+    fnc = deepcopy(functions[:index])
 
-    if functions[i].func.__name__ == start:
-        cntr += 1
-    elif functions[i].func.__name__ == end:
-        cntr -= 1
+    for function in deepcopy(functions[index:]):
+        # Check if it is a function and remove if it isn't
+        if not isinstance(function, type(Function())):
+            p_s.errors.append(UnknownTypeError(Function(), function))
+            continue
+        if function.func is label_declare:
+            p_s.goto_labels[function.args] = len(fnc)
+        fnc.append(function)
 
-    i += 1
+    positions = list(accumulate(map(folded_length, fnc), initial=0))
+    p_s.errors.extend(match_brackets(fnc, loop_start, loop_end, "()", positions))
+    p_s.errors.extend(match_brackets(fnc, if_start, if_end, "{}", positions))
+    p_s.errors.extend(resolve_gotos(fnc, p_s.goto_labels, positions))
 
-    return skip_to_end(functions, i, start, end, cntr)
+    return p_s, fnc
 
 
 @execute_counter
@@ -90,9 +134,10 @@ def execute(program_state: ProgramState, functions: List[Function], index: int =
     # ======================= #
     # If function
     if function in CONTROL_FUNCTIONS and function.__name__ == "if_start":
-        index += 1
-        if not function(p_s):
-            index = skip_to_end(functions, index, "if_start", "if_end", 1)
+        if function(p_s):
+            index += 1
+        else:
+            index = functions[index].target
 
     # Loop function
     elif function in CONTROL_FUNCTIONS and function.__name__ == "loop_start":
@@ -100,8 +145,7 @@ def execute(program_state: ProgramState, functions: List[Function], index: int =
             p_s.next_index = index + 1
             p_s = execute(p_s, functions, p_s.next_index)
         else:
-            index += 1
-            index = skip_to_end(functions, index, "loop_start", "loop_end", 1)
+            index = functions[index].target
 
     elif function in CONTROL_FUNCTIONS and function.__name__ == "loop_end":
         p_s.next_index = index
@@ -111,8 +155,8 @@ def execute(program_state: ProgramState, functions: List[Function], index: int =
             function.__name__ == "label_goto_nonzero" or \
             function.__name__ == "label_goto_zero" or \
             function.__name__ == "label_goto":
-        if function(p_s) and argument in p_s.goto_labels:
-            index = p_s.goto_labels[argument] + 1
+        if function(p_s) and functions[index].target is not None:
+            index = functions[index].target
         else:
             index += 1
 
@@ -124,9 +168,11 @@ def execute(program_state: ProgramState, functions: List[Function], index: int =
     # All other functions #
     # =================== #
     elif argument:
+        p_s.errors.position = functions[index].position
         p_s = function(p_s, argument)
         index += 1
     else:
+        p_s.errors.position = functions[index].position
         p_s = function(p_s)
         index += 1
 
@@ -135,51 +181,474 @@ def execute(program_state: ProgramState, functions: List[Function], index: int =
     return execute(p_s, functions, p_s.next_index)
 
 
-def run(program_state: ProgramState, functions: List[Function]) -> Tuple[ProgramState, int]:
+def run_resolved(program_state: ProgramState,
+                 functions: List[Function],
+                 engine: str = "vm",
+                 profile: Optional[Profile] = None) -> Tuple[ProgramState, int]:
+    """
+    Executes functions that have been resolved by pre_run with the chosen engine.
+    The recursive engine copies the program state for every function,
+    the flat engine changes one program state in a loop,
+    the vm engine compiles the functions to bytecode first and
+    the python engine transpiles them to a Python module.
+    With a profile, the functions are run by the profiler instead, which
+    counts and times them like the flat engine would run them.
+    The output of the program is flushed when it stops.
     """
-    A function that executes the program
+    try:
+        if profile is not None:
+            return wtf_profiler.execute(deepcopy(program_state), functions, profile)
+        if engine == "recursive":
+            # The counter only counts the calls of this run
+            execute.counter = 0
+            p_s = execute(program_state, functions)
+            return p_s, execute.counter
+        if engine == "flat":
+            return wtf_engine.execute(deepcopy(program_state), functions)
+        if engine == "python":
+            return wtf_transpiler.execute(deepcopy(program_state), functions)
+        return wtf_vm.execute(deepcopy(program_state), compile_functions(functions))
+    finally:
+        # Also write the output of a program that stopped with an exception
+        program_state.output.flush()
+
+
+def run(program_state: ProgramState,
+        functions: List[Function],
+        engine: str = "vm") -> Tuple[ProgramState, int]:
+    """
+    A function that resolves and executes the program with the chosen engine
     """
     p_s = deepcopy(program_state)
     fncs = deepcopy(functions)
 
     p_s, fncs = pre_run(p_s, fncs, 0)
-    p_s = execute(p_s, fncs)
-    return p_s, execute.counter
+    return run_resolved(p_s, fncs, engine)
 
 
-def interpret(file: str, memory_length: int, ignore_errors: bool) -> Interpreter:
+def copy_cells_into(memory: Union[List[Union[str, int]], Tape, PagedTape],
+                    cells: Union[List[Union[str, int]], Tape, PagedTape]) -> None:
+    """
+    Makes a memory hold the cells of a copy of it, which is then no longer used
+    """
+    if isinstance(memory, list):
+        memory[:] = cells
+    else:
+        memory.__dict__.update(cells.__dict__)
+
+
+# Runs a resolved program on a program state, and returns it with the amount of dispatches
+Runner = Callable[[ProgramState], Tuple[ProgramState, int]]
+
+
+def create_runner(functions: List[Function], engine: str = "vm",
+                  bytecode: Optional[Bytecode] = None) -> Runner:
+    """
+    Prepares resolved functions for the chosen engine once, like compiling them
+    to bytecode or transpiling them, and returns a runner that runs them on
+    a program state, changing it in place. The vm engine uses the given bytecode
+    when the functions have been compiled already.
+    """
+    if engine == "vm":
+        if bytecode is None:
+            bytecode = compile_functions(functions)
+        return lambda p_s: wtf_vm.execute(p_s, bytecode)
+    if engine == "python":
+        transpiled = wtf_transpiler.load(wtf_transpiler.transpile(functions))
+
+        def run_transpiled(p_s: ProgramState) -> Tuple[ProgramState, int]:
+            p_s.pointer, count = transpiled(p_s.memory, p_s.pointer, p_s.errors,
+                                            p_s.output, p_s.input, p_s.debug)
+            return p_s, count
+        return run_transpiled
+    if engine == "recursive":
+        def run_recursive(p_s: ProgramState) -> Tuple[ProgramState, int]:
+            execute.counter = 0
+            memory = p_s.memory
+            p_s = execute(p_s, functions)
+            # The recursive engine changes copies of the memory, so the final cells are
+            # put back in the memory of the run, which may have been supplied
+            copy_cells_into(memory, p_s.memory)
+            p_s.memory = memory
+            return p_s, execute.counter
+        return run_recursive
+    return lambda p_s: wtf_engine.execute(p_s, functions)
+
+
+class Program:
+    """
+    A compiled program that can be run many times. The program is optimized, resolved
+    and prepared for its engine once, and it does not change after that.
+    Running it never asks for input() or exits, all errors end up in the result.
+
+    A run can be given a budget of dispatches or a deadline, after which it pauses.
+    Such runs always use the bytecode of the vm engine, which can stop and continue
+    at any loop end or goto. A paused run holds a continuation, which can be resumed
+    with the program that started it.
+
+    The detail level is the default detail of the results of its runs. A program with
+    the minimal level does not keep its tokens and parsed functions once it is compiled,
+    so its results never hold them.
+    """
+
+    def __init__(self, tokens: List[Token], lexer_errors: List[WtfError],
+                 parsed: List[Function], parser_errors: List[WtfError],
+                 engine: str = "vm", optimization: int = 1, detail: str = "full") -> None:
+        if detail not in DETAIL_LEVELS:
+            raise ValueError("Unknown detail level " + repr(detail) +
+                             ", choose from " + ", ".join(DETAIL_LEVELS))
+        if engine == "recursive":
+            optimization = 0
+        resolved, functions = pre_run(ProgramState([], 0, [], 0), optimize(parsed, optimization), 0)
+
+        keep = detail == "full"
+        self.__tokens = tuple(tokens) if keep else ()
+        self.__lexer_errors = tuple(lexer_errors)
+        self.__parsed = tuple(parsed) if keep else ()
+        self.__parser_errors = tuple(parser_errors)
+        self.__detail = detail
+        self.__resolution_errors = tuple(resolved.errors)
+        self.__functions = functions
+        self.__engine = engine
+        self.__optimization = optimization
+        self.__goto_labels = dict(resolved.goto_labels)
+        self.__bytecode = compile_functions(functions)
+        self.__fingerprint = wtf_checkpoint.fingerprint(self.__bytecode)
+        self.__runner = create_runner(functions, engine, self.__bytecode)
+
+    @property
+    def tokens(self) -> Tuple[Token, ...]:
+        """The tokens made by the lexer"""
+        return self.__tokens
+
+    @property
+    def lexer_errors(self) -> Tuple[WtfError, ...]:
+        """The errors found by the lexer"""
+        return self.__lexer_errors
+
+    @property
+    def parsed(self) -> Tuple[Function, ...]:
+        """The functions made by the parser, before they were optimized"""
+        return self.__parsed
+
+    @property
+    def parser_errors(self) -> Tuple[WtfError, ...]:
+        """The errors found by the parser"""
+        return self.__parser_errors
+
+    @property
+    def resolution_errors(self) -> Tuple[WtfError, ...]:
+        """The unbalanced brackets and undefined labels found by pre_run"""
+        return self.__resolution_errors
+
+    @property
+    def functions(self) -> Tuple[Function, ...]:
+        """The optimized functions resolved by pre_run"""
+        return tuple(self.__functions)
+
+    @property
+    def engine(self) -> str:
+        """The engine the program runs with"""
+        return self.__engine
+
+    @property
+    def optimization(self) -> int:
+        """The optimization level the program was compiled with"""
+        return self.__optimization
+
+    @property
+    def detail(self) -> str:
+        """The detail level of the results of its runs, unless a run asks for another"""
+        return self.__detail
+
+    @property
+    def fingerprint(self) -> str:
+        """The hash of the bytecode, which a checkpoint of a run of the program holds"""
+        return self.__fingerprint
+
+    def start(self, memory: Union[List[Union[str, int]], Tape, PagedTape, None] = None,
+              memory_length: Optional[int] = None, cell_width: int = 0, paged: bool = False,
+              input_source: Optional[InputSource] = None,
+              output: Optional[OutputSink] = None,
+              error_limit: int = ERROR_LIMIT,
+              debug: Optional[DebugSink] = None) -> Continuation:
+        """
+        Prepares a run without running anything, resume runs it.
+        A supplied memory is changed in place, otherwise a fresh memory is made
+        like interpret makes it. Without an input source the program reads an empty
+        input, so ^ and / get -1, without an output sink it prints to sys.stdout in chunks.
+        The run keeps at most error_limit different errors. The dumps of w go to the
+        debug sink, without one they are written in full to the output.
+        """
+        if memory is None:
+            memory = create_memory(memory_length, cell_width, paged)
+        if input_source is None:
+            input_source = InputSource(io.StringIO())
+        program_state = ProgramState(memory, 0, ErrorStore(self.__resolution_errors, error_limit),
+                                     0, output, input_source, debug)
+        program_state.goto_labels = dict(self.__goto_labels)
+        return Continuation(program_state)
+
+    def save_checkpoint(self, file: str, continuation: Continuation) -> None:
+        """
+        Writes a paused run of the program to a checkpoint file
+        """
+        wtf_checkpoint.save_checkpoint(file, continuation, self.__fingerprint)
+
+    def load_checkpoint(self, file: str, input_source: Optional[InputSource] = None,
+                        output: Optional[OutputSink] = None,
+                        debug: Optional[DebugSink] = None) -> Continuation:
+        """
+        Reads a run of the program from a checkpoint file, so resume continues it
+        where it was paused. The memory of a tape is mapped from the file without
+        copying it. The input, output and debug sink are used like start uses them.
+        """
+        if input_source is None:
+            input_source = InputSource(io.StringIO())
+        return wtf_checkpoint.load_checkpoint(file, self.__fingerprint, input_source, output,
+                                              debug)
+
+    def result(self, program_state: ProgramState, dispatches: int,
+               profile: Optional[Profile] = None,
+               continuation: Optional[Continuation] = None,
+               detail: Optional[str] = None,
+               window: Optional[Tuple[int, int]] = None) -> Interpreter:
+        """
+        Returns the result of a run of the program at the detail level, or at the level
+        of the program without one. With a window, the memory of the result is a view
+        of the cells from start until stop.
+        """
+        keep = self.__detail == "full"
+        return Interpreter(self.__tokens if keep else None, self.__lexer_errors,
+                           self.__parsed if keep else None, self.__parser_errors,
+                           program_state, profile, dispatches, continuation,
+                           detail if detail is not None else self.__detail, window)
+
+    def resume(self, continuation: Continuation, budget: Optional[int] = None,
+               deadline: Optional[float] = None, detail: Optional[str] = None,
+               window: Optional[Tuple[int, int]] = None) -> Interpreter:
+        """
+        Continues a run until it finishes, or until the budget of dispatches is used up
+        or the deadline, a time.monotonic() value, has passed. The output of the run is
+        flushed when it pauses. The result of a paused run holds the continuation,
+        which is updated in place. The detail and window are used like result uses them.
+        """
+        program_state = continuation.program_state
+        # A run whose pointer was moved since it paused is not covered by the analysis
+        analysed = program_state.pointer == continuation.analysed_pointer
+        try:
+            program_state, count, finished = wtf_vm.execute_slice(
+                program_state, self.__bytecode, continuation.loops, budget, deadline,
+                continuation.analysed_pointer)
+        finally:
+            program_state.output.flush()
+        continuation.program_state = program_state
+        continuation.analysed_pointer = program_state.pointer if analysed else None
+        continuation.dispatches += count
+        return self.result(program_state, continuation.dispatches, None,
+                           None if finished else continuation, detail, window)
+
+    def run(self, memory: Union[List[Union[str, int]], Tape, PagedTape, None] = None,
+            memory_length: Optional[int] = None, cell_width: int = 0, paged: bool = False,
+            input_source: Optional[InputSource] = None, output: Optional[OutputSink] = None,
+            profile: bool = False, budget: Optional[int] = None,
+            deadline: Optional[float] = None, error_limit: int = ERROR_LIMIT,
+            detail: Optional[str] = None,
+            window: Optional[Tuple[int, int]] = None,
+            debug: Optional[DebugSink] = None,
+            trace: Optional[Trace] = None) -> Interpreter:
+        """
+        Runs the program and returns the result, the memory, input, output, error
+        limit and debug sink are used like start uses them. With profile, the program
+        is run by the profiler and its profile is returned. With a trace, the program is
+        run by the trace recorder, which keeps the last steps in the trace. With a budget
+        or deadline, the run pauses when it runs out, and the result holds the continuation
+        to resume it with, such a run can not be profiled or traced.
+        The detail and window are used like result uses them.
+        """
+        if profile and trace is not None:
+            raise ValueError("A run can not be profiled and traced at once")
+        if profile and (budget is not None or deadline is not None):
+            raise ValueError("A run with a budget or deadline can not be profiled")
+        if trace is not None and (budget is not None or deadline is not None):
+            raise ValueError("A run with a budget or deadline can not be traced")
+        continuation = self.start(memory, memory_length, cell_width, paged, input_source, output,
+                                  error_limit, debug)
+        if budget is not None or deadline is not None:
+            return self.resume(continuation, budget, deadline, detail, window)
+
+        program_state = continuation.program_state
+        run_profile = Profile(self.__functions) if profile else None
+        try:
+            if run_profile:
+                program_state, count = wtf_profiler.execute(program_state, self.__functions,
+                                                            run_profile)
+            elif trace is not None:
+                program_state, count = wtf_trace.execute(program_state, self.__functions, trace)
+            else:
+                program_state, count = self.__runner(program_state)
+        finally:
+            # Also write the output of a program that stopped with an exception
+            program_state.output.flush()
+        return self.result(program_state, count, run_profile, None, detail, window)
+
+    def __str__(self) -> str:
+        return "Program: " + str(len(self.__functions)) + " functions for the " + \
+            self.__engine + " engine at -O" + str(self.__optimization)
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def compile_source(source: str, engine: str = "vm", optimization: int = 1,
+                   language: str = "wtf", detail: str = "full") -> Program:
+    """
+    Lexes, parses and compiles the source of a program written in the language,
+    of which the runs return results at the detail level
+    """
+    tokens, lexer_errors = LEXERS[language](io.StringIO(source))
+    parsed, parser_errors = parse(tokens)
+    return Program(tokens, lexer_errors, parsed, parser_errors, engine, optimization, detail)
+
+
+def compile_file(file: str, engine: str = "vm", optimization: int = 1, use_cache: bool = True,
+                 language: Optional[str] = None, detail: str = "full") -> Program:
+    """
+    Compiles a file, which is lexed and parsed with the cache when use_cache is set.
+    The file is read as WTFZOMFG, or as Brainfuck when the language is brainfuck or
+    when no language is given and the file has a Brainfuck extension.
+    The runs of the program return results at the detail level.
+    """
+    program = load_program(file, use_cache, MAX_CACHE_SIZE, find_language(file, language))
+    return Program(*program, engine, optimization, detail)
+
+
+def interpret(file: str, memory_length: Optional[int], ignore_errors: bool,
+              engine: str = "vm", optimization: int = 1, use_cache: bool = True,
+              cell_width: int = 0, paged: bool = False,
+              output: Optional[OutputSink] = None,
+              input_source: Optional[InputSource] = None,
+              profile: bool = False, language: Optional[str] = None,
+              budget: Optional[int] = None, timeout: Optional[float] = None,
+              checkpoint: Optional[str] = None, restore: Optional[str] = None,
+              error_limit: int = ERROR_LIMIT,
+              debug: Optional[DebugSink] = None,
+              trace_file: Optional[str] = None, trace_size: int = TRACE_SIZE) -> Interpreter:
     """
     This function interprets a WTFZOMGF file,
     runs the program and returns an object containing
     errors and the final state of the program.
+    The optimization level is not used by the recursive engine,
+    which always runs the functions as they are parsed.
+    When use_cache is set, the lexed and parsed program is read from
+    and stored in the cache next to the file.
+    A cell width other than 0 stores the memory in a tape of cells with that
+    amount of bits, of which the numbers wrap around.
+    A paged memory, or a memory without a length, only allocates the pages of
+    cells that are used, with the memory length as the optional limit.
+    The program prints to the output sink, or to sys.stdout in chunks without one,
+    and reads from the input source, or a line per ^ and / with input() without one.
+    When profile is set, the profile of the run is added to the returned object.
+    The file is read as WTFZOMFG, or as Brainfuck when the language is brainfuck or
+    when no language is given and the file has a Brainfuck extension.
+
+    With a budget of dispatches or a timeout in seconds, the program is stopped
+    when it runs out, the result then holds the continuation to resume it with.
+    A run that was stopped is written to the checkpoint file when one is given.
+    With a restore file, the run stored in that checkpoint is continued instead
+    of starting a new one, the memory options are then not used.
+    The run keeps at most error_limit different errors, every error that happens
+    again only increases its count. The dumps of w go to the debug sink,
+    or in full to the output without one.
+    With a trace file, the last trace_size steps of the run are recorded and written
+    to that file when the run ends, also when it stops with an exception. A run with
+    a budget or timeout, or a restored run, can not be traced.
+
+    Unlike running a compiled Program, this asks whether to continue when
+    errors were found before running, unless ignore_errors is set.
     """
-    source = open(file, "r")
-    tokens, lexer_errors = lexer(source)
+    if trace_file is not None and (budget is not None or timeout is not None or
+                                   restore is not None):
+        raise ValueError("A run with a budget, timeout or restore can not be traced")
+    program = compile_file(file, engine, optimization, use_cache, language)
 
-    if lexer_errors and not ignore_errors:
+    if program.lexer_errors and not ignore_errors:
         print("There were lexer errors:")
-        for err in lexer_errors:
+        for err in program.lexer_errors:
             print(err)
         if input("Would you like to continue? y/n ").lower() != "y":
             sys.exit()
 
-    parsed, parser_errors = parse(tokens)
-
-    if parser_errors and not ignore_errors:
+    if program.parser_errors and not ignore_errors:
         print("There were parser errors:")
-        for err in parser_errors:
+        for err in program.parser_errors:
+            print(err)
+        if input("Would you like to continue? y/n ").lower() != "y":
+            sys.exit()
+
+    if program.resolution_errors and not ignore_errors:
+        print("There were resolution errors:")
+        for err in program.resolution_errors:
             print(err)
         if input("Would you like to continue? y/n ").lower() != "y":
             sys.exit()
 
-    memory = [0 for i in range(memory_length)]
-    pointer = 0
-    program = ProgramState(memory, pointer, [], 0)
-    program_state, count = run(program, parsed)
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    if input_source is None:
+        input_source = InputSource()
+    if restore is not None:
+        result = program.resume(program.load_checkpoint(restore, input_source, output, debug),
+                                budget, deadline)
+    elif trace_file is not None:
+        trace = Trace(trace_size)
+        try:
+            result = program.run(None, memory_length, cell_width, paged, input_source,
+                                 output, profile, budget, deadline, error_limit, None, None,
+                                 debug, trace)
+        except BaseException as exception:
+            wtf_trace.save_trace(trace_file, trace, program.functions, file,
+                                 find_language(file, language), exception)
+            raise
+        wtf_trace.save_trace(trace_file, trace, program.functions, file,
+                             find_language(file, language))
+        print("The last", len(trace), "steps were traced to", trace_file)
+    else:
+        result = program.run(None, memory_length, cell_width, paged, input_source,
+                             output, profile, budget, deadline, error_limit, None, None, debug)
 
-    if program_state.errors and not ignore_errors:
+    # The resolution errors are the first errors of a run
+    runtime_errors = result.program_errors.lines(len(program.resolution_errors))
+    if runtime_errors and not ignore_errors:
         print("There were runtime errors:")
-        for err in program_state.errors:
+        for err in runtime_errors:
             print(err)
-    print("Execute was called", count, "times")
-    return Interpreter(tokens, lexer_errors, parsed, parser_errors, program_state)
+    print("Execute was called", result.dispatches, "times")
+    if result.continuation is not None:
+        print("The program was stopped before it finished")
+        if checkpoint is not None:
+            program.save_checkpoint(checkpoint, result.continuation)
+            print("The run was saved to", checkpoint)
+    if isinstance(result.program_memory, PagedTape):
+        print("At most", result.program_memory.peak_pages, "pages of",
+              result.program_memory.page_size, "cells were used")
+    return result
+
+
+def disassemble_file(file: str, optimization: int = 1, use_cache: bool = True,
+                     language: Optional[str] = None) -> str:
+    """
+    Compiles a WTFZOMFG file to bytecode and returns its listing
+    """
+    _, _, parsed, _ = load_program(file, use_cache, MAX_CACHE_SIZE, find_language(file, language))
+    _, functions = pre_run(ProgramState([], 0, [], 0), optimize(parsed, optimization), 0)
+    return disassemble(compile_functions(functions))
+
+
+def transpile_file(file: str, optimization: int = 1, use_cache: bool = True,
+                   language: Optional[str] = None) -> str:
+    """
+    Transpiles a WTFZOMFG file and returns the source of the Python module
+    """
+    _, _, parsed, _ = load_program(file, use_cache, MAX_CACHE_SIZE, find_language(file, language))
+    _, functions = pre_run(ProgramState([], 0, [], 0), optimize(parsed, optimization), 0)
+    return wtf_transpiler.transpile(functions)
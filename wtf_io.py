@@ -0,0 +1,273 @@
+"""The output and input of running WTFZOMFG programs"""
+import codecs
+import inspect
+import io
+import sys
+from typing import IO, List, Optional, Union
+
+# The amount of characters that is collected before it is written
+BUFFER_SIZE = 8192
+
+
+class OutputSink:
+    """
+    Collects the output of a program and writes it to a stream in chunks, instead
+    of printing every character on its own. The stream can be a text stream, like
+    sys.stdout, a file or io.StringIO, or a binary stream, to which the output is
+    written encoded. Without a stream, the output goes to sys.stdout.
+
+    The output is written when the buffer size is reached, after every newline
+    when line_buffered is set, and when flush is called, which the engines do
+    before reading input and when a program stops.
+    """
+
+    def __init__(self, stream: Optional[IO] = None, buffer_size: int = BUFFER_SIZE,
+                 line_buffered: Optional[bool] = None, encoding: str = "utf-8") -> None:
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.line_buffered = line_buffered
+        self.encoding = encoding
+        self.parts: List[str] = []
+        self.size = 0
+
+    def target(self) -> IO:
+        """
+        Returns the stream the output is written to
+        """
+        return self.stream if self.stream is not None else sys.stdout
+
+    def write(self, text: str) -> None:
+        """
+        Adds text to the output, and writes the output if one of the flush policies says so
+        """
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size or \
+                ("\n" in text and self.is_line_buffered()):
+            self.flush()
+
+    def is_line_buffered(self) -> bool:
+        """
+        Checks if the output is written after every newline. When this was not set,
+        the output is line buffered when it goes to a terminal, like sys.stdout is.
+        """
+        if self.line_buffered is None:
+            try:
+                self.line_buffered = self.target().isatty()
+            except (AttributeError, ValueError):
+                self.line_buffered = False
+        return self.line_buffered
+
+    def flush(self) -> None:
+        """
+        Writes all collected output to the stream
+        """
+        if not self.parts:
+            return
+        text = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+
+        stream = self.target()
+        if isinstance(stream, io.TextIOBase) or hasattr(stream, "encoding"):
+            stream.write(text)
+        else:
+            stream.write(text.encode(self.encoding))
+        stream.flush()
+
+    def __deepcopy__(self, memo: dict) -> 'OutputSink':
+        # The output of a program is shared by every copy of its state
+        return self
+
+
+# The amount of characters that is read from an input stream at once
+CHUNK_SIZE = 65536
+
+
+class InputSource:
+    """
+    Serves the input of a program to ^ and /. Without a stream, every ^ and / reads
+    a line with input(), like an answer to a prompt: ^ keeps the first character of the
+    line, and a line with -1 stands for the end of the input.
+
+    With a stream, like sys.stdin, a file or io.StringIO, the input is read in chunks:
+    ^ reads the next character, including newlines, and / reads the next number
+    separated by whitespace. Both give -1 at the end of the stream.
+    """
+
+    def __init__(self, stream: Optional[IO] = None, chunk_size: int = CHUNK_SIZE) -> None:
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        try:
+            self.interactive = stream is None or stream.isatty()
+        except (AttributeError, ValueError):
+            self.interactive = False
+
+    def fill(self) -> bool:
+        """
+        Reads the next chunk of the stream when the buffer has been used up.
+        Returns False at the end of the stream.
+        """
+        if self.position < len(self.buffer):
+            return True
+        self.buffer = self.stream.read(self.chunk_size)
+        self.position = 0
+        return bool(self.buffer)
+
+    def read_character(self) -> Union[str, int]:
+        """
+        Returns the next character, or -1 at the end of the input
+        """
+        if self.stream is None:
+            line = input()
+            return -1 if line == '-1' else line[0]
+        if not self.fill():
+            return -1
+        character = self.buffer[self.position]
+        self.position += 1
+        return character
+
+    def read_number(self) -> int:
+        """
+        Returns the next number, or -1 at the end of the input.
+        Raises a ValueError when the input is not a number, like int does.
+        """
+        if self.stream is None:
+            return int(input())
+
+        # Skip the whitespace before the number
+        while self.fill() and self.buffer[self.position].isspace():
+            self.position += 1
+        if not self.fill():
+            return -1
+
+        word = []
+        while self.fill() and not self.buffer[self.position].isspace():
+            word.append(self.buffer[self.position])
+            self.position += 1
+        return int("".join(word))
+
+    def __deepcopy__(self, memo: dict) -> 'InputSource':
+        # The input of a program is shared by every copy of its state
+        return self
+
+
+class AsyncInputSource:
+    """
+    Serves the input of a program that runs in an event loop. The input is read
+    in chunks from a reader with an async read, like an asyncio.StreamReader,
+    and served like an InputSource with a stream: ^ reads the next character and
+    / the next number, both give -1 at the end of the input. Bytes are decoded
+    as they come in, a character split over two chunks is kept until it is complete.
+    Without a reader the input is empty.
+    """
+
+    def __init__(self, reader: Optional[object] = None, chunk_size: int = CHUNK_SIZE,
+                 encoding: str = "utf-8") -> None:
+        self.reader = reader
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self.buffer = ""
+        self.position = 0
+
+    async def fill(self) -> bool:
+        """
+        Reads the next chunk of the reader when the buffer has been used up.
+        Returns False at the end of the input.
+        """
+        while self.position >= len(self.buffer):
+            if self.reader is None:
+                return False
+            data = await self.reader.read(self.chunk_size)
+            if not data:
+                self.reader = None
+            self.buffer = self.decoder.decode(data, final=not data) \
+                if isinstance(data, bytes) else data
+            self.position = 0
+        return True
+
+    async def read_character(self) -> Union[str, int]:
+        """
+        Returns the next character, or -1 at the end of the input
+        """
+        if not await self.fill():
+            return -1
+        character = self.buffer[self.position]
+        self.position += 1
+        return character
+
+    async def read_number(self) -> int:
+        """
+        Returns the next number, or -1 at the end of the input.
+        Raises a ValueError when the input is not a number, like int does.
+        """
+        while await self.fill() and self.buffer[self.position].isspace():
+            self.position += 1
+        if not await self.fill():
+            return -1
+
+        word = []
+        while await self.fill() and not self.buffer[self.position].isspace():
+            word.append(self.buffer[self.position])
+            self.position += 1
+        return int("".join(word))
+
+    def __deepcopy__(self, memo: dict) -> 'AsyncInputSource':
+        return self
+
+
+class AsyncOutputSink:
+    """
+    Collects the output of a program that runs in an event loop. Writing only
+    collects the output, the runner awaits flush when the program yields to
+    the event loop, reads input or stops. The writer can be an asyncio.StreamWriter,
+    to which the output is written encoded and drained, or any object with a write
+    method that takes text and may be async. Without a writer, the output goes to sys.stdout.
+    """
+
+    def __init__(self, writer: Optional[object] = None, buffer_size: int = BUFFER_SIZE,
+                 encoding: str = "utf-8") -> None:
+        self.writer = writer
+        self.buffer_size = buffer_size
+        self.encoding = encoding
+        self.parts: List[str] = []
+        self.size = 0
+
+    def write(self, text: str) -> None:
+        """
+        Adds text to the output
+        """
+        self.parts.append(text)
+        self.size += len(text)
+
+    def is_full(self) -> bool:
+        """
+        Checks if the collected output has reached the buffer size
+        """
+        return self.size >= self.buffer_size
+
+    async def flush(self) -> None:
+        """
+        Writes all collected output to the writer, and waits until it can take more
+        """
+        if not self.parts:
+            return
+        text = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+
+        if self.writer is None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            return
+        drain = getattr(self.writer, "drain", None)
+        written = self.writer.write(text.encode(self.encoding) if drain else text)
+        if inspect.isawaitable(written):
+            await written
+        if drain:
+            await drain()
+
+    def __deepcopy__(self, memo: dict) -> 'AsyncOutputSink':
+        return self
@@ -1,8 +1,12 @@
 """All the objects needed for the lexer, parser, and runner"""
+import sys
+from array import array
 from enum import Enum
-from typing import List, TypeVar, Union
+from typing import IO, Callable, Dict, Hashable, Iterable, Iterator, List, MutableSequence, \
+    Optional, Sequence, Tuple, TypeVar, Union
 
 from wtf_errors import WtfError
+from wtf_io import InputSource, OutputSink
 
 # Makes use of default enum string eg list(LexerStates)
 class LexerStates(Enum):
@@ -14,11 +18,16 @@ class LexerStates(Enum):
 
 
 class Token:
-    """A token class which consists of a command and a value if needed"""
+    """
+    A token class which consists of a command and a value if needed.
+    The position is the line and word number the command was found at.
+    """
 
-    def __init__(self, command: str = None, value: str = None) -> None:
+    def __init__(self, command: str = None, value: str = None,
+                 position: Tuple[int, int] = None) -> None:
         self.command = command
         self.value = value
+        self.position = position
 
     def __str__(self) -> str:
         return "(" + str(self.command) + ", " + str(self.value) + ")"
@@ -27,55 +36,415 @@ class Token:
         return self.__str__()
 
 
-class LexerVars:
-    """A lexer data holder which contains information needed to generate tokens"""
+# The array type code of every cell width. 8 bit cells are unsigned like in Brainfuck,
+# wider cells are signed. A width of 0 uses a list, of which cells can hold any number.
+CELL_WIDTHS = [0, 8, 16, 32, 64]
+CELL_TYPECODES = {8: 'B', 16: 'h', 32: 'i', 64: 'q'}
 
-    def __init__(self,
-                 token_list: List[Token],
-                 lexer_state: LexerStates,
-                 source_list: List[str],
-                 line_nr: int,
-                 word_nr: int,
-                 errors: List[WtfError]) -> None:
-        self.tokens = token_list
-        self.state = lexer_state
-        self.source = source_list
-        self.line_nr = line_nr
-        self.word_nr = word_nr
-        self.errors = errors
+
+class Tape:
+    """
+    A memory of fixed width cells backed by an array, which reads and prints like a list.
+    Numbers that do not fit a cell wrap around. A cell that holds a character stores
+    its code point and is tagged in a bitmap, so it reads as a one character string.
+    A tape can also use existing buffers of cells and tags, like the memory map of
+    a checkpoint, which are then used without copying them.
+    """
+
+    def __init__(self, length: int, width: int = 64, values: Optional[Sequence[int]] = None,
+                 chars: Optional[MutableSequence[int]] = None, char_count: int = 0) -> None:
+        self.width = width
+        self.values = values if values is not None else array(CELL_TYPECODES[width], [0]) * length
+        self.chars = chars if chars is not None else bytearray((length + 7) // 8)
+        self.char_count = char_count
+        self.low = 0 if width == 8 else -(1 << (width - 1))
+        self.modulus = 1 << width
+
+    def is_char(self, index: int) -> bool:
+        """
+        Checks if the cell at the index is tagged as a character
+        """
+        return bool(self.chars[index >> 3] & (1 << (index & 7)))
+
+    def tag(self, index: int, char: bool) -> None:
+        """
+        Tags or untags the cell at the index as a character
+        """
+        if self.is_char(index) != char:
+            self.chars[index >> 3] ^= 1 << (index & 7)
+            self.char_count += 1 if char else -1
+
+    def tolist(self) -> List[Union[int, str]]:
+        """
+        Returns the cells as a list, like the memory of a program without a cell width
+        """
+        cells = self.values.tolist()
+        if self.char_count:
+            # Only the cells of bytes in the bitmap with a tag are checked
+            for position, byte in enumerate(self.chars):
+                if byte:
+                    for index in range(position * 8, min(position * 8 + 8, len(cells))):
+                        if self.is_char(index):
+                            cells[index] = chr(cells[index] % self.modulus)
+        return cells
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, str, List[Union[int, str]]]:
+        if isinstance(index, slice):
+            return self.tolist()[index]
+        value = self.values[index]
+        if self.char_count and self.is_char(index % len(self.values)):
+            return chr(value % self.modulus)
+        return value
+
+    def __setitem__(self, index: int, value: Union[int, str]) -> None:
+        char = isinstance(value, str)
+        if char:
+            value = ord(value)
+        try:
+            self.values[index] = value
+        except (OverflowError, ValueError):
+            # An array raises an OverflowError, a memory view of a buffer a ValueError
+            self.values[index] = (value - self.low) % self.modulus + self.low
+        if char or self.char_count:
+            self.tag(index % len(self.values), char)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self) -> Iterator[Union[int, str]]:
+        return iter(self.tolist())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, Tape)):
+            return self.tolist() == list(other)
+        return NotImplemented
+
+    def __deepcopy__(self, memo: dict) -> 'Tape':
+        tape = Tape.__new__(Tape)
+        tape.__dict__.update(self.__dict__)
+        if isinstance(self.values, array):
+            tape.values = self.values[:]
+        else:
+            tape.values = array(CELL_TYPECODES[self.width])
+            tape.values.frombytes(self.values)
+        tape.chars = bytearray(self.chars)
+        return tape
+
+    def __str__(self) -> str:
+        return str(self.tolist())
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+# The amount of cells of every page of a paged tape
+PAGE_SIZE = 4096
+
+
+class PagedTape:
+    """
+    A memory that grows like the infinite row of cells of the language. It is split into
+    pages, which are only allocated when a cell on them is written, so cells far apart
+    only cost a few pages. Cells that were never written read as 0. An optional limit
+    is the amount of cells the memory may have, it is None without a limit. Without
+    a limit, the memory prints the cells up to the highest cell that has been used,
+    and its length is sys.maxsize, the largest length Python allows, so the bounds
+    checks of the engines only fail to the left of cell 0. Use memory_limit
+    instead of the length to tell how many cells the memory may have.
+    """
+
+    def __init__(self, limit: Optional[int] = None, width: int = 0, page_size: int = PAGE_SIZE) -> None:
+        self.limit = limit
+        self.width = width
+        self.page_size = page_size
+        self.pages: Dict[int, Union[List[Union[str, int]], Tape]] = {}
+        self.peak_pages = 0
+        self.extent = 0
+
+    def check_index(self, index: int) -> None:
+        """
+        Raises an IndexError when the index is not within the memory,
+        and remembers the highest cell that is used
+        """
+        if not 0 <= index < len(self):
+            raise IndexError("paged tape index out of range")
+        if index >= self.extent:
+            self.extent = index + 1
+
+    def tolist(self) -> List[Union[int, str]]:
+        """
+        Returns the cells up to the limit, or up to the highest used cell without a limit
+        """
+        length = self.extent if self.limit is None else self.limit
+        cells = []
+        for number in range((length + self.page_size - 1) // self.page_size):
+            page = self.pages.get(number)
+            cells.extend(list(page) if page is not None else [0] * self.page_size)
+        return cells[:length]
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, str, List[Union[int, str]]]:
+        if isinstance(index, slice):
+            return self.tolist()[index]
+        self.check_index(index)
+        page = self.pages.get(index // self.page_size)
+        if page is None:
+            return 0
+        return page[index % self.page_size]
+
+    def __setitem__(self, index: int, value: Union[int, str]) -> None:
+        self.check_index(index)
+        number = index // self.page_size
+        page = self.pages.get(number)
+        if page is None:
+            page = self.pages[number] = create_memory(self.page_size, self.width)
+            self.peak_pages = max(self.peak_pages, len(self.pages))
+        page[index % self.page_size] = value
+
+    def __len__(self) -> int:
+        return sys.maxsize if self.limit is None else self.limit
+
+    def __iter__(self) -> Iterator[Union[int, str]]:
+        return iter(self.tolist())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, Tape, PagedTape)):
+            return self.tolist() == list(other)
+        return NotImplemented
+
+    def __str__(self) -> str:
+        return str(self.tolist())
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def memory_limit(memory: Union[List[Union[str, int]], Tape, PagedTape]) -> Optional[int]:
+    """
+    Returns the amount of cells a memory may have, or None for a paged tape without a limit
+    """
+    if isinstance(memory, PagedTape):
+        return memory.limit
+    return len(memory)
+
+
+def create_memory(length: Optional[int], width: int = 0,
+                  paged: bool = False) -> Union[List[Union[str, int]], Tape, PagedTape]:
+    """
+    Creates a memory with every cell set to 0. A width of 0
+    creates a list, other widths create a tape with cells of that width.
+    A paged memory, or a memory without a length, is a paged tape with the
+    length as its limit, of which the pages are created the same way.
+    """
+    if paged or length is None:
+        return PagedTape(length, width)
+    if not width:
+        return [0 for i in range(length)]
+    return Tape(length, width)
+
+
+# The amount of cells a search for a zero cell looks at first,
+# every next window is twice as large up to the largest window
+FIRST_WINDOW = 16
+LARGEST_WINDOW = 4096
+
+
+def find_zero(memory: Union[List[Union[str, int]], Tape, PagedTape], start: int, step: int) -> int:
+    """
+    Returns the first cell that is 0 from the start on, looking at every step-th cell,
+    or -1 when the search reaches the end of the memory first. The cells of a list or tape
+    are searched in windows with the index method of the list or array, instead of
+    one by one. A cell that holds a character is never 0.
+    """
+    if isinstance(memory, PagedTape):
+        return find_zero_paged(memory, start, step)
+    if isinstance(memory, Tape):
+        cells, chars = memory.values, memory.char_count
+    else:
+        cells, chars = memory, 0
+    size = len(cells)
+    window = FIRST_WINDOW
+    position = start
+    while 0 <= position < size:
+        stop = position + window * step
+        found = cells[position:stop if stop >= 0 else None:step]
+        if not isinstance(found, list):
+            found = found.tolist()
+        first = 0
+        while True:
+            try:
+                first = found.index(0, first)
+            except ValueError:
+                break
+            if not chars or not memory.is_char(position + first * step):
+                return position + first * step
+            first += 1
+        position += len(found) * step
+        window = min(window * 2, LARGEST_WINDOW)
+    return -1
+
+
+def find_zero_paged(memory: PagedTape, start: int, step: int) -> int:
+    """
+    Searches a paged tape for a zero cell like find_zero, one page at a time.
+    A page that was never written only holds zeros. A page can reach past the limit
+    of the memory, a zero cell there is not within the memory. The cell that is found
+    counts as used, like it would when the program reads it.
+    """
+    position = start
+    while 0 <= position < len(memory):
+        number, offset = divmod(position, memory.page_size)
+        page = memory.pages.get(number)
+        found = offset if page is None else find_zero(page, offset, step)
+        if found >= 0:
+            cell = number * memory.page_size + found
+            if cell >= len(memory):
+                return -1
+            memory.check_index(cell)
+            return cell
+        # Continues at the first cell of the search after this page
+        if step > 0:
+            position += (memory.page_size - offset + step - 1) // step * step
+        else:
+            position -= (offset // -step + 1) * -step
+    return -1
+
+
+# The amount of different errors a run keeps by default
+ERROR_LIMIT = 100
+
+
+class ErrorEntry:
+    """
+    A data object that holds the first error of a type at a position, how many times
+    such an error happened there, and the number of its first and last occurrence among
+    all errors of the run, counting from 1. The position is the line and word of
+    the function in the source, or None when it is not known.
+    """
+
+    def __init__(self, error: WtfError, position: Optional[Tuple[int, int]], first: int,
+                 count: int = 1, last: Optional[int] = None) -> None:
+        self.error = error
+        self.position = position
+        self.first = first
+        self.count = count
+        self.last = last if last is not None else first
 
     def __str__(self) -> str:
-        return "(" + str(self.tokens) + "\n " + \
-            str(self.source) + "\n " + \
-            str(self.state) + "\n " + \
-            str(self.line_nr) + "\n " + \
-            str(self.word_nr) + ")"
+        message = str(self.error)
+        if self.position is not None:
+            message = str(self.position[0]) + ":" + str(self.position[1]) + ": " + message
+        if self.count == 1:
+            return message
+        return message + " (" + str(self.count) + " times, first as error " + \
+            str(self.first) + ", last as error " + str(self.last) + ")"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ErrorStore:
+    """
+    A bounded store of the errors of a run, used like the list of errors it replaces.
+    An error of the same type at the same position as an earlier one only increases
+    the count of the earlier one, so a loop that keeps failing keeps a single entry.
+    The position is given to append, or else it is the position an engine set before
+    running a function. An error without a position, like an unbalanced bracket
+    found before the run, is kept on its own. At most limit different errors are kept,
+    errors after that are only counted as dropped, so the store does not grow however
+    often errors happen. Messages are only made when the errors are shown.
+    Iterating and indexing go over the kept errors in the order they first happened.
+    """
+
+    def __init__(self, errors: Iterable[WtfError] = (), limit: int = ERROR_LIMIT) -> None:
+        self.limit = limit
+        self.entries: Dict[Hashable, ErrorEntry] = {}
+        self.total = 0
+        self.dropped = 0
+        self.position: Optional[Tuple[int, int]] = None
+        self.extend(errors)
+
+    def append(self, error: WtfError, position: Optional[Tuple[int, int]] = None) -> None:
+        """
+        Adds an error that happened at a position, by default at the position
+        of the function that is running
+        """
+        self.total += 1
+        if position is None:
+            position = self.position
+        key = (type(error), position) if position is not None else self.total
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry.count += 1
+            entry.last = self.total
+        elif len(self.entries) < self.limit:
+            self.entries[key] = ErrorEntry(error, position, self.total)
+        else:
+            self.dropped += 1
+
+    def extend(self, errors: Iterable[WtfError]) -> None:
+        """
+        Adds errors that happened in this order
+        """
+        for error in errors:
+            self.append(error)
+
+    def lines(self, start: int = 0) -> List[str]:
+        """
+        Returns a line for every kept error that first happened after the start-th error,
+        with how often it happened, and a line with the amount of dropped errors
+        """
+        lines = [str(entry) for entry in self.entries.values() if entry.first > start]
+        if self.dropped:
+            lines.append(str(self.dropped) + " more errors were dropped, at most " +
+                         str(self.limit) + " different errors are kept")
+        return lines
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[WtfError]:
+        return iter([entry.error for entry in self.entries.values()])
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[WtfError, List[WtfError]]:
+        return list(self)[index]
+
+    def __str__(self) -> str:
+        return str(self.lines())
 
     def __repr__(self) -> str:
         return self.__str__()
 
 
 class ProgramState:
-    """A data object that holds the current state of the program and other information"""
+    """
+    A data object that holds the current state of the program and other information.
+    The output collects what the program prints and the input serves what it reads,
+    both are shared by all copies of the state, like the debug sink that writes the dumps of w.
+    A list of errors is put in an error store.
+    """
 
     def __init__(self,
-                 memory: List[Union[str, int]],
+                 memory: Union[List[Union[str, int]], Tape, PagedTape],
                  pointer: int,
-                 errors: List[WtfError],
-                 next_index: int) -> None:
+                 errors: Union[List[WtfError], ErrorStore],
+                 next_index: int,
+                 output: OutputSink = None,
+                 input_source: InputSource = None,
+                 debug: 'DebugSink' = None) -> None:
         self.memory = memory
         self.pointer = pointer
-        self.errors = errors
+        self.errors = errors if isinstance(errors, ErrorStore) else ErrorStore(errors)
         self.next_index = next_index
         self.goto_labels = {}
+        self.output = output if output is not None else OutputSink()
+        self.input = input_source if input_source is not None else InputSource()
+        self.debug = debug if debug is not None else DebugSink()
 
-    def get_errors(self, i: int = 0) -> str:
+    def get_errors(self) -> str:
         """
         Creates a string of all errors for ease of reading when printing
         """
-        if not i < len(self.errors):
-            return ""
-        return "\n    " + str(self.errors[i]) + self.get_errors(i + 1)
+        return "".join(map(lambda line: "\n    " + line, self.errors.lines()))
 
     def __str__(self) -> str:
         return \
@@ -88,12 +457,24 @@ class ProgramState:
 
 
 class Function:
-    """A data object that holds a function and its arguments"""
+    """
+    A data object that holds a function and its arguments.
+    The target is the index a control function can jump to, resolved by pre_run.
+    A function made by the optimizer holds the functions it replaces in folded,
+    a folded pointer move or loop also holds the lowest and highest pointer offset it passes.
+    The position is the line and word number of the command in the source.
+    """
     T = TypeVar('T')
 
-    def __init__(self, function: T = None, args: str = None) -> None:
+    def __init__(self, function: T = None, args: str = None, target: int = None,
+                 folded: List['Function'] = None, span: Tuple[int, int] = None,
+                 position: Tuple[int, int] = None) -> None:
         self.func = function
         self.args = args
+        self.target = target
+        self.folded = folded
+        self.span = span
+        self.position = position
 
     def __str__(self) -> str:
         return \
@@ -104,22 +485,401 @@ class Function:
         return self.__str__()
 
 
+class Bytecode:
+    """
+    A data object that holds a compiled program. Every instruction has an opcode
+    and an operand, strings and other values are stored in the constants.
+    The unchecked bytecode is the same program without the bounds checks that
+    the pointer analysis proved can not fail, as long as the memory has more cells
+    than its extent. It is made the first time the virtual machine runs the program.
+    The positions hold the source position of the function of every instruction,
+    or None, so errors are recorded at the same position as in the other engines.
+    """
+
+    def __init__(self, opcodes: array, operands: array, constants: List,
+                 extent: int = -1,
+                 positions: Optional[List[Optional[Tuple[int, int]]]] = None) -> None:
+        self.opcodes = opcodes
+        self.operands = operands
+        self.constants = constants
+        self.extent = extent
+        self.positions = positions if positions is not None else [None] * len(opcodes)
+        self.unchecked: Optional[Bytecode] = None
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Bytecode) and \
+            self.opcodes == other.opcodes and \
+            self.operands == other.operands and \
+            self.constants == other.constants
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def __str__(self) -> str:
+        return \
+            "Bytecode: " + str(len(self.opcodes)) + " instructions, " + \
+            str(len(self.constants)) + " constants"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Profile:
+    """
+    A data object that holds the profile of one run. For every resolved function
+    it holds how often it was executed, the seconds it took and how often it jumped,
+    the last entry is the end of the program.
+    """
+
+    def __init__(self, functions: List[Function]) -> None:
+        self.functions = functions
+        self.counts = [0] * (len(functions) + 1)
+        self.seconds = [0.0] * (len(functions) + 1)
+        self.jumps = [0] * (len(functions) + 1)
+
+    def total(self) -> int:
+        """
+        Returns the amount of dispatches of the run
+        """
+        return sum(self.counts)
+
+    def __str__(self) -> str:
+        return "Profile: " + str(self.total()) + " dispatches in " + \
+            format(sum(self.seconds), ".6f") + " seconds"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+# The amount of steps a trace keeps by default
+TRACE_SIZE = 65536
+
+# The flags of a step of a trace
+TRACE_BEFORE_CHAR = 1
+TRACE_AFTER_CHAR = 2
+TRACE_ERROR = 4
+
+
+class Trace:
+    """
+    A data object that holds the last steps of one run in a ring buffer of size steps.
+    For every step it holds the index of the function, the pointer before it, the cell
+    at that pointer before and after it and the flags of the step. A cell holding
+    a character is stored as its code point with a flag, a number that does not fit
+    64 bits is stored wrapped. The error flag marks a step in which an error happened.
+    The oldest step is overwritten by the next, so a trace never grows.
+    """
+
+    def __init__(self, size: int = TRACE_SIZE) -> None:
+        if size < 1:
+            raise ValueError("A trace must keep at least 1 step, got " + str(size))
+        self.size = size
+        self.indexes = array('q', [0]) * size
+        self.pointers = array('q', [0]) * size
+        self.before = array('q', [0]) * size
+        self.after = array('q', [0]) * size
+        self.flags = array('B', [0]) * size
+        self.steps = 0
+
+    def ordered(self, values: array) -> array:
+        """
+        Returns the kept steps of one of the buffers, the oldest first
+        """
+        if self.steps <= self.size:
+            return values[:self.steps]
+        slot = self.steps % self.size
+        return values[slot:] + values[:slot]
+
+    def __len__(self) -> int:
+        return min(self.steps, self.size)
+
+    def __str__(self) -> str:
+        return "Trace: the last " + str(len(self)) + " of " + str(self.steps) + " steps"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Continuation:
+    """
+    A data object that holds a run that was paused, so it can be resumed: the program state,
+    which holds the pointer and the index of the next instruction, the stack of
+    entered loops and the amount of dispatches so far.
+    The analysed pointer is the pointer the run paused at, where the pointer analysis of
+    the unchecked bytecode expects it, or None when the run left the analysed path.
+    A run that is started is expected at cell 0.
+    """
+
+    def __init__(self, program_state: ProgramState, loops: List[int] = None,
+                 dispatches: int = 0, analysed_pointer: Optional[int] = 0) -> None:
+        self.program_state = program_state
+        self.loops = loops if loops is not None else []
+        self.dispatches = dispatches
+        self.analysed_pointer = analysed_pointer
+
+    def __str__(self) -> str:
+        return "Continuation at instruction " + str(self.program_state.next_index) + \
+            " after " + str(self.dispatches) + " dispatches"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+# How much of a run its result holds. The full result holds the tokens, the parsed
+# functions, all errors and the whole memory, the minimal result only what a service
+# needs: the errors, pointer, dispatches and continuation, and a window of the memory.
+DETAIL_LEVELS = ["full", "minimal"]
+
+
+class MemoryWindow:
+    """
+    A view of the cells from start until stop of a memory, which reads and prints
+    like a list of those cells without copying them. Reading a cell of a paged tape
+    through the window does not count it as used.
+    """
+
+    def __init__(self, memory: Union[List[Union[str, int]], Tape, PagedTape],
+                 start: int, stop: int) -> None:
+        self.memory = memory
+        self.start = max(start, 0)
+        self.stop = max(self.start, min(stop, len(memory)))
+
+    def cell(self, index: int) -> Union[int, str]:
+        """
+        Returns the cell of the memory at the index
+        """
+        if isinstance(self.memory, PagedTape):
+            page = self.memory.pages.get(index // self.memory.page_size)
+            return 0 if page is None else page[index % self.memory.page_size]
+        return self.memory[index]
+
+    def tolist(self) -> List[Union[int, str]]:
+        """
+        Returns the cells of the window as a list
+        """
+        return list(map(self.cell, range(self.start, self.stop)))
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[int, str, List[Union[int, str]]]:
+        if isinstance(index, slice):
+            return self.tolist()[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("memory window index out of range")
+        return self.cell(self.start + index)
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __iter__(self) -> Iterator[Union[int, str]]:
+        return iter(self.tolist())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, Tape, PagedTape, MemoryWindow)):
+            return self.tolist() == list(other)
+        return NotImplemented
+
+    def __str__(self) -> str:
+        return str(self.tolist())
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+# The modes of a debug sink: the whole memory, the cells around the pointer,
+# the cells that changed since the previous dump, or the cells that are not 0
+DEBUG_MODES = ["memory", "window", "changes", "nonzero"]
+
+# The amount of cells on both sides of the pointer in a window dump
+DEBUG_RADIUS = 8
+
+
+def nonzero_cells(memory: Union[List[Union[str, int]], Tape, PagedTape]
+                  ) -> Iterator[Tuple[int, Union[int, str]]]:
+    """
+    Yields the index and value of every cell that is not 0. Only the allocated
+    pages of a paged tape are read, and reading them does not count them as used.
+    """
+    if isinstance(memory, PagedTape):
+        for number in sorted(memory.pages):
+            page = memory.pages[number]
+            offset = number * memory.page_size
+            for index, value in enumerate(page.tolist() if isinstance(page, Tape) else page):
+                if value != 0:
+                    yield offset + index, value
+        return
+    for index, value in enumerate(memory.tolist() if isinstance(memory, Tape) else memory):
+        if value != 0:
+            yield index, value
+
+
+def format_runs(cells: Iterable[Tuple[int, Union[int, str]]]) -> str:
+    """
+    Returns cells, sorted by index, as index: value entries, of which
+    a run of neighbouring cells with the same value is one start-stop: value entry
+    """
+    entries = []
+    start = last = value = None
+    for index, cell in cells:
+        if start is not None and index == last + 1 and cell == value:
+            last = index
+            continue
+        if start is not None:
+            entries.append(format_run(start, last, value))
+        start = last = index
+        value = cell
+    if start is not None:
+        entries.append(format_run(start, last, value))
+    return "{" + ", ".join(entries) + "}"
+
+
+def format_run(start: int, last: int, value: Union[int, str]) -> str:
+    """
+    Returns the entry of a run of cells from start up to and including last
+    """
+    return (str(start) if start == last else str(start) + "-" + str(last)) + ": " + repr(value)
+
+
+class DebugSink:
+    """
+    Writes the dumps of w, which hold the pointer and then, depending on the mode,
+    the whole memory, the cells within the radius around the pointer after the index
+    of the first of them, the cells that changed since the previous written dump,
+    or the cells that are not 0. Without a stream the dumps are written to the output
+    of the program, so they stay in order with what it prints.
+
+    Only the first of every few dumps is written, and a run writes at most limit dumps,
+    the others are counted as skipped. A sink belongs to a single run.
+    """
+
+    def __init__(self, stream: Optional[IO] = None, mode: str = "memory",
+                 radius: int = DEBUG_RADIUS, every: int = 1,
+                 limit: Optional[int] = None) -> None:
+        if mode not in DEBUG_MODES:
+            raise ValueError("Unknown debug mode " + repr(mode) +
+                             ", choose from " + ", ".join(DEBUG_MODES))
+        if every < 1:
+            raise ValueError("every must be at least 1, got " + str(every))
+        self.stream = stream
+        self.mode = mode
+        self.radius = radius
+        self.every = every
+        self.limit = limit
+        self.dumps = 0
+        self.written = 0
+        self.skipped = 0
+        self.previous: Dict[int, Union[int, str]] = {}
+
+    def dump(self, pointer: int, memory: Union[List[Union[str, int]], Tape, PagedTape],
+             write: Callable[[str], None]) -> None:
+        """
+        Writes a dump of the pointer and memory to the stream, or with the write
+        function of the output without one, unless the rate limit skips it
+        """
+        self.dumps += 1
+        if (self.dumps - 1) % self.every or \
+                (self.limit is not None and self.written >= self.limit):
+            self.skipped += 1
+            return
+        self.written += 1
+        text = str(pointer) + " " + self.describe(pointer, memory) + "\n"
+        if self.written == self.limit:
+            text += "w: the limit of " + str(self.limit) + " dumps is reached, " \
+                    "the next dumps are skipped\n"
+        (self.stream.write if self.stream is not None else write)(text)
+
+    def describe(self, pointer: int,
+                 memory: Union[List[Union[str, int]], Tape, PagedTape]) -> str:
+        """
+        Returns the part of a dump after the pointer
+        """
+        if self.mode == "memory":
+            return str(memory)
+        if self.mode == "window":
+            window = MemoryWindow(memory, pointer - self.radius, pointer + self.radius + 1)
+            return str(window.start) + ": " + str(window)
+        cells = dict(nonzero_cells(memory))
+        if self.mode == "nonzero":
+            return format_runs(cells.items())
+        changed = sorted(index for index in cells.keys() | self.previous.keys()
+                         if cells.get(index, 0) != self.previous.get(index, 0))
+        self.previous = cells
+        return format_runs((index, cells.get(index, 0)) for index in changed)
+
+    def __deepcopy__(self, memo: dict) -> 'DebugSink':
+        # The dumps of a run are counted by every copy of its state together
+        return self
+
+
 class Interpreter:
-    """A data object to encompass the variables created by the interpreter"""
-
-    def __init__(self, tokens:
-                 List[Token],
-                 lexer_errors: List[WtfError],
-                 parsed: List[Function],
-                 parser_errors: List[WtfError],
-                 program_state: ProgramState) -> None:
-        self.tokens = tokens
-        self.lexer_errors = lexer_errors
-        self.parsed = parsed
-        self.parser_errors = parser_errors
-        self.program_memory = program_state.memory
+    """
+    A data object to encompass the variables created by the interpreter.
+    A run that was paused holds the continuation to resume it with.
+    The tokens, parsed functions and their errors are only made into lists when they
+    are read. A minimal result does not hold the tokens and parsed functions.
+    With a window, the memory is a view of the cells from start until stop,
+    otherwise it is the whole memory, or None in a minimal result.
+    """
+
+    def __init__(self,
+                 tokens: Sequence[Token],
+                 lexer_errors: Sequence[WtfError],
+                 parsed: Sequence[Function],
+                 parser_errors: Sequence[WtfError],
+                 program_state: ProgramState,
+                 profile: Optional[Profile] = None,
+                 dispatches: int = 0,
+                 continuation: Optional[Continuation] = None,
+                 detail: str = "full",
+                 window: Optional[Tuple[int, int]] = None) -> None:
+        if detail not in DETAIL_LEVELS:
+            raise ValueError("Unknown detail level " + repr(detail) +
+                             ", choose from " + ", ".join(DETAIL_LEVELS))
+        minimal = detail == "minimal"
+        self.__tokens = None if minimal else tokens
+        self.__lexer_errors = lexer_errors
+        self.__parsed = None if minimal else parsed
+        self.__parser_errors = parser_errors
+        if window is not None:
+            self.program_memory = MemoryWindow(program_state.memory, *window)
+        else:
+            self.program_memory = None if minimal else program_state.memory
         self.program_pointer = program_state.pointer
         self.program_errors = program_state.errors
+        self.peak_pages = program_state.memory.peak_pages \
+            if isinstance(program_state.memory, PagedTape) else 0
+        self.profile = profile
+        self.dispatches = dispatches
+        self.continuation = continuation
+        self.detail = detail
+
+    @property
+    def tokens(self) -> Optional[List[Token]]:
+        """The tokens made by the lexer"""
+        if self.__tokens is not None and not isinstance(self.__tokens, list):
+            self.__tokens = list(self.__tokens)
+        return self.__tokens
+
+    @property
+    def lexer_errors(self) -> List[WtfError]:
+        """The errors found by the lexer"""
+        if not isinstance(self.__lexer_errors, list):
+            self.__lexer_errors = list(self.__lexer_errors)
+        return self.__lexer_errors
+
+    @property
+    def parsed(self) -> Optional[List[Function]]:
+        """The functions made by the parser"""
+        if self.__parsed is not None and not isinstance(self.__parsed, list):
+            self.__parsed = list(self.__parsed)
+        return self.__parsed
+
+    @property
+    def parser_errors(self) -> List[WtfError]:
+        """The errors found by the parser"""
+        if not isinstance(self.__parser_errors, list):
+            self.__parser_errors = list(self.__parser_errors)
+        return self.__parser_errors
 
     def __str__(self) -> str:
         return \
@@ -129,7 +889,10 @@ class Interpreter:
             "Parser errors: " + str(self.parser_errors) + "\n" + \
             "Program momery: " + str(self.program_memory) + "\n" + \
             "Program pointer" + str(self.program_pointer) + "\n" + \
-            "Program errors" + str(self.program_errors) + "\n"
+            "Program errors" + str(self.program_errors) + "\n" + \
+            "Peak pages: " + str(self.peak_pages) + "\n" + \
+            "Dispatches: " + str(self.dispatches) + "\n" + \
+            "Finished: " + str(self.continuation is None) + "\n"
 
     def __repr__(self) -> str:
         return self.__str__()
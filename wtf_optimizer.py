@@ -0,0 +1,259 @@
+"""A peephole optimizer that folds parsed WTFZOMFG functions before they are resolved"""
+from itertools import accumulate, groupby
+from typing import List, Optional, Tuple
+
+from wtf_functions import cell_increase, cell_decrease, cell_increase_with, cell_set, \
+    pointer_move_left, pointer_move_right, pointer_move_relative, \
+    print_character, print_until, loop_start, loop_end, cell_multiply_add, pointer_scan
+from wtf_objects import Function
+
+OPTIMIZATION_LEVELS = [0, 1]
+
+PRINT_FUNCTIONS = [print_character, print_until]
+
+
+def integer_argument(args: str) -> Optional[int]:
+    """
+    Returns the argument as a number, or None if it is not a number
+    """
+    try:
+        return int(args)
+    except (TypeError, ValueError):
+        return None
+
+
+def folded_length(function: Function) -> int:
+    """
+    Returns the amount of parsed functions a function stands for
+    """
+    if not function.folded:
+        return 1
+    return sum(map(folded_length, function.folded))
+
+
+def cell_delta(function: Function) -> Optional[int]:
+    """
+    Returns how much a function increases the cell at the pointer,
+    or None if the function is not a cell increase.
+    """
+    if function.func is cell_increase:
+        return 1
+    if function.func is cell_decrease:
+        return -1
+    if function.func is cell_increase_with:
+        return integer_argument(function.args)
+    return None
+
+
+def pointer_delta(function: Function) -> Optional[int]:
+    """
+    Returns how far a function moves the pointer to the right,
+    or None if the function is not a relative pointer move.
+    """
+    if function.func is pointer_move_right:
+        return 1
+    if function.func is pointer_move_left:
+        return -1
+    if function.func is pointer_move_relative:
+        return integer_argument(function.args)
+    return None
+
+
+def fold_key(function: Function) -> Optional[str]:
+    """
+    Returns the kind of run a function can be folded into, or None if it can not be folded
+    """
+    if cell_delta(function) is not None:
+        return "cell"
+    if pointer_delta(function) is not None:
+        return "pointer"
+    if function.func in PRINT_FUNCTIONS:
+        return "print"
+    return None
+
+
+def fold_cells(run: List[Function]) -> List[Function]:
+    """
+    Folds a run of cell increases into a single increase
+    """
+    if len(run) < 2:
+        return run
+    delta = sum(map(cell_delta, run))
+    return [Function(cell_increase_with, str(delta), folded=run, position=run[0].position)]
+
+
+def fold_pointers(run: List[Function]) -> List[Function]:
+    """
+    Folds a run of pointer moves into a single relative move. The span holds
+    the lowest and highest offset the run passes, so the engines can tell whether
+    every move of the run stays within the memory.
+    """
+    if len(run) < 2:
+        return run
+    offsets = list(accumulate(map(pointer_delta, run)))
+    span = (min(0, min(offsets)), max(0, max(offsets)))
+    return [Function(pointer_move_relative, str(offsets[-1]), folded=run, span=span,
+                     position=run[0].position)]
+
+
+def decode_print(args: str) -> str:
+    """
+    Returns the text a print function prints
+    """
+    return args.replace("\\n", "\n")
+
+
+def merge_prints(run: List[Function]) -> List[Function]:
+    """
+    Merges a run of prints into as few prints as possible. Two prints are not merged
+    when their combined argument would be printed differently, like '\\' and 'n'.
+    """
+    merged = []
+    for function in run:
+        if merged and decode_print(merged[-1].args + function.args) == \
+                decode_print(merged[-1].args) + decode_print(function.args):
+            previous = merged.pop()
+            folded = (previous.folded or [previous]) + [function]
+            merged.append(Function(print_until, previous.args + function.args, folded=folded,
+                                   position=previous.position))
+        else:
+            merged.append(function)
+    return merged
+
+
+def fold_runs(functions: List[Function]) -> List[Function]:
+    """
+    Folds every run of cell increases, pointer moves and prints
+    """
+    folders = {"cell": fold_cells, "pointer": fold_pointers, "print": merge_prints}
+    folded = []
+    for key, run in groupby(functions, fold_key):
+        run = list(run)
+        folded.extend(folders[key](run) if key else run)
+    return folded
+
+
+def is_clear_loop(functions: List[Function], index: int) -> bool:
+    """
+    Checks if the functions at the index form a loop that only increases
+    or decreases the cell at the pointer by one, like ( - )
+    """
+    return index + 2 < len(functions) and \
+        functions[index].func is loop_start and \
+        cell_delta(functions[index + 1]) in (1, -1) and \
+        functions[index + 2].func is loop_end
+
+
+def standalone_loop(loop: List[Function]) -> List[Function]:
+    """
+    Returns a copy of a loop without nested control functions that has its own
+    jump targets, so it can be run on its own as the functions a folded loop replaces
+    """
+    start, *body, end = loop
+    return [Function(start.func, start.args, target=len(loop), position=start.position)] + \
+        body + [Function(end.func, end.args, target=0, position=end.position)]
+
+
+def fold_clear_loops(functions: List[Function]) -> List[Function]:
+    """
+    Replaces every clear loop by setting the cell to 0. The folded loop keeps
+    its own jump targets, so it can be run on its own.
+    """
+    folded = []
+    index = 0
+    while index < len(functions):
+        if is_clear_loop(functions, index):
+            loop = standalone_loop(functions[index:index + 3])
+            folded.append(Function(cell_set, "0", folded=loop, position=loop[0].position))
+            index += 3
+        else:
+            folded.append(functions[index])
+            index += 1
+    return folded
+
+
+def simple_loop_end(functions: List[Function], index: int) -> int:
+    """
+    Returns the index of the end of the loop at the index when the loop only holds
+    cell increases and pointer moves, or -1 if it does not
+    """
+    if functions[index].func is not loop_start:
+        return -1
+    for end in range(index + 1, len(functions)):
+        if functions[end].func is loop_end:
+            return end
+        if fold_key(functions[end]) not in ("cell", "pointer"):
+            return -1
+    return -1
+
+
+def move_span(function: Function) -> Tuple[int, int]:
+    """
+    Returns the lowest and highest offset a pointer move passes
+    """
+    if function.span:
+        return function.span
+    delta = pointer_delta(function)
+    return min(0, delta), max(0, delta)
+
+
+def fold_loop(loop: List[Function]) -> Optional[Function]:
+    """
+    Returns the function that replaces a loop of cell increases and pointer moves,
+    or None when it is not an idiom. A multiply loop, like ( - > + + + < ), returns
+    the pointer to where it started and increases or decreases that cell by one every
+    iteration. Its argument holds the increase of every cell it changes by offset.
+    A scan loop, like ( > ), only moves the pointer.
+    """
+    increases = {}
+    offset = 0
+    low, high = 0, 0
+    for function in loop[1:-1]:
+        delta = cell_delta(function)
+        if delta is not None:
+            increases[offset] = increases.get(offset, 0) + delta
+            continue
+        lowest, highest = move_span(function)
+        low, high = min(low, offset + lowest), max(high, offset + highest)
+        offset += pointer_delta(function)
+
+    if not increases and offset:
+        return Function(pointer_scan, str(offset), folded=standalone_loop(loop),
+                        span=(low, high), position=loop[0].position)
+    if not offset and increases.get(0) in (1, -1):
+        args = " ".join(str(cell) + ":" + str(increase)
+                        for cell, increase in sorted(increases.items()) if increase or not cell)
+        return Function(cell_multiply_add, args, folded=standalone_loop(loop),
+                        span=(low, high), position=loop[0].position)
+    return None
+
+
+def fold_loop_idioms(functions: List[Function]) -> List[Function]:
+    """
+    Replaces every multiply loop by adding multiples of the cell at the pointer
+    to the cells it changes at once, and every scan loop by a search for the first
+    cell that is 0. The folded loop keeps its own jump targets, like a clear loop.
+    """
+    folded = []
+    index = 0
+    while index < len(functions):
+        end = simple_loop_end(functions, index)
+        function = fold_loop(functions[index:end + 1]) if end >= 0 else None
+        if function is not None:
+            folded.append(function)
+            index = end + 1
+        else:
+            folded.append(functions[index])
+            index += 1
+    return folded
+
+
+def optimize(functions: List[Function], level: int = 1) -> List[Function]:
+    """
+    Optimizes parsed functions before they are resolved by pre_run.
+    Level 0 leaves the functions as they are, level 1 folds runs of cell increases
+    and pointer moves, merges prints and replaces clear, multiply and scan loops.
+    """
+    if level < 1:
+        return functions
+    return fold_loop_idioms(fold_clear_loops(fold_runs(functions)))
@@ -15,7 +15,7 @@ def find_function(token: Token) -> Union[Function, WtfError]:
         return UnknownTypeError(Token(), token)
     if token.command not in TOKEN_FUNCTIONS:
         return UnknownTokenError(token)
-    return Function(TOKEN_FUNCTIONS[token.command], token.value)
+    return Function(TOKEN_FUNCTIONS[token.command], token.value, position=token.position)
 
 
 def parse(tokens: List[Token]) -> Tuple[List[Function], List[WtfError]]:
@@ -0,0 +1,183 @@
+"""A profiler that counts and times every function of a WTFZOMFG program while it runs"""
+import time
+from typing import List, Optional, Tuple
+
+import wtf_functions as wtf
+from wtf_bytecode import FUNCTION_COMMANDS
+from wtf_engine import GOTO_FUNCTIONS, STOP, step
+from wtf_objects import Function, Profile, ProgramState
+
+# The names of the functions made by the optimizer, like the opcodes of the virtual machine
+FOLDED_NAMES = {
+    wtf.cell_increase_with: "CELL_INCREASE_FOLDED",
+    wtf.pointer_move_relative: "POINTER_MOVE_FOLDED",
+    wtf.cell_set: "CELL_CLEAR",
+    wtf.cell_multiply_add: "CELL_MULTIPLY_ADD",
+    wtf.pointer_scan: "POINTER_SCAN",
+}
+
+
+def opcode_name(function: Optional[Function]) -> str:
+    """
+    Returns the name a function is profiled as, None is the end of the program
+    """
+    if function is None:
+        return "END"
+    if function.folded and function.func in FOLDED_NAMES:
+        return FOLDED_NAMES[function.func]
+    return FUNCTION_COMMANDS[function.func]
+
+
+def execute(program_state: ProgramState, functions: List[Function],
+            profile: Profile) -> Tuple[ProgramState, int]:
+    """
+    Executes the functions with the step of the flat engine, while counting and timing
+    every function in the profile. The engines themselves are not instrumented,
+    so they do not slow down when the profiler is not used.
+    """
+    p_s = program_state
+    counts = profile.counts
+    seconds = profile.seconds
+    jumps = profile.jumps
+    clock = time.perf_counter
+
+    loops = []
+    index = 0
+    end = len(functions)
+    last = clock()
+
+    while True:
+        current = index
+        index, dispatches = step(p_s, functions, current, loops)
+        # The functions a folded function falls back to are counted as that function
+        counts[current] += dispatches
+        now = clock()
+        seconds[current] += now - last
+        last = now
+        if index == STOP:
+            index = current
+            break
+        if index != current + 1 and current < end:
+            jumps[current] += 1
+
+    p_s.next_index = index
+    return p_s, profile.total()
+
+
+def function_at(profile: Profile, index: int) -> Optional[Function]:
+    """
+    Returns the function at an index of the profile, or None for the end of the program
+    """
+    return profile.functions[index] if index < len(profile.functions) else None
+
+
+def by_opcode(profile: Profile) -> List[Tuple[str, int, float]]:
+    """
+    Returns the name, count and seconds of every executed kind of function,
+    the slowest first
+    """
+    totals = {}
+    for index, count in enumerate(profile.counts):
+        if count:
+            name = opcode_name(function_at(profile, index))
+            old_count, old_seconds = totals.get(name, (0, 0.0))
+            totals[name] = (old_count + count, old_seconds + profile.seconds[index])
+    return sorted(((name, count, seconds) for name, (count, seconds) in totals.items()),
+                  key=lambda total: total[2], reverse=True)
+
+
+def by_position(profile: Profile) -> List[Tuple[Optional[Tuple[int, int]], str, int, float]]:
+    """
+    Returns the source position, name, count and seconds of every executed function,
+    the slowest first
+    """
+    positions = []
+    for index, count in enumerate(profile.counts):
+        if count:
+            function = function_at(profile, index)
+            positions.append((function.position if function else None,
+                              opcode_name(function), count, profile.seconds[index]))
+    return sorted(positions, key=lambda position: position[3], reverse=True)
+
+
+def hottest_loops(profile: Profile) -> List[Tuple[str, str, Optional[Tuple[int, int]], int, float]]:
+    """
+    Returns the kind, name, source position, iterations and seconds of every loop
+    that was run, the slowest first. A loop is a pair of ( and ), or the functions
+    between a label and the last goto that jumps back to it. The seconds of
+    a loop include the loops inside it.
+    """
+    functions = profile.functions
+    loops = []
+    for index, function in enumerate(functions):
+        if function.func is wtf.loop_start and function.target is not None \
+                and profile.counts[index]:
+            last = function.target - 1
+            loops.append(("loop", "(", function.position, profile.counts[last],
+                          sum(profile.seconds[index:last + 1])))
+
+    labels = {}
+    for index, function in enumerate(functions):
+        if function.func in GOTO_FUNCTIONS and function.target is not None \
+                and function.target - 1 <= index and profile.jumps[index]:
+            label = function.target - 1
+            last, iterations = labels.get(label, (index, 0))
+            labels[label] = (max(last, index), iterations + profile.jumps[index])
+    for label, (last, iterations) in labels.items():
+        loops.append(("label", functions[label].args, functions[label].position, iterations,
+                      sum(profile.seconds[label:last + 1])))
+
+    return sorted(loops, key=lambda loop: loop[4], reverse=True)
+
+
+def format_position(position: Optional[Tuple[int, int]]) -> str:
+    """
+    Returns a source position as line:word
+    """
+    if position is None:
+        return "end"
+    return str(position[0]) + ":" + str(position[1])
+
+
+def format_profile(profile: Profile, limit: int = 10) -> str:
+    """
+    Returns a ranked report of the slowest kinds of functions, source positions
+    and loops, with at most limit lines per section
+    """
+    total_seconds = sum(profile.seconds) or 1.0
+    lines = [str(profile), "", "Functions:"]
+    for name, count, seconds in by_opcode(profile)[:limit]:
+        lines.append("    " + name.ljust(24) + str(count).rjust(12) +
+                     format(seconds, ".6f").rjust(12) + "s" +
+                     format(seconds / total_seconds * 100, ".1f").rjust(7) + "%")
+
+    lines.extend(["", "Source positions:"])
+    for position, name, count, seconds in by_position(profile)[:limit]:
+        lines.append("    " + format_position(position).ljust(10) + name.ljust(24) +
+                     str(count).rjust(12) + format(seconds, ".6f").rjust(12) + "s")
+
+    lines.extend(["", "Loops:"])
+    for kind, name, position, iterations, seconds in hottest_loops(profile)[:limit]:
+        lines.append("    " + format_position(position).ljust(10) +
+                     (kind + " " + name).ljust(24) + str(iterations).rjust(12) +
+                     format(seconds, ".6f").rjust(12) + "s")
+    return "\n".join(lines)
+
+
+def profile_json(profile: Profile) -> dict:
+    """
+    Returns the profile as a dictionary that can be stored as JSON
+    """
+    def position_json(position: Optional[Tuple[int, int]]) -> Optional[dict]:
+        return {"line": position[0], "word": position[1]} if position else None
+
+    return {"dispatches": profile.total(),
+            "seconds": sum(profile.seconds),
+            "functions": [{"function": name, "count": count, "seconds": seconds}
+                          for name, count, seconds in by_opcode(profile)],
+            "positions": [{"position": position_json(position), "function": name,
+                           "count": count, "seconds": seconds}
+                          for position, name, count, seconds in by_position(profile)],
+            "loops": [{"kind": kind, "name": name, "position": position_json(position),
+                       "iterations": iterations, "seconds": seconds}
+                      for kind, name, position, iterations, seconds in hottest_loops(profile)]}
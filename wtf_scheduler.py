@@ -0,0 +1,32 @@
+"""A scheduler that runs many paused WTFZOMFG programs by turns"""
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from wtf_interpreter import Program
+from wtf_objects import Continuation, Interpreter
+
+# The amount of dispatches a run gets every turn
+SLICE = 10000
+
+
+def run_round_robin(runs: List[Tuple[Program, Continuation]], budget: int = SLICE,
+                    deadline: Optional[float] = None) -> List[Interpreter]:
+    """
+    Resumes every run for a budget of dispatches by turns, until all of them
+    have finished or the deadline, a time.monotonic() value, has passed.
+    Returns the result of every run in the order of the runs. The result of a run
+    that did not finish before the deadline holds its continuation, so it can be
+    scheduled again.
+    """
+    results: List[Optional[Interpreter]] = [None] * len(runs)
+    waiting = deque(range(len(runs)))
+    while waiting:
+        index = waiting.popleft()
+        program, continuation = runs[index]
+        # After the deadline every run is resumed once more, which pauses it right away
+        results[index] = program.resume(continuation, budget, deadline)
+        if results[index].continuation is not None \
+                and (deadline is None or time.monotonic() < deadline):
+            waiting.append(index)
+    return results
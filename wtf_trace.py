@@ -0,0 +1,310 @@
+"""A trace recorder that keeps the last steps of a WTFZOMFG run, and a tool to replay them"""
+import argparse
+import json
+import re
+import struct
+import sys
+from array import array
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+from wtf_engine import STOP, step
+from wtf_objects import TRACE_AFTER_CHAR, TRACE_BEFORE_CHAR, TRACE_ERROR, Function, PagedTape, \
+    ProgramState, Tape, Trace
+from wtf_profiler import format_position, opcode_name
+
+# Increase the version when the layout of a trace file changes
+VERSION = 1
+
+MAGIC = b"WTFTRACE"
+
+# The magic, the version and the length of the metadata
+HEADER = struct.Struct("<8sII")
+
+# Numbers are stored wrapped to this many bits
+WRAP = 1 << 64
+
+Memory = Union[List[Union[str, int]], Tape, PagedTape]
+
+
+def cell_reader(memory: Memory) -> Callable[[int], Union[int, str]]:
+    """
+    Returns a function that reads the cell at an index. Reading a cell of a paged
+    tape does not count it as used, so tracing a run does not change its memory.
+    """
+    if not isinstance(memory, PagedTape):
+        return memory.__getitem__
+    pages = memory.pages
+    page_size = memory.page_size
+
+    def read_paged(index: int) -> Union[int, str]:
+        page = pages.get(index // page_size)
+        return 0 if page is None else page[index % page_size]
+    return read_paged
+
+
+def wrapped(value: int) -> int:
+    """
+    Returns a number wrapped to a signed 64 bit number
+    """
+    return (value + WRAP // 2) % WRAP - WRAP // 2
+
+
+def execute(program_state: ProgramState, functions: List[Function],
+            trace: Trace) -> Tuple[ProgramState, int]:
+    """
+    Executes the functions with the step of the flat engine, while recording every
+    function that is run in the trace. The engines themselves are not instrumented, so they
+    do not slow down when no trace is recorded. A step only costs a few stores in
+    the preallocated buffers of the trace, however long the program runs.
+    """
+    p_s = program_state
+    errors = p_s.errors
+    read = cell_reader(p_s.memory)
+    indexes, pointers = trace.indexes, trace.pointers
+    before, after, flags = trace.before, trace.after, trace.flags
+    size = trace.size
+    slot = trace.steps % size
+    steps = trace.steps
+
+    loops = []
+    index = 0
+    count = 0
+    end = len(functions)
+
+    try:
+        while True:
+            current = index
+            if current < end:
+                pointer = p_s.pointer
+                old = read(pointer)
+                total = errors.total
+
+            index, dispatches = step(p_s, functions, current, loops)
+            count += dispatches
+            if index == STOP:
+                index = current
+                break
+            # The end of the program is not a step of the trace
+            if current >= end:
+                continue
+
+            new = read(pointer)
+            flag = 0 if errors.total == total else TRACE_ERROR
+            if type(old) is not int:
+                old = ord(old)
+                flag |= TRACE_BEFORE_CHAR
+            if type(new) is not int:
+                new = ord(new)
+                flag |= TRACE_AFTER_CHAR
+            try:
+                before[slot] = old
+                after[slot] = new
+            except OverflowError:
+                before[slot] = wrapped(old)
+                after[slot] = wrapped(new)
+            indexes[slot] = current
+            pointers[slot] = pointer
+            flags[slot] = flag
+            steps += 1
+            slot += 1
+            if slot == size:
+                slot = 0
+    finally:
+        trace.steps = steps
+
+    p_s.next_index = index
+    return p_s, count
+
+
+def save_trace(file: str, trace: Trace, functions: Sequence[Function],
+               source: Optional[str] = None, language: str = "wtf",
+               exception: Optional[BaseException] = None) -> None:
+    """
+    Writes the kept steps of a trace to a file, the oldest first: a header, the metadata
+    as JSON and then the buffers of the trace. The metadata holds the name and source
+    position of every function, so the trace can be replayed without compiling
+    the program again, the source file it was compiled from and the exception
+    that stopped the run, if one did.
+    """
+    metadata = {"byteorder": sys.byteorder,
+                "steps": trace.steps,
+                "kept": len(trace),
+                "source": source,
+                "language": language,
+                "exception": repr(exception) if exception is not None else None,
+                "functions": [[opcode_name(function), function.position]
+                              for function in functions]}
+    encoded = json.dumps(metadata, separators=(",", ":")).encode()
+    with open(file, "wb") as trace_file:
+        trace_file.write(HEADER.pack(MAGIC, VERSION, len(encoded)))
+        trace_file.write(encoded)
+        for values in (trace.indexes, trace.pointers, trace.before, trace.after, trace.flags):
+            trace.ordered(values).tofile(trace_file)
+
+
+class Replay:
+    """
+    The steps of a trace read from a file, which can be stepped through backward
+    and forward. Steps are numbered from the first step of the run, so when
+    the trace kept only the last steps, the first kept step has a higher number.
+    """
+
+    def __init__(self, metadata: dict, buffers: List[array]) -> None:
+        self.metadata = metadata
+        self.indexes, self.pointers, self.before, self.after, self.flags = buffers
+        self.steps = metadata["steps"]
+        self.first = self.steps - metadata["kept"]
+
+    def function(self, step: int) -> Tuple[str, Optional[Tuple[int, int]]]:
+        """
+        Returns the name and source position of the function run in a step
+        """
+        name, position = self.metadata["functions"][self.indexes[step - self.first]]
+        return name, tuple(position) if position is not None else None
+
+    def cells(self, step: int) -> Tuple[Union[int, str], Union[int, str]]:
+        """
+        Returns the cell at the pointer before and after a step
+        """
+        kept = step - self.first
+        flag = self.flags[kept]
+        old, new = self.before[kept], self.after[kept]
+        return chr(old) if flag & TRACE_BEFORE_CHAR else old, \
+            chr(new) if flag & TRACE_AFTER_CHAR else new
+
+    def has_error(self, step: int) -> bool:
+        """
+        Checks if an error happened in a step
+        """
+        return bool(self.flags[step - self.first] & TRACE_ERROR)
+
+    def describe(self, step: int) -> str:
+        """
+        Returns a line that describes a step
+        """
+        name, position = self.function(step)
+        old, new = self.cells(step)
+        return "step " + str(step) + " at " + format_position(position) + " " + name + \
+            ", pointer " + str(self.pointers[step - self.first]) + ": " + repr(old) + \
+            " -> " + repr(new) + (" (error)" if self.has_error(step) else "")
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+
+def load_trace(file: str) -> Replay:
+    """
+    Reads a trace that save_trace wrote
+    """
+    with open(file, "rb") as trace_file:
+        data = trace_file.read()
+    if len(data) < HEADER.size:
+        raise ValueError(file + " is not a trace")
+    magic, version, length = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(file + " is not a trace")
+    if version != VERSION:
+        raise ValueError(file + " is a trace of version " + str(version) +
+                         ", only version " + str(VERSION) + " can be replayed")
+    metadata = json.loads(data[HEADER.size:HEADER.size + length])
+
+    buffers = []
+    offset = HEADER.size + length
+    for typecode in "qqqqB":
+        values = array(typecode)
+        size = metadata["kept"] * values.itemsize
+        values.frombytes(data[offset:offset + size])
+        if typecode != "B" and metadata["byteorder"] != sys.byteorder:
+            values.byteswap()
+        buffers.append(values)
+        offset += size
+    return Replay(metadata, buffers)
+
+
+def mark_source(lines: List[str], position: Optional[Tuple[int, int]], language: str) -> str:
+    """
+    Returns the source line at a position with a line under it that marks
+    the word, or the column of a Brainfuck program
+    """
+    if position is None or not 0 < position[0] <= len(lines):
+        return ""
+    line = lines[position[0] - 1].rstrip("\n")
+    if language == "brainfuck":
+        start, width = position[1] - 1, 1
+    else:
+        words = list(re.finditer(r"\S+", line))
+        if not 0 < position[1] <= len(words):
+            return "    " + line
+        word = words[position[1] - 1]
+        start, width = word.start(), word.end() - word.start()
+    return "    " + line + "\n    " + " " * start + "^" * width
+
+
+def replay(trace: Replay, lines: List[str]) -> None:
+    """
+    Steps through a trace, starting at its last step. Commands are read with input():
+    n or nothing goes a step forward, b a step back, e to the next step with an error,
+    E to the previous step with an error, g and a number to that step, f to the first kept step, l to the last and q quits.
+    """
+    if not len(trace):
+        print("The trace holds no steps")
+        return
+    last = trace.steps - 1
+    step = last
+    while True:
+        print(trace.describe(step))
+        marked = mark_source(lines, trace.function(step)[1], trace.metadata["language"])
+        if marked:
+            print(marked)
+        try:
+            command = input("> ").strip()
+        except EOFError:
+            return
+        if command in ("", "n"):
+            step = min(step + 1, last)
+        elif command == "b":
+            step = max(step - 1, trace.first)
+        elif command == "f":
+            step = trace.first
+        elif command == "l":
+            step = last
+        elif command in ("e", "E"):
+            steps = range(step + 1, last + 1) if command == "e" else \
+                range(step - 1, trace.first - 1, -1)
+            found = next((other for other in steps if trace.has_error(other)), None)
+            if found is not None:
+                step = found
+            else:
+                print("No", "later" if command == "e" else "earlier", "step has an error")
+        elif command.startswith("g") and command[1:].strip().isdigit():
+            step = min(max(int(command[1:]), trace.first), last)
+        elif command == "q":
+            return
+        else:
+            print("Use n, b, e, E, f, l, g <step> or q")
+
+
+if __name__ == "__main__":
+    ARG_PARSER = argparse.ArgumentParser(
+        description='Steps through the trace of a wtfzomfg run')
+    ARG_PARSER.add_argument("trace", type=str, help="trace file written with --trace")
+    ARG_PARSER.add_argument("-s", "--source", type=str,
+                            help="source file of the program, by default the file it was run from")
+    ARG_PARSER.add_argument("--list", action="store_true",
+                            help="print every kept step instead of stepping through them")
+    ARGS = ARG_PARSER.parse_args()
+
+    TRACE = load_trace(ARGS.trace)
+    SOURCE = ARGS.source or TRACE.metadata["source"]
+    LINES = []
+    if SOURCE:
+        with open(SOURCE, "r") as SOURCE_FILE:
+            LINES = SOURCE_FILE.readlines()
+    print("The last", len(TRACE), "of", TRACE.steps, "steps")
+    if TRACE.metadata["exception"]:
+        print("The run stopped with", TRACE.metadata["exception"])
+    if ARGS.list:
+        for STEP in range(TRACE.first, TRACE.steps):
+            print(TRACE.describe(STEP))
+    else:
+        replay(TRACE, LINES)
@@ -0,0 +1,403 @@
+"""A transpiler that translates resolved WTFZOMFG functions to a Python module"""
+from typing import Callable, List, Tuple
+
+import wtf_functions as wtf
+from wtf_engine import GOTO_FUNCTIONS
+from wtf_objects import Function, ProgramState
+from wtf_optimizer import cell_delta, decode_print, integer_argument
+
+# Python refuses to compile more than 20 nested loops and try statements, and deep
+# indentation makes the module hard to read, so deeper programs are
+# translated to a state machine instead
+MAX_NESTING = 15
+
+MODULE_HEADER = '''"""A WTFZOMFG program transpiled to Python"""
+from wtf_engine import scan_position
+from wtf_errors import OutOfBoundsError, UnknownTypeError, WrongDivisionError
+from wtf_io import InputSource, OutputSink
+from wtf_objects import DebugSink, ErrorStore, memory_limit
+
+
+def run(memory: list, pointer: int = 0, errors: ErrorStore = None, output: OutputSink = None,
+        input_source: InputSource = None, debug: DebugSink = None) -> tuple:
+    """
+    Runs the program on the memory, changing it in place.
+    Returns the pointer and the amount of dispatches, which is equal
+    to the amount of calls the recursive execute makes.
+    The output is written to the sink, which is flushed when the program stops.
+    The input is read from the input source, which reads lines with input() by default.
+    The dumps of w go to the debug sink, which writes them to the output by default.
+    """
+    if errors is None:
+        errors = ErrorStore()
+    if output is None:
+        output = OutputSink()
+    if input_source is None:
+        input_source = InputSource()
+    if debug is None:
+        debug = DebugSink()
+    write = output.write
+    interactive = input_source.interactive
+    size = len(memory)
+    limit = memory_limit(memory)
+    count = 0
+    try:
+'''
+
+MODULE_FOOTER = '''    finally:
+        output.flush()
+    return pointer, count
+
+
+if __name__ == "__main__":
+    import sys
+    MEMORY = [0 for i in range(int(sys.argv[1]))]
+    ERRORS = ErrorStore()
+    POINTER, _ = run(MEMORY, 0, ERRORS)
+    print()
+    print(POINTER, MEMORY)
+    print(ERRORS)
+'''
+
+CELL_ARITHMETIC = '''value = memory[pointer]
+if type(value) is int:
+    memory[pointer] = value {operator} {number}
+else:
+    errors.append(UnknownTypeError(int(), value), {position})'''
+
+CELL_OPERATOR_RIGHT = '''if pointer + 1 < size:
+    left = memory[pointer]
+    right = memory[pointer + 1]
+    if type(left) is not int:
+        errors.append(UnknownTypeError(int(), left), {position})
+    elif type(right) is not int:
+        errors.append(UnknownTypeError(int(), right), {position}){division}
+    else:
+        memory[pointer] = int(left {operator} right)
+else:
+    errors.append(OutOfBoundsError(limit, pointer + 1), {position})'''
+
+DIVISION_CHECK = '''
+    elif right == 0:
+        errors.append(WrongDivisionError(right), {position})'''
+
+# The statements of every function that is not a control function, with the
+# same behaviour as the in place functions of the flat engine
+TEMPLATES = {
+    wtf.cell_increase: CELL_ARITHMETIC.format(operator="+", number="1", position="{position}"),
+    wtf.cell_decrease: CELL_ARITHMETIC.format(operator="-", number="1", position="{position}"),
+    wtf.cell_flip: "memory[pointer] = 0 if memory[pointer] else 1",
+    wtf.cell_set: "memory[pointer] = {number}",
+    wtf.cell_increase_with: CELL_ARITHMETIC.format(operator="+", number="{number}",
+                                                   position="{position}"),
+    wtf.copy_value_right: '''if pointer + 1 < size:
+    memory[pointer + 1] = memory[pointer]
+else:
+    errors.append(OutOfBoundsError(limit, pointer + 1), {position})''',
+    wtf.copy_value_to: '''position = {number}
+if 0 <= position < size:
+    memory[position] = memory[pointer]
+else:
+    errors.append(OutOfBoundsError(limit, {args}), {position})''',
+    wtf.pointer_move_left: '''if pointer > 0:
+    pointer -= 1
+else:
+    errors.append(OutOfBoundsError(limit, pointer - 1), {position})''',
+    wtf.pointer_move_right: '''if pointer + 1 < size:
+    pointer += 1
+else:
+    errors.append(OutOfBoundsError(limit, pointer + 1), {position})''',
+    wtf.pointer_move_to: '''position = {number}
+if 0 <= position < size:
+    pointer = position
+else:
+    errors.append(OutOfBoundsError(limit, position), {position})''',
+    wtf.pointer_move_relative: '''position = pointer + {number}
+if 0 <= position < size:
+    pointer = position
+else:
+    errors.append(OutOfBoundsError(limit, position), {position})''',
+    wtf.cell_subtract_ascii: '''value = memory[pointer]
+if type(value) is int:
+    memory[pointer] = value - {ordinal}
+else:
+    memory[pointer] = ord(value) - {ordinal}''',
+    wtf.cell_add_right: CELL_OPERATOR_RIGHT.format(operator="+", division="",
+                                                   position="{position}"),
+    wtf.cell_subtract_right: CELL_OPERATOR_RIGHT.format(operator="-", division="",
+                                                        position="{position}"),
+    wtf.cell_multiply_right: CELL_OPERATOR_RIGHT.format(operator="*", division="",
+                                                        position="{position}"),
+    wtf.cell_devide_right: CELL_OPERATOR_RIGHT.format(operator="/", division=DIVISION_CHECK,
+                                                      position="{position}"),
+    wtf.scan_ascii: '''if interactive:
+    output.flush()
+memory[pointer] = input_source.read_character()''',
+    wtf.scan_decimal: '''if interactive:
+    output.flush()
+memory[pointer] = input_source.read_number()''',
+    wtf.print_cell_ascii: "write(str(memory[pointer]))",
+    wtf.print_cell_decimal: "write(str(int(memory[pointer])))",
+    wtf.print_character: "write({text})",
+    wtf.print_until: "write({text})",
+    wtf.print_program_state: "debug.dump(pointer, memory, write)"}
+
+# The statements of functions made by the optimizer, which run
+# the functions they replace when folding them could change the outcome
+FOLDED_TEMPLATES = {
+    wtf.cell_increase_with: '''value = memory[pointer]
+if type(value) is int:
+    memory[pointer] = value + {number}
+else:''',
+    wtf.pointer_move_relative: '''if pointer + {low} >= 0 and pointer + {high} < size:
+    pointer += {number}
+else:''',
+    wtf.cell_set: '''value = memory[pointer]
+if type(value) is int and value * {delta} <= 0:
+    memory[pointer] = 0
+else:''',
+    wtf.cell_multiply_add: '''value = memory[pointer]
+if value == 0:
+    pass
+elif type(value) is int and value * {delta} < 0 and pointer + {low} >= 0 and pointer + {high} < size{checks}:
+{increases}    memory[pointer] = 0
+else:''',
+    wtf.pointer_scan: '''position = scan_position(memory, pointer, {number}, {low}, {high})
+if position >= 0:
+    pointer = position
+else:'''}
+
+# The check and statement of every cell a multiply loop changes
+MULTIPLY_CHECK = " and type(memory[pointer + {offset}]) is int"
+MULTIPLY_INCREASE = "    memory[pointer + {offset}] += value * {factor}\n"
+
+
+def indent(lines: List[str], level: int = 1) -> List[str]:
+    """
+    Indents every line by four spaces for every level
+    """
+    return list(map(lambda line: "    " * level + line, lines))
+
+
+def number_expression(args: str) -> str:
+    """
+    Returns the argument as a Python number, or as a conversion that
+    raises the same error as the engines when it is not a number
+    """
+    value = integer_argument(args)
+    return "int(" + repr(args) + ")" if value is None else str(value)
+
+
+def emit_function(function: Function) -> List[str]:
+    """
+    Returns the statements of a function that is not a control function
+    """
+    args = function.args if function.args is not None else ""
+    if function.folded and function.func in FOLDED_TEMPLATES:
+        low, high = function.span if function.span else (0, 0)
+        delta = cell_delta(function.folded[1]) if function.func is wtf.cell_set else 0
+        increases = ()
+        if function.func is wtf.cell_multiply_add:
+            delta, increases = wtf.loop_increases(args)
+        checks = "".join(MULTIPLY_CHECK.format(offset=offset) for offset, _ in increases)
+        statements = "".join(MULTIPLY_INCREASE.format(offset=offset, factor=-delta * increase)
+                             for offset, increase in increases)
+        lines = FOLDED_TEMPLATES[function.func].format(
+            number=number_expression(args), low=low, high=high, delta=delta,
+            checks=checks, increases=statements).splitlines()
+        # The fallback counts its dispatches and its end, like the flat engine does
+        return lines + indent(emit_structured(function.folded, 0, len(function.folded), 1))
+
+    ordinal = str(ord(args[0])) if args else "ord(" + repr(args) + "[0])"
+    return TEMPLATES[function.func].format(
+        number=number_expression(args), args=repr(args),
+        text=repr(decode_print(args)), ordinal=ordinal,
+        position=repr(function.position)).splitlines()
+
+
+def is_structured(functions: List[Function]) -> bool:
+    """
+    Checks if the functions can be translated to nested while and if
+    statements: there are no gotos and all brackets are matched and properly nested
+    """
+    openings = []
+    for i, function in enumerate(functions):
+        if function.func in GOTO_FUNCTIONS:
+            return False
+        if function.func is wtf.loop_start or function.func is wtf.if_start:
+            openings.append(i)
+            if len(openings) > MAX_NESTING:
+                return False
+        elif function.func is wtf.loop_end or function.func is wtf.if_end:
+            if not openings or function.target != openings.pop():
+                return False
+    return not openings
+
+
+def emit_structured(functions: List[Function], start: int, end: int,
+                    pending: int, counted: bool = True) -> List[str]:
+    """
+    Translates properly nested functions from start until end to while and if
+    statements. Pending is the amount of dispatches that have to be counted
+    on top of the functions themselves. Functions replaced by a folded function
+    are only counted when they run instead of it, like in the flat engine.
+    """
+    lines = []
+    segment = []
+
+    def flush() -> None:
+        nonlocal pending, segment
+        if pending and counted:
+            lines.append("count += " + str(pending))
+        lines.extend(segment)
+        pending = 0
+        segment = []
+
+    index = start
+    while index < end:
+        function = functions[index]
+        pending += 1
+        if function.func is wtf.loop_start:
+            # The body also counts the loop end and the next check of the loop start
+            flush()
+            lines.append("while memory[pointer]:")
+            lines.extend(indent(emit_structured(functions, index + 1, function.target - 1, 2, counted)
+                                or ["pass"]))
+            index = function.target
+        elif function.func is wtf.if_start:
+            # The body also counts the if end
+            flush()
+            lines.append("if memory[pointer]:")
+            lines.extend(indent(emit_structured(functions, index + 1, function.target - 1, 1, counted)
+                                or ["pass"]))
+            index = function.target
+        else:
+            if function.func not in wtf.CONTROL_FUNCTIONS:
+                segment.extend(emit_function(function))
+            index += 1
+    flush()
+    return lines
+
+
+def find_blocks(functions: List[Function]) -> List[int]:
+    """
+    Returns the sorted start indices of all blocks of functions that are only
+    entered at their first function. The end of the program is a block as well.
+    """
+    starts = {0, len(functions)}
+    for i, function in enumerate(functions):
+        if function.func is wtf.loop_start:
+            starts.update((i, i + 1, function.target))
+        elif function.func in GOTO_FUNCTIONS or function.func in (wtf.loop_end, wtf.if_start):
+            starts.add(i + 1)
+            if function.target is not None and function.func is not wtf.loop_end:
+                starts.add(function.target)
+    return sorted(starts)
+
+
+def emit_jump(block: int, target: int) -> List[str]:
+    """
+    Returns the statement that continues at the target block. A block runs in a loop
+    of its own, so a jump back to its start does not have to leave the block.
+    """
+    if target == block:
+        return ["continue"]
+    return ["return " + str(target)]
+
+
+def emit_block(functions: List[Function], block: int, end: int) -> List[str]:
+    """
+    Translates the block of functions from block until end to statements that
+    return the start of the next block, or -1 when the program ends, using an explicit
+    loop stack like the flat engine
+    """
+    lines = ["count += " + str(max(end - block, 1))]
+    if block == len(functions):
+        return lines + ["if not loops:", "    return -1", "return loops.pop()"]
+
+    for function in functions[block:end - 1]:
+        if function.func not in wtf.CONTROL_FUNCTIONS:
+            lines.extend(emit_function(function))
+
+    index = end - 1
+    last = functions[index]
+    if last.func is wtf.loop_start:
+        lines.extend(["if memory[pointer]:",
+                      "    loops.append(" + str(index) + ")"] +
+                     indent(emit_jump(block, index + 1)) + ["else:"] +
+                     indent(emit_jump(block, last.target)))
+    elif last.func is wtf.loop_end:
+        lines.extend(["if not loops:", "    return -1", "return loops.pop()"])
+    elif last.func is wtf.if_start:
+        lines.extend(["if memory[pointer]:"] + indent(emit_jump(block, index + 1)) +
+                     ["else:"] + indent(emit_jump(block, last.target)))
+    elif last.func in GOTO_FUNCTIONS:
+        condition = {wtf.label_goto: None,
+                     wtf.label_goto_nonzero: "int(memory[pointer])",
+                     wtf.label_goto_zero: "not int(memory[pointer])"}[last.func]
+        if last.target is None:
+            # An undefined label is never jumped to, but the cell is still checked
+            lines.extend([condition] if condition else [])
+            lines.extend(emit_jump(block, index + 1))
+        elif condition is None:
+            lines.extend(emit_jump(block, last.target))
+        else:
+            lines.extend(["if " + condition + ":"] + indent(emit_jump(block, last.target)) +
+                         ["else:"] + indent(emit_jump(block, index + 1)))
+    else:
+        if last.func not in wtf.CONTROL_FUNCTIONS:
+            lines.extend(emit_function(last))
+        lines.extend(emit_jump(block, end))
+    return lines
+
+
+def emit_state_machine(functions: List[Function]) -> List[str]:
+    """
+    Translates functions with gotos or unmatched brackets to a local function for every
+    block, which runs the block until it returns the start of another block. The blocks
+    are held in a dict by their start, so a jump takes the same time wherever it goes.
+    """
+    starts = find_blocks(functions)
+    lines = ["loops = []"]
+    for block, end in zip(starts, starts[1:] + [len(functions) + 1]):
+        lines.extend(["def block_" + str(block) + "():", "    nonlocal pointer, count",
+                      "    while True:"] + indent(emit_block(functions, block, end), 2))
+    lines.extend(["blocks = {"] +
+                 indent([str(block) + ": block_" + str(block) + "," for block in starts]) +
+                 ["}", "state = 0", "while state >= 0:", "    state = blocks[state]()"])
+    return lines
+
+
+def transpile(functions: List[Function]) -> str:
+    """
+    Translates functions that have been resolved by pre_run to the source of a Python
+    module. Its run function changes the memory in place, records the same errors
+    and prints the same output as the engines. Programs without gotos become nested
+    while and if statements, other programs a state machine.
+    """
+    if is_structured(functions):
+        body = emit_structured(functions, 0, len(functions), 1)
+    else:
+        body = emit_state_machine(functions)
+    return MODULE_HEADER + "\n".join(indent(body, 2)) + "\n" + MODULE_FOOTER
+
+
+def load(source: str, filename: str = "<wtf>") -> Callable[[list, int, list], Tuple[int, int]]:
+    """
+    Compiles the source of a transpiled module and returns its run function
+    """
+    namespace = {"__name__": "wtf_transpiled"}
+    exec(compile(source, filename, "exec"), namespace)  # pylint: disable=exec-used
+    return namespace["run"]
+
+
+def execute(program_state: ProgramState, functions: List[Function]) -> Tuple[ProgramState, int]:
+    """
+    Transpiles and runs the functions on the given program state, changing it in place.
+    Returns the program state and the amount of dispatches.
+    """
+    p_s = program_state
+    run = load(transpile(functions))
+    p_s.pointer, count = run(p_s.memory, p_s.pointer, p_s.errors, p_s.output, p_s.input,
+                          p_s.debug)
+    return p_s, count
@@ -0,0 +1,358 @@
+"""A virtual machine that executes WTFZOMFG bytecode"""
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from wtf_analysis import remove_bounds_checks
+from wtf_bytecode import Opcode
+from wtf_engine import IN_PLACE_FUNCTIONS, apply_operator_right, multiply_add, scan_position
+from wtf_errors import OutOfBoundsError, UnknownTypeError
+from wtf_functions import TOKEN_FUNCTIONS
+from wtf_objects import Bytecode, ProgramState, memory_limit
+
+END = Opcode.END.value
+CALL_FUNCTION = Opcode.CALL_FUNCTION.value
+LABEL_GOTO = Opcode.LABEL_GOTO.value
+LABEL_DECLARE = Opcode.LABEL_DECLARE.value
+LABEL_GOTO_NONZERO = Opcode.LABEL_GOTO_NONZERO.value
+LABEL_GOTO_ZERO = Opcode.LABEL_GOTO_ZERO.value
+LOOP_START = Opcode.LOOP_START.value
+LOOP_END = Opcode.LOOP_END.value
+IF_START = Opcode.IF_START.value
+IF_END = Opcode.IF_END.value
+CELL_INCREASE = Opcode.CELL_INCREASE.value
+CELL_DECREASE = Opcode.CELL_DECREASE.value
+CELL_SET = Opcode.CELL_SET.value
+CELL_INCREASE_WITH = Opcode.CELL_INCREASE_WITH.value
+POINTER_MOVE_LEFT = Opcode.POINTER_MOVE_LEFT.value
+POINTER_MOVE_RIGHT = Opcode.POINTER_MOVE_RIGHT.value
+POINTER_MOVE_TO = Opcode.POINTER_MOVE_TO.value
+POINTER_MOVE_RELATIVE = Opcode.POINTER_MOVE_RELATIVE.value
+CELL_SUBTRACT_ASCII = Opcode.CELL_SUBTRACT_ASCII.value
+PRINT_CELL_ASCII = Opcode.PRINT_CELL_ASCII.value
+PRINT_CHARACTER = Opcode.PRINT_CHARACTER.value
+PRINT_UNTIL = Opcode.PRINT_UNTIL.value
+CELL_INCREASE_FOLDED = Opcode.CELL_INCREASE_FOLDED.value
+POINTER_MOVE_FOLDED = Opcode.POINTER_MOVE_FOLDED.value
+CELL_CLEAR = Opcode.CELL_CLEAR.value
+CELL_MULTIPLY_ADD = Opcode.CELL_MULTIPLY_ADD.value
+POINTER_SCAN = Opcode.POINTER_SCAN.value
+JUMP = Opcode.JUMP.value
+POINTER_MOVE_LEFT_UNCHECKED = Opcode.POINTER_MOVE_LEFT_UNCHECKED.value
+POINTER_MOVE_RIGHT_UNCHECKED = Opcode.POINTER_MOVE_RIGHT_UNCHECKED.value
+POINTER_MOVE_TO_UNCHECKED = Opcode.POINTER_MOVE_TO_UNCHECKED.value
+POINTER_MOVE_RELATIVE_UNCHECKED = Opcode.POINTER_MOVE_RELATIVE_UNCHECKED.value
+COPY_VALUE_RIGHT_UNCHECKED = Opcode.COPY_VALUE_RIGHT_UNCHECKED.value
+COPY_VALUE_TO_UNCHECKED = Opcode.COPY_VALUE_TO_UNCHECKED.value
+
+# Instructions that are not handled in the loop itself call the in place function
+OPCODE_FUNCTIONS = {
+    opcode: IN_PLACE_FUNCTIONS[TOKEN_FUNCTIONS[opcode.name]]
+    for opcode in Opcode if opcode.name in TOKEN_FUNCTIONS
+    and TOKEN_FUNCTIONS[opcode.name] in IN_PLACE_FUNCTIONS}
+
+# Arithmetic on the cell to the right of which the analysis proved it is within bounds
+OPCODE_FUNCTIONS.update({
+    Opcode.CELL_ADD_RIGHT_UNCHECKED: lambda p_s, args: apply_operator_right(p_s, "add"),
+    Opcode.CELL_SUBTRACT_RIGHT_UNCHECKED: lambda p_s, args: apply_operator_right(p_s, "sub"),
+    Opcode.CELL_MULTIPLY_RIGHT_UNCHECKED: lambda p_s, args: apply_operator_right(p_s, "mul"),
+    Opcode.CELL_DEVIDE_RIGHT_UNCHECKED: lambda p_s, args: apply_operator_right(p_s, "div")})
+
+
+# The amount of dispatches between two checks of the deadline of a run
+DEADLINE_INTERVAL = 10000
+
+
+def next_limit(count: int, end: int, deadline: Optional[float]) -> Optional[int]:
+    """
+    Returns the amount of dispatches at which a run checks again whether it should pause,
+    or None if it should pause now because the budget is used up or the deadline passed
+    """
+    if count >= end or (deadline is not None and time.monotonic() >= deadline):
+        return None
+    if deadline is None:
+        return end
+    return min(end, count + DEADLINE_INTERVAL)
+
+
+def call_function(p_s: ProgramState, constant: Tuple[str, str]) -> None:
+    """
+    Calls the in place function of a command with an argument that was not decoded
+    """
+    command, args = constant
+    IN_PLACE_FUNCTIONS[TOKEN_FUNCTIONS[command]](p_s, args)
+
+
+def execute(program_state: ProgramState, bytecode: Bytecode) -> Tuple[ProgramState, int]:
+    """
+    Executes bytecode on the given program state, changing it in place.
+    Returns the program state and the amount of dispatches, which is equal
+    to the amount of calls the recursive execute makes.
+    """
+    p_s, count, _ = execute_slice(program_state, bytecode, [], start=0)
+    return p_s, count
+
+
+def execute_slice(program_state: ProgramState, bytecode: Bytecode, loops: List[int],
+                  budget: Optional[int] = None, deadline: Optional[float] = None,
+                  start: Optional[int] = None) -> Tuple[ProgramState, int, bool]:
+    """
+    Executes bytecode on the given program state, changing it in place, starting at
+    its next index inside the given stack of entered loops.
+    Returns the program state, the amount of dispatches and whether the program finished.
+
+    With a budget of dispatches or a deadline, a time.monotonic() value, the program
+    pauses when either runs out. A program can only run forever by jumping back,
+    so this is only checked at the end of a loop and at a goto. The budget can be
+    overrun by the length of the program. A paused program has its next index
+    and the loop stack set, so it continues where it stopped when it is run again.
+
+    The pointer is kept in a local variable, it is written to the program
+    state before calling a function that is not handled in the loop itself,
+    like the position errors of that function are recorded at.
+
+    When the memory has more cells than the extent of the unchecked bytecode,
+    the unchecked bytecode is run, which leaves out the bounds checks that can not fail.
+    That is only proven for runs that start at the first instruction with the pointer
+    at cell 0. Start is the pointer the analysis expects at the next index, 0 for such
+    a run or where a paused one of them stopped. When the pointer is anywhere else,
+    or start is None, the checked bytecode is run.
+    """
+    p_s = program_state
+    memory = p_s.memory
+    errors = p_s.errors
+    # A paged tape without a limit is as large as Python allows, errors do not quote that size
+    size = len(memory)
+    cells = memory_limit(memory)
+    if bytecode.unchecked is None:
+        bytecode.unchecked = remove_bounds_checks(bytecode)
+    if size > bytecode.unchecked.extent and p_s.pointer == start:
+        bytecode = bytecode.unchecked
+    opcodes = bytecode.opcodes
+    operands = bytecode.operands
+    constants = bytecode.constants
+    positions = bytecode.positions
+    write = p_s.output.write
+
+    pointer = p_s.pointer
+    index = p_s.next_index
+    count = 0
+    end = budget if budget is not None else sys.maxsize
+    limit = next_limit(count, end, deadline)
+    if limit is None:
+        return p_s, count, False
+    finished = True
+
+    while True:
+        count += 1
+        opcode = opcodes[index]
+
+        # Cell/Pointer manipulation
+        if opcode == CELL_INCREASE:
+            value = memory[pointer]
+            if type(value) is int:
+                memory[pointer] = value + 1
+            else:
+                errors.append(UnknownTypeError(int(), value), positions[index])
+            index += 1
+        elif opcode == CELL_DECREASE:
+            value = memory[pointer]
+            if type(value) is int:
+                memory[pointer] = value - 1
+            else:
+                errors.append(UnknownTypeError(int(), value), positions[index])
+            index += 1
+        elif opcode == POINTER_MOVE_RIGHT:
+            if pointer + 1 < size:
+                pointer += 1
+            else:
+                errors.append(OutOfBoundsError(cells, pointer + 1), positions[index])
+            index += 1
+        elif opcode == POINTER_MOVE_LEFT:
+            if pointer > 0:
+                pointer -= 1
+            else:
+                errors.append(OutOfBoundsError(cells, pointer - 1), positions[index])
+            index += 1
+        elif opcode == POINTER_MOVE_RIGHT_UNCHECKED:
+            pointer += 1
+            index += 1
+        elif opcode == POINTER_MOVE_LEFT_UNCHECKED:
+            pointer -= 1
+            index += 1
+        elif opcode == POINTER_MOVE_RELATIVE_UNCHECKED:
+            pointer += operands[index]
+            index += 1
+
+        # Control
+        elif opcode == LOOP_START:
+            if memory[pointer]:
+                loops.append(index)
+                index += 1
+            else:
+                index = operands[index]
+        elif opcode == LOOP_END:
+            if not loops:
+                break
+            index = loops.pop()
+            if count >= limit:
+                limit = next_limit(count, end, deadline)
+                if limit is None:
+                    finished = False
+                    break
+        elif opcode == IF_START:
+            if memory[pointer]:
+                index += 1
+            else:
+                index = operands[index]
+        elif opcode == IF_END or opcode == LABEL_DECLARE:
+            index += 1
+        elif opcode == LABEL_GOTO:
+            if operands[index] >= 0:
+                index = operands[index]
+                if count >= limit:
+                    limit = next_limit(count, end, deadline)
+                    if limit is None:
+                        finished = False
+                        break
+            else:
+                index += 1
+        elif opcode == LABEL_GOTO_NONZERO:
+            if int(memory[pointer]) and operands[index] >= 0:
+                index = operands[index]
+                if count >= limit:
+                    limit = next_limit(count, end, deadline)
+                    if limit is None:
+                        finished = False
+                        break
+            else:
+                index += 1
+        elif opcode == LABEL_GOTO_ZERO:
+            if not int(memory[pointer]) and operands[index] >= 0:
+                index = operands[index]
+                if count >= limit:
+                    limit = next_limit(count, end, deadline)
+                    if limit is None:
+                        finished = False
+                        break
+            else:
+                index += 1
+        elif opcode == END:
+            if not loops:
+                break
+            index = loops.pop()
+            if count >= limit:
+                limit = next_limit(count, end, deadline)
+                if limit is None:
+                    finished = False
+                    break
+
+        # Cell/Pointer manipulation with an argument
+        elif opcode == CELL_INCREASE_WITH:
+            value = memory[pointer]
+            if type(value) is int:
+                memory[pointer] = value + operands[index]
+            else:
+                errors.append(UnknownTypeError(int(), value), positions[index])
+            index += 1
+        elif opcode == CELL_SET:
+            memory[pointer] = operands[index]
+            index += 1
+        elif opcode == POINTER_MOVE_RELATIVE:
+            position = pointer + operands[index]
+            if 0 <= position < size:
+                pointer = position
+            else:
+                errors.append(OutOfBoundsError(cells, position), positions[index])
+            index += 1
+        elif opcode == POINTER_MOVE_TO:
+            position = operands[index]
+            if 0 <= position < size:
+                pointer = position
+            else:
+                errors.append(OutOfBoundsError(cells, position), positions[index])
+            index += 1
+        elif opcode == POINTER_MOVE_TO_UNCHECKED:
+            pointer = operands[index]
+            index += 1
+        elif opcode == COPY_VALUE_RIGHT_UNCHECKED:
+            memory[pointer + 1] = memory[pointer]
+            index += 1
+        elif opcode == COPY_VALUE_TO_UNCHECKED:
+            memory[operands[index]] = memory[pointer]
+            index += 1
+        elif opcode == CELL_SUBTRACT_ASCII:
+            value = memory[pointer]
+            if type(value) is int:
+                memory[pointer] = value - operands[index]
+            else:
+                memory[pointer] = ord(value) - operands[index]
+            index += 1
+
+        # Folded functions, which jump to the functions they replace
+        # when folding them could change the outcome
+        elif opcode == CELL_INCREASE_FOLDED:
+            delta, fallback = constants[operands[index]]
+            value = memory[pointer]
+            if type(value) is int:
+                memory[pointer] = value + delta
+                index += 1
+            else:
+                index = fallback
+        elif opcode == POINTER_MOVE_FOLDED:
+            delta, low, high, fallback = constants[operands[index]]
+            if pointer + low >= 0 and pointer + high < size:
+                pointer += delta
+                index += 1
+            else:
+                index = fallback
+        elif opcode == CELL_CLEAR:
+            delta, fallback = constants[operands[index]]
+            value = memory[pointer]
+            if type(value) is int and value * delta <= 0:
+                memory[pointer] = 0
+                index += 1
+            else:
+                index = fallback
+        elif opcode == CELL_MULTIPLY_ADD:
+            control, low, high, increases, fallback = constants[operands[index]]
+            if multiply_add(memory, pointer, control, low, high, increases):
+                index += 1
+            else:
+                index = fallback
+        elif opcode == POINTER_SCAN:
+            step, low, high, fallback = constants[operands[index]]
+            position = scan_position(memory, pointer, step, low, high)
+            if position >= 0:
+                pointer = position
+                index += 1
+            else:
+                index = fallback
+        elif opcode == JUMP:
+            index = operands[index]
+
+        # Output
+        elif opcode == PRINT_UNTIL or opcode == PRINT_CHARACTER:
+            write(constants[operands[index]])
+            index += 1
+        elif opcode == PRINT_CELL_ASCII:
+            write(str(memory[pointer]))
+            index += 1
+
+        # All other functions
+        elif opcode == CALL_FUNCTION:
+            p_s.pointer = pointer
+            errors.position = positions[index]
+            call_function(p_s, constants[operands[index]])
+            pointer = p_s.pointer
+            index += 1
+        else:
+            p_s.pointer = pointer
+            errors.position = positions[index]
+            OPCODE_FUNCTIONS[opcode](p_s, operands[index])
+            pointer = p_s.pointer
+            index += 1
+
+    p_s.pointer = pointer
+    p_s.next_index = index
+    return p_s, count, finished